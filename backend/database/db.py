@@ -1,6 +1,7 @@
 import os
+import threading
 from typing import Generator
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, Session
 
 from dotenv import load_dotenv
@@ -8,9 +9,28 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL, echo = True)
+_session_factory = sessionmaker(autocommit=False, autoflush=False)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    # lru_cache would let two threads racing on the first call each build an engine (and pool)
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(DATABASE_URL, echo = True)
+                _session_factory.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+
+def SessionLocal() -> Session:
+    get_engine()
+    return _session_factory()
 
 def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
@@ -19,9 +39,61 @@ def get_db() -> Generator[Session, None, None]:
     finally:
         db.close()
 
+# create_all only creates missing tables; columns added to existing tables since are
+# brought in here, each statement safe to run on every start
+def _cascade_fk(table: str, column: str, parent: str) -> str:
+    # swaps the plain foreign key for an ON DELETE CASCADE one, only while it is not one yet;
+    # NOT VALID + VALIDATE avoids blocking writes while existing rows are checked
+    name = f"{table}_{column}_fkey"
+    return f"""
+    DO $$ BEGIN
+        IF EXISTS (
+            SELECT 1 FROM pg_constraint
+            WHERE conrelid = '{table}'::regclass AND conname = '{name}' AND confdeltype <> 'c'
+        ) THEN
+            ALTER TABLE {table} DROP CONSTRAINT {name},
+                ADD CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {parent} ({column}) ON DELETE CASCADE NOT VALID;
+            ALTER TABLE {table} VALIDATE CONSTRAINT {name};
+        END IF;
+    END $$"""
+
+
+# bulk and raw-SQL updates may not set version themselves; the ORM's own version + 1
+# yields the same value, so both applying is harmless
+CHUNK_VERSION_TRIGGER = (
+    """CREATE OR REPLACE FUNCTION document_chunks_bump_version() RETURNS trigger AS $$
+    BEGIN
+        NEW.version := OLD.version + 1;
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS document_chunks_bump_version ON document_chunks",
+    """CREATE TRIGGER document_chunks_bump_version BEFORE UPDATE ON document_chunks
+    FOR EACH ROW EXECUTE FUNCTION document_chunks_bump_version()""",
+)
+
+
+_UPGRADES = (
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_hash varchar(64)",
+    "CREATE INDEX IF NOT EXISTS ix_document_chunks_content_hash ON document_chunks (content_hash)",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS status_updated_at timestamp",
+    _cascade_fk("chat_documents", "chat_id", "chats"),
+    _cascade_fk("chat_documents", "document_id", "documents"),
+    _cascade_fk("document_chunks", "document_id", "documents"),
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1",
+    *CHUNK_VERSION_TRIGGER,
+    "ALTER TABLE chats ADD COLUMN IF NOT EXISTS updated_at timestamp",
+    "UPDATE chats SET updated_at = created_at WHERE updated_at IS NULL",
+    "CREATE INDEX IF NOT EXISTS ix_chats_user_id_updated_at ON chats (user_id, updated_at)",
+)
+
+
 def init_db():
     from backend.database.models import Base
+    engine = get_engine()
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for statement in _UPGRADES:
+            conn.execute(text(statement))
 
 if __name__ == "__main__":
     init_db()
\ No newline at end of file
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import Integer, String, DateTime, ForeignKey, Boolean, Enum, PrimaryKeyConstraint, Index
+from sqlalchemy import Integer, String, DateTime, ForeignKey, Boolean, Enum, PrimaryKeyConstraint, Index, LargeBinary, literal_column
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 from  pgvector.sqlalchemy import Vector
@@ -23,10 +23,13 @@ class User(Base):
 
 class Chats(Base):
     __tablename__ = "chats"
+    __table_args__ = (Index("ix_chats_user_id_updated_at", "user_id", "updated_at"), )
     chat_id: Mapped[int] = mapped_column(Integer, primary_key = True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.user_id", ondelete = "CASCADE"))
     chat_title: Mapped[str] = mapped_column(String, nullable = False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default = datetime.utcnow)
+    # with the chat count, fingerprints a user's chat list for the /chats ETag
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default = datetime.utcnow, onupdate = datetime.utcnow, nullable = True)
     last_titled_message_id: Mapped[int] = mapped_column(Integer, nullable  =True)
     is_title_locked: Mapped[Boolean] = mapped_column(Boolean, nullable = False, default = False)
 
@@ -52,14 +55,15 @@ class Documents(Base):
     file_size: Mapped[int] = mapped_column(Integer)
     sha256: Mapped[str] = mapped_column(String, unique = True, index = True)
     status: Mapped[str] = mapped_column(Enum("uploaded", "processing", "ready", "failed", name = "doc_status"), default = "uploaded", nullable = False)
+    status_updated_at: Mapped[datetime] = mapped_column(DateTime, nullable = True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default = datetime.utcnow)
 
 
 class ChatDocument(Base):
     __tablename__ = "chat_documents"
     __table_args__ = (PrimaryKeyConstraint("chat_id", "document_id"), )
-    chat_id: Mapped[int] = mapped_column(Integer, ForeignKey("chats.chat_id"), index = True)
-    document_id: Mapped[int] = mapped_column(Integer, ForeignKey("documents.document_id"), index = True)
+    chat_id: Mapped[int] = mapped_column(Integer, ForeignKey("chats.chat_id", ondelete = "CASCADE"), index = True)
+    document_id: Mapped[int] = mapped_column(Integer, ForeignKey("documents.document_id", ondelete = "CASCADE"), index = True)
     enabled: Mapped[bool] = mapped_column(Boolean, default = True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default = datetime.utcnow)
 
@@ -68,8 +72,50 @@ class  DocumentChunks(Base):
     __tablename__ = "document_chunks"
     __table_args__ = (Index("ix_document_chunks_doc_idx", "document_id", "chunk_index"), )
     chunk_id: Mapped[int] = mapped_column(Integer, primary_key = True)
-    document_id: Mapped[int] = mapped_column(Integer, ForeignKey("documents.document_id"), index = True)
+    document_id: Mapped[int] = mapped_column(Integer, ForeignKey("documents.document_id", ondelete = "CASCADE"), index = True)
     chunk_index: Mapped[int] = mapped_column(Integer)
     content: Mapped[str] = mapped_column(String)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable = True, index = True)
     embedding: Mapped[list[float]] = mapped_column(Vector(3072))
-    created_at: Mapped[datetime] = mapped_column(DateTime, default = datetime.utcnow)
\ No newline at end of file
+    # bumped on every update (also by a trigger, for raw SQL); part of the vector index fingerprint
+    version: Mapped[int] = mapped_column(Integer, default = 1, server_default = "1", onupdate = literal_column("version + 1"))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default = datetime.utcnow)
+
+
+class DocumentSummaries(Base):
+    __tablename__ = "document_summaries"
+    document_id: Mapped[int] = mapped_column(Integer, ForeignKey("documents.document_id", ondelete = "CASCADE"), primary_key = True)
+    summary: Mapped[str] = mapped_column(String, nullable = True)
+    centroid: Mapped[list[float]] = mapped_column(Vector(3072), nullable = True)
+    chunk_count: Mapped[int] = mapped_column(Integer, default = 0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default = datetime.utcnow)
+
+
+class DocumentRepresentatives(Base):
+    __tablename__ = "document_representatives"
+    __table_args__ = (PrimaryKeyConstraint("document_id", "rank"), )
+    document_id: Mapped[int] = mapped_column(Integer, ForeignKey("documents.document_id", ondelete = "CASCADE"), index = True)
+    rank: Mapped[int] = mapped_column(Integer)
+    weight: Mapped[int] = mapped_column(Integer)
+    embedding: Mapped[list[float]] = mapped_column(Vector(3072))
+
+
+class DocumentContextCaches(Base):
+    __tablename__ = "document_context_caches"
+    __table_args__ = (PrimaryKeyConstraint("document_id", "model"), )
+    document_id: Mapped[int] = mapped_column(Integer, ForeignKey("documents.document_id", ondelete = "CASCADE"), index = True)
+    model: Mapped[str] = mapped_column(String)
+    cache_name: Mapped[str] = mapped_column(String, nullable = False)
+    token_count: Mapped[int] = mapped_column(Integer, nullable = True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable = False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default = datetime.utcnow)
+
+
+class ArchivedChats(Base):
+    __tablename__ = "archived_chats"
+    chat_id: Mapped[int] = mapped_column(Integer, ForeignKey("chats.chat_id", ondelete = "CASCADE"), primary_key = True)
+    message_count: Mapped[int] = mapped_column(Integer, nullable = False)
+    last_message_id: Mapped[int] = mapped_column(Integer, nullable = False)
+    last_message_at: Mapped[datetime] = mapped_column(DateTime, nullable = False)
+    payload: Mapped[bytes] = mapped_column(LargeBinary, nullable = False)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, default = datetime.utcnow)
@@ -0,0 +1,129 @@
+# Opt-in conversion of document_chunks and messages into hash-partitioned tables:
+#   python -m backend.database.partitioning            prints the DDL
+#   python -m backend.database.partitioning --apply    runs it
+# Chunks are partitioned by document_id and messages by chat_id, so per-document retrieval
+# and per-chat history prune to one partition. pgvector's vector indexes stop at 2000
+# dimensions, so each chunk partition gets an HNSW index over embedding::halfvec(3072).
+import argparse
+import os
+
+from sqlalchemy import text
+
+from backend.database.db import CHUNK_VERSION_TRIGGER, get_engine
+
+CHUNK_PARTITIONS = int(os.getenv("CHUNK_PARTITIONS", "16"))
+MESSAGE_PARTITIONS = int(os.getenv("MESSAGE_PARTITIONS", "16"))
+EMBEDDING_DIM = 3072
+
+
+def _partitions(table: str, modulus: int) -> list[str]:
+    return [
+        f"CREATE TABLE {table}_p{i} PARTITION OF {table} FOR VALUES WITH (MODULUS {modulus}, REMAINDER {i})"
+        for i in range(modulus)
+    ]
+
+
+def chunk_partition_ddl(partitions: int = CHUNK_PARTITIONS) -> list[str]:
+    return [
+        "LOCK TABLE document_chunks IN ACCESS EXCLUSIVE MODE",
+        "ALTER TABLE document_chunks RENAME TO document_chunks_unpartitioned",
+        f"""CREATE TABLE document_chunks (
+            chunk_id integer NOT NULL DEFAULT nextval('document_chunks_chunk_id_seq'),
+            document_id integer NOT NULL REFERENCES documents (document_id) ON DELETE CASCADE,
+            chunk_index integer,
+            content varchar,
+            content_hash varchar(64),
+            embedding vector({EMBEDDING_DIM}),
+            version integer NOT NULL DEFAULT 1,
+            created_at timestamp,
+            PRIMARY KEY (chunk_id, document_id)
+        ) PARTITION BY HASH (document_id)""",
+        *_partitions("document_chunks", partitions),
+        """INSERT INTO document_chunks (chunk_id, document_id, chunk_index, content, content_hash, embedding, version, created_at)
+            SELECT chunk_id, document_id, chunk_index, content, content_hash, embedding, version, created_at
+            FROM document_chunks_unpartitioned""",
+        "ALTER SEQUENCE document_chunks_chunk_id_seq OWNED BY document_chunks.chunk_id",
+        "DROP TABLE document_chunks_unpartitioned",
+        "CREATE INDEX ix_document_chunks_document_id ON document_chunks (document_id)",
+        "CREATE INDEX ix_document_chunks_doc_idx ON document_chunks (document_id, chunk_index)",
+        "CREATE INDEX ix_document_chunks_content_hash ON document_chunks (content_hash)",
+        *CHUNK_VERSION_TRIGGER,
+    ]
+
+
+def message_partition_ddl(partitions: int = MESSAGE_PARTITIONS) -> list[str]:
+    return [
+        "LOCK TABLE messages IN ACCESS EXCLUSIVE MODE",
+        "ALTER TABLE messages RENAME TO messages_unpartitioned",
+        """CREATE TABLE messages (
+            message_id integer NOT NULL DEFAULT nextval('messages_message_id_seq'),
+            chat_id integer NOT NULL REFERENCES chats (chat_id) ON DELETE CASCADE,
+            role varchar,
+            message_content varchar NOT NULL,
+            created_at timestamp,
+            PRIMARY KEY (message_id, chat_id)
+        ) PARTITION BY HASH (chat_id)""",
+        *_partitions("messages", partitions),
+        """INSERT INTO messages (message_id, chat_id, role, message_content, created_at)
+            SELECT message_id, chat_id, role, message_content, created_at
+            FROM messages_unpartitioned""",
+        "ALTER SEQUENCE messages_message_id_seq OWNED BY messages.message_id",
+        "DROP TABLE messages_unpartitioned",
+        "CREATE INDEX ix_messages_chat_id_message_id ON messages (chat_id, message_id)",
+        "CREATE INDEX ix_messages_chat_id_created_at ON messages (chat_id, created_at)",
+    ]
+
+
+def vector_index_ddl(partitions: int = CHUNK_PARTITIONS) -> list[str]:
+    return [
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS document_chunks_p{i}_embedding_hnsw "
+        f"ON document_chunks_p{i} USING hnsw ((embedding::halfvec({EMBEDDING_DIM})) halfvec_cosine_ops)"
+        for i in range(partitions)
+    ]
+
+
+def is_partitioned(conn, table: str) -> bool:
+    return bool(conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :table"),
+        {"table": table},
+    ).first())
+
+
+def apply(chunk_partitions: int = CHUNK_PARTITIONS, message_partitions: int = MESSAGE_PARTITIONS, vector_indexes: bool = True):
+    engine = get_engine()
+
+    for table, ddl in (("document_chunks", chunk_partition_ddl(chunk_partitions)), ("messages", message_partition_ddl(message_partitions))):
+        with engine.begin() as conn:
+            if is_partitioned(conn, table):
+                continue
+            for statement in ddl:
+                conn.execute(text(statement))
+
+    if vector_indexes:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level = "AUTOCOMMIT") as conn:
+            for statement in vector_index_ddl(chunk_partitions):
+                conn.execute(text(statement))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Hash-partition document_chunks and messages")
+    parser.add_argument("--apply", action = "store_true", help = "run the DDL instead of printing it")
+    parser.add_argument("--chunk-partitions", type = int, default = CHUNK_PARTITIONS)
+    parser.add_argument("--message-partitions", type = int, default = MESSAGE_PARTITIONS)
+    parser.add_argument("--skip-vector-indexes", action = "store_true")
+    args = parser.parse_args()
+
+    if args.apply:
+        apply(args.chunk_partitions, args.message_partitions, not args.skip_vector_indexes)
+        return
+
+    statements = chunk_partition_ddl(args.chunk_partitions) + message_partition_ddl(args.message_partitions)
+    if not args.skip_vector_indexes:
+        statements += vector_index_ddl(args.chunk_partitions)
+    for statement in statements:
+        print(f"{statement};")
+
+
+if __name__ == "__main__":
+    main()
@@ -53,6 +53,17 @@ class MessageCreate(BaseModel):
     role: str
     message_content: str
 
+class ChatTurnCreate(BaseModel):
+    message_content: str = Field(min_length = 1)
+
+class ChatTurnOut(BaseModel):
+    reply: str
+    user_message_id: int
+    message_id: int
+    used_rag: bool
+    document_id: int | None = None
+    sources: list[dict]
+
 class MessageOut(BaseModel):
     message_id: int
     chat_id: int
@@ -92,11 +103,17 @@ class UploadDocumentResponse(BaseModel):
 class ProcessDocumentResponse(BaseModel):
     document_id: int
     chunks_saved: int
+    chunks_embedded: int = 0
+    chunks_reused: int = 0
     vector_dim: int
 
 class AskRequest(BaseModel):
     question: str
-    k: int = 5
+    k: int = Field(default = 5, gt = 0, le = 100)
+
+class AskBatchRequest(BaseModel):
+    questions: list[str] = Field(min_length = 1)
+    k: int = Field(default = 5, gt = 0, le = 100)
 
 class AskResponse(BaseModel):
     document_id: int
@@ -1,7 +1,7 @@
 import os
 
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
+from functools import lru_cache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import jwt, JWTError
@@ -10,36 +10,49 @@ from sqlalchemy.orm import Session
 from backend.database.db import get_db
 from backend.database.models import User
 
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+@lru_cache(maxsize = None)
+def get_token_settings() -> tuple[str, str, int]:
+    return (
+        os.getenv("SECRET_KEY"),
+        os.getenv("ALGORITHM"),
+        int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")),
+    )
 
-pwd_context = CryptContext(schemes = ["bcrypt"], deprecated = "auto")
+
+@lru_cache(maxsize = None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes = ["bcrypt"], deprecated = "auto")
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def create_access_token(data: dict):
+    secret_key, algorithm, expire_minutes = get_token_settings()
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.utcnow() + timedelta(minutes=expire_minutes)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, secret_key, algorithm=algorithm)
     return encoded_jwt
 
 bearer_scheme = HTTPBearer(auto_error=True)
 
 def get_current_user(creds: HTTPAuthorizationCredentials = Depends(bearer_scheme), db: Session = Depends(get_db),
 ) -> User:
-    token = creds.credentials
+    return authenticate_token(db, creds.credentials)
+
+def authenticate_token(db: Session, token: str) -> User:
+    secret_key, algorithm, _ = get_token_settings()
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, secret_key, algorithms=[algorithm])
         sub = payload.get("sub")
         if sub is None:
             raise ValueError("no sub")
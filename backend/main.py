@@ -1,16 +1,108 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
 
+# once, before the routers read their settings; service modules do not load .env themselves
+load_dotenv()
+
 from backend.routers import auth, chats, chat_title, messages, documents
+from backend.services.metrics import start_request_trace, server_timing_header, observe_request, render_latest
+from backend.services.llm_client.scheduler import AdmissionRejected
+from backend.services.rag.document_gc import start_gc_worker
+from backend.services.chat_archive import start_archive_worker
+from backend.routers.helpers import title_scheduler
+from backend import startup
+
+if startup.STARTUP_MODE == "preload":
+    startup.preload_modules()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if startup.STARTUP_MODE == "eager":
+        startup.warm_up()
+    elif startup.STARTUP_MODE == "preload":
+        startup.build_clients()
+    gc_stop = start_gc_worker()
+    archive_stop = start_archive_worker()
+    yield
+    if gc_stop is not None:
+        gc_stop.set()
+    if archive_stop is not None:
+        archive_stop.set()
+    title_scheduler.stop(timeout = 5)
+
 
 app = FastAPI(
     title = "LLM and RAG Chatbot API",
     description = "Production ready backend for LLM based chat bots with Retrieval-Augmented Generation",
-    version = "0.1.1"
+    version = "0.1.1",
+    lifespan = lifespan,
 )
 
 app.add_middleware(CORSMiddleware, )
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code = exc.status_code,
+        content = {"detail": exc.detail},
+        headers = {"Retry-After": str(exc.retry_after)},
+    )
+
+class RequestTraceMiddleware:
+    """Request id, Server-Timing and latency for every HTTP request.
+
+    Plain ASGI rather than @app.middleware("http"), whose call_next returns once the
+    headers are ready: latency is observed after the last body chunk, so streamed
+    bodies count in full. Spans recorded before the headers go out are in the
+    Server-Timing header; where the server supports ASGI response trailers, all
+    spans, including those recorded while the body streamed, follow as a trailer."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id, spans = start_request_trace(Headers(scope = scope).get("x-request-id"))
+        trailers = "http.response.trailers" in scope.get("extensions", {})
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_traced(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope = message)
+                headers["X-Request-ID"] = request_id
+                if spans:
+                    headers["Server-Timing"] = server_timing_header(spans)
+                if trailers:
+                    headers["Trailer"] = "Server-Timing"
+                    message["trailers"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_traced)
+        finally:
+            # the router fills in the matched route on this same scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            observe_request(scope["method"], route, status_code, time.perf_counter() - start)
+
+        if trailers:
+            timing = [(b"server-timing", server_timing_header(spans).encode())] if spans else []
+            await send({"type": "http.response.trailers", "headers": timing, "more_trailers": False})
+
+app.add_middleware(RequestTraceMiddleware)
+
 app.include_router(auth.router, tags = ["Users"])
 app.include_router(chats.router, tags = ["Chats"])
 app.include_router(chat_title.router, tags = ["Chat titles"])
@@ -20,3 +112,8 @@ app.include_router(documents.router, tags = ["Documents"])
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+@app.get("/metrics", include_in_schema = False)
+def metrics():
+    body, content_type = render_latest()
+    return Response(content = body, media_type = content_type)
@@ -5,6 +5,9 @@ from backend.database.db import get_db
 from backend.database.models import Chats, Messages, User
 from backend.database.security import get_current_user
 from backend.routers.helpers import _get_user_chat_or_404, refresh_chat_title_core
+from backend.services.chat_state import chat_state_cache
+from backend.services.llm_client.provider import get_genai_client, use_client
+from backend.services.llm_client.scheduler import Priority, llm_priority
 
 from backend.database.schemas import ChatTitleUpdate, ChatTitleRefreshOut, ChatOut
 
@@ -32,6 +35,12 @@ def update_chat_title_manual(
 
     db.commit()
     db.refresh(chat)
+    chat_state_cache.update_chat(
+        chat_id,
+        chat_title=chat.chat_title,
+        is_title_locked=True,
+        last_titled_message_id=chat.last_titled_message_id,
+    )
     return chat
 
 
@@ -40,8 +49,10 @@ def refresh_chat_title_auto(
     chat_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
+    client = Depends(get_genai_client),
 ):
     chat = _get_user_chat_or_404(db, chat_id, current_user.user_id)
 
-    result = refresh_chat_title_core(db, chat, chat_id)
+    with use_client(client), llm_priority(Priority.INTERACTIVE, current_user.user_id):
+        result = refresh_chat_title_core(db, chat, chat_id)
     return result
\ No newline at end of file
@@ -1,21 +1,43 @@
+import asyncio
+import json
 import os
-from google import genai
-from fastapi import Depends, APIRouter, HTTPException, status, BackgroundTasks
+import time
+from contextlib import closing
+
+from fastapi import Depends, APIRouter, HTTPException, status, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from typing import List, Optional
+from sqlalchemy import func, select
+from typing import Callable, List, Optional
+from pydantic import TypeAdapter
 
 from backend.database.db import get_db, SessionLocal
 from backend.database.models import Chats, Messages, User, Documents, ChatDocument
-from backend.routers.helpers import _get_user_chat_or_404, _background_refresh_title, retrieve_top_k, build_context
-from backend.database.schemas import ChatCreate, ChatOut
-from backend.services.llm_client.gemini_client import generate_reply, answer_question
-from backend.database.security import get_current_user
+from backend.routers.helpers import _get_user_chat_or_404, _get_user_chat_state_or_404, title_scheduler, _answer_from_document_cache, _cached_json_response, retrieve_top_k, build_context
+from backend.database.schemas import ChatCreate, ChatOut, ChatTurnCreate, ChatTurnOut
+from backend.services.llm_client.gemini_client import generate_reply, stream_reply, answer_question
+from backend.database.security import get_current_user, authenticate_token
 from backend.services.rag.document_processor import embed_query
 from backend.services.rag.should_use_rag import should_use_rag
+from backend.services.rag.document_profile import rank_documents
+from backend.services.metrics import track_stage, observe_request
+from backend.services.llm_client.provider import get_client, get_genai_client, use_client
+from backend.services.llm_client.scheduler import AdmissionRejected, Priority, llm_priority
+from backend.services.llm_client.resilience import CircuitOpen, DeadlineExceeded
+from backend.services.chat_state import ChatState, chat_state_cache
+from backend.services.chat_archive import archived_messages
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 router = APIRouter()
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "32"))
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "30"))
+WS_MAX_MESSAGE_CHARS = int(os.getenv("WS_MAX_MESSAGE_CHARS", "32000"))
+WS_AUTH_SUBPROTOCOL = "bearer"
+# application close code (4000-4999), mirroring HTTP 404
+WS_CHAT_NOT_FOUND = 4404
+
+_chat_list_adapter = TypeAdapter(List[ChatOut])
+
 @router.post("/chats", response_model=ChatOut)
 def create_chat(
     chat: ChatCreate,
@@ -39,16 +61,27 @@ def create_chat(
 
 @router.get("/chats", response_model=List[ChatOut])
 def get_chats(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    chats = (
-        db.query(Chats)
-        .filter(Chats.user_id == current_user.user_id)
-        .order_by(Chats.created_at.desc())
-        .all()
-    )
-    return chats
+    # every write to a chat bumps updated_at, and a new chat is the latest one; a delete
+    # lowers the count. Both come from the (user_id, updated_at) index alone
+    count, last_updated = db.execute(
+        select(func.count(Chats.chat_id), func.max(Chats.updated_at))
+        .where(Chats.user_id == current_user.user_id)
+    ).one()
+    stamp = last_updated.strftime("%Y%m%d%H%M%S%f") if last_updated else 0
+    etag = f'"chats-{current_user.user_id}-{count}-{stamp}"'
+
+    def load_rows():
+        return db.execute(
+            select(Chats.chat_title, Chats.chat_id, Chats.created_at, Chats.is_title_locked, Chats.last_titled_message_id)
+            .where(Chats.user_id == current_user.user_id)
+            .order_by(Chats.created_at.desc())
+        ).all()
+
+    return _cached_json_response(request, etag, _chat_list_adapter, load_rows)
 
 
 @router.get("/chats/{chat_id}", response_model=ChatOut)
@@ -69,100 +102,328 @@ def delete_chat(
     chat = _get_user_chat_or_404(db, chat_id, current_user.user_id)
 
     db.query(Messages).filter(Messages.chat_id == chat_id).delete(synchronize_session=False)
+    # documents left without links are reclaimed later by the document collector
+    db.query(ChatDocument).filter(ChatDocument.chat_id == chat_id).delete(synchronize_session=False)
 
     db.delete(chat)
     db.commit()
+    chat_state_cache.evict(chat_id)
     return None
 
 
+def _answer_turn(
+        db: Session,
+        question: str,
+        documents: list[dict],
+        history: list[dict],
+        on_delta: Callable[[str], None] | None = None,
+):
+    use_rag = bool(documents) and should_use_rag(get_client(), question, documents)
+
+    used_doc_id = None
+    sources = []
+
+    if use_rag:
+        qvec = None
+        doc_ids = [d["document_id"] for d in documents]
+        if len(doc_ids) > 1:
+            qvec = embed_query(text = question)
+            doc_ids = rank_documents(db, doc_ids, qvec, limit=1)
+
+        document_id = doc_ids[0]
+        used_doc_id = document_id
+
+        doc = db.get(Documents, document_id)
+        if doc is not None:
+            # detached, so ending the read transaction below does not expire it
+            db.expunge(doc)
+        # no transaction (and pooled connection) stays open across a model call
+        db.rollback()
+        cached = _answer_from_document_cache(db, doc, question) if doc else None
+        if cached is not None:
+            return cached, use_rag, used_doc_id, sources
+
+        if qvec is None:
+            qvec = embed_query(text = question)
+        top_chunks = retrieve_top_k(db, document_id=document_id, query_vec=qvec)
+        context = build_context(top_chunks)
+        sources = [{"chunk_id": c.chunk_id, "chunk_index": c.chunk_index} for c in top_chunks]
+        db.rollback()
+        if top_chunks:
+            reply = answer_question(question=question, context=context)
+        else:
+            reply = "I don't know based on the document."
+            sources = []
+    elif on_delta is not None:
+        # document answers arrive whole; plain replies are passed on as they are produced
+        pieces = []
+        with closing(stream_reply(history)) as stream:
+            for piece in stream:
+                on_delta(piece)
+                pieces.append(piece)
+        reply = "".join(pieces)
+    else:
+        reply = generate_reply(history)
+
+    return reply, use_rag, used_doc_id, sources
+
+
 @router.post("/chats/{chat_id}/generate")
 def generate(
     chat_id: int,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
+    client = Depends(get_genai_client),
 ):
-    chat = (
-        db.query(Chats)
-        .filter(and_(Chats.chat_id == chat_id, Chats.user_id == current_user.user_id))
-        .first()
-    )
-    if chat is None:
-        raise HTTPException(status_code=404, detail="Chat not found")
-
-    last_user_msg = (
-        db.query(Messages)
-        .filter(Messages.chat_id == chat_id, Messages.role == "user")
-        .order_by(Messages.message_id.desc())
-        .first()
-    )
+    state = _get_user_chat_state_or_404(db, chat_id, current_user.user_id)
+
+    last_user_msg = state.last_user_message()
     if last_user_msg is None:
-        raise HTTPException(status_code=400, detail="No user message to answer")
+        row = (
+            db.query(Messages)
+            .filter(Messages.chat_id == chat_id, Messages.role == "user")
+            .order_by(Messages.message_id.desc())
+            .first()
+        )
+        if row is None:
+            # every user message may have been moved to cold storage
+            archived = [m for m in archived_messages(db, chat_id) if m.role == "user"]
+            if not archived:
+                raise HTTPException(status_code=400, detail="No user message to answer")
+            question = archived[-1].message_content
+        else:
+            question = row.message_content
+    else:
+        question = last_user_msg.content
 
-    question = (last_user_msg.message_content or "").strip()
+    question = (question or "").strip()
     if not question:
         raise HTTPException(status_code=400, detail="question is empty")
 
-    chat_docs = (
-        db.query(ChatDocument)
-        .filter(ChatDocument.chat_id == chat_id, ChatDocument.enabled == True)
-        .all()
+    # nothing is written before the reply; end the read transaction before calling the model
+    db.rollback()
+    with use_client(client), llm_priority(Priority.INTERACTIVE, current_user.user_id):
+        reply, use_rag, used_doc_id, sources = _answer_turn(db, question, state.documents, state.history())
+
+    assistant_msg = Messages(
+        chat_id=chat_id,
+        role="assistant",
+        message_content=reply,
     )
+    with track_stage("commit"):
+        db.add(assistant_msg)
+        db.flush()
+        assistant_message_id = assistant_msg.message_id
+        db.commit()
+    chat_state_cache.append_message(chat_id, assistant_message_id, "assistant", reply)
 
-    doc_ids = [cd.document_id for cd in chat_docs]
+    title_scheduler.request(chat_id, current_user.user_id)
 
-    docs = []
-    if doc_ids:
-        docs = db.query(Documents).filter(Documents.document_id.in_(doc_ids)).all()
+    return {
+        "reply": reply,
+        "message_id": assistant_message_id,
+        "used_rag": use_rag,
+        "document_id": used_doc_id,
+        "sources": sources,
+    }
 
-    doc_brief = [{"document_id": d.document_id, "title": d.title} for d in docs]
 
-    use_rag = bool(docs) and should_use_rag(client, question, doc_brief)
+@router.post("/chats/{chat_id}/turn", response_model=ChatTurnOut)
+def send_and_generate(
+    chat_id: int,
+    payload: ChatTurnCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    client = Depends(get_genai_client),
+):
+    state = _get_user_chat_state_or_404(db, chat_id, current_user.user_id)
+    with use_client(client):
+        return _run_turn(db, state, payload.message_content)
 
-    used_doc_id = None
-    sources = []
 
-    if use_rag:
-        document_id = docs[0].document_id
-        used_doc_id = document_id
+def _run_turn(db: Session, state: ChatState, message_content: str, on_delta: Callable[[str], None] | None = None) -> dict:
+    chat_id, user_id = state.chat_id, state.user_id
 
-        qvec = embed_query(text = question)
-        top_chunks = retrieve_top_k(db, document_id=document_id, query_vec=qvec)
-        if top_chunks:
-            context = build_context(top_chunks)
-            reply = answer_question(question=question, context=context)
-            sources = [{"chunk_id": c.chunk_id, "chunk_index": c.chunk_index} for c in top_chunks]
-        else:
-            reply = "I don't know based on the document."
-            sources = []
-    else:
-        N = 50
-        rows = (
-            db.query(Messages)
-            .filter(Messages.chat_id == chat_id)
-            .order_by(Messages.message_id.desc())
-            .limit(N)
-            .all()
-        )
-        rows = list(reversed(rows))
-        history = [{"role": m.role, "content": m.message_content} for m in rows]
-        reply = generate_reply(history)
+    question = message_content.strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="question is empty")
+
+    user_msg = Messages(
+        chat_id=chat_id,
+        role="user",
+        message_content=message_content,
+    )
+    # the user message commits on its own so no transaction idles through the model call;
+    # if answering fails it stays, and /generate can answer it later
+    with track_stage("commit"):
+        db.add(user_msg)
+        db.flush()
+        user_message_id = user_msg.message_id
+        db.commit()
+    chat_state_cache.append_message(chat_id, user_message_id, "user", message_content)
+
+    history = state.history() + [{"role": "user", "content": message_content}]
+    history = history[-chat_state_cache.history_size:]
+
+    with llm_priority(Priority.INTERACTIVE, user_id):
+        reply, use_rag, used_doc_id, sources = _answer_turn(db, question, state.documents, history, on_delta)
 
     assistant_msg = Messages(
         chat_id=chat_id,
         role="assistant",
         message_content=reply,
     )
-    db.add(assistant_msg)
-    db.commit()
-    db.refresh(assistant_msg)
+    with track_stage("commit"):
+        db.add(assistant_msg)
+        db.flush()
+        assistant_message_id = assistant_msg.message_id
+        db.commit()
+    chat_state_cache.append_message(chat_id, assistant_message_id, "assistant", reply)
 
-    background_tasks.add_task(_background_refresh_title, chat_id, current_user.user_id)
+    title_scheduler.request(chat_id, user_id)
 
     return {
         "reply": reply,
-        "message_id": assistant_msg.message_id,
+        "user_message_id": user_message_id,
+        "message_id": assistant_message_id,
         "used_rag": use_rag,
         "document_id": used_doc_id,
         "sources": sources,
-    }
\ No newline at end of file
+    }
+
+
+class _ClientNotReading(Exception):
+    pass
+
+
+def _session_token(websocket: WebSocket) -> tuple[str, str | None]:
+    # browsers cannot set Authorization on a WebSocket, so they offer the token as the
+    # second subprotocol ("bearer", <jwt>); tokens never go in the URL, which gets logged
+    authorization = websocket.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        return authorization[len("bearer "):], None
+    protocols = [p.strip() for p in websocket.headers.get("sec-websocket-protocol", "").split(",")]
+    if len(protocols) == 2 and protocols[0] == WS_AUTH_SUBPROTOCOL:
+        return protocols[1], WS_AUTH_SUBPROTOCOL
+    return "", None
+
+
+def _authenticate_session(chat_id: int, token: str) -> ChatState:
+    db = SessionLocal()
+    try:
+        user = authenticate_token(db, token)
+        return _get_user_chat_state_or_404(db, chat_id, user.user_id)
+    finally:
+        db.close()
+
+
+def _session_turn(client, chat_id: int, user_id: int, message_content: str, on_delta: Callable[[str], None]) -> dict:
+    db = SessionLocal()
+    try:
+        # the same revalidated state REST turns use, so writes from other workers and tabs are seen
+        state = _get_user_chat_state_or_404(db, chat_id, user_id)
+        with use_client(client):
+            result = _run_turn(db, state, message_content, on_delta)
+    finally:
+        db.close()
+    return {"type": "reply", **result}
+
+
+def _offer(outbox: asyncio.Queue, event: dict):
+    # title updates are superseded by the next one, so they are dropped rather than queued
+    try:
+        outbox.put_nowait(event)
+    except asyncio.QueueFull:
+        pass
+
+
+@router.websocket("/chats/{chat_id}/ws")
+async def chat_session(websocket: WebSocket, chat_id: int, client = Depends(get_genai_client)):
+    token, subprotocol = _session_token(websocket)
+    try:
+        state = await run_in_threadpool(_authenticate_session, chat_id, token)
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e.detail))
+        return
+
+    await websocket.accept(subprotocol=subprotocol)
+    loop = asyncio.get_running_loop()
+    outbox: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+
+    def on_title(_chat_id: int, title: str):
+        loop.call_soon_threadsafe(_offer, outbox, {"type": "title", "chat_title": title})
+
+    async def send_events():
+        try:
+            while True:
+                await websocket.send_json(await outbox.get())
+        except (WebSocketDisconnect, RuntimeError):
+            # the receive loop notices the disconnect and cleans up
+            pass
+
+    async def emit(event: dict):
+        # a client that stops reading fills the outbox; turns wait for room, then give up on it
+        try:
+            await asyncio.wait_for(outbox.put(event), WS_SEND_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise _ClientNotReading from None
+
+    def on_delta(text: str):
+        # runs on the turn's worker thread; waiting here is what slows the model stream
+        # down to the pace of a client that reads slowly
+        asyncio.run_coroutine_threadsafe(emit({"type": "delta", "text": text}), loop).result()
+
+    sender = asyncio.create_task(send_events())
+    title_scheduler.subscribe(chat_id, on_title)
+    try:
+        await emit({
+            "type": "ready",
+            "chat_id": chat_id,
+            "chat_title": state.chat_title,
+            "documents": [{"document_id": d["document_id"], "title": d["title"]} for d in state.documents],
+        })
+
+        while True:
+            raw = await websocket.receive_text()
+            start = time.perf_counter()
+            try:
+                payload = json.loads(raw)
+                message_content = payload["message_content"]
+                if not isinstance(message_content, str):
+                    raise TypeError
+            except (ValueError, KeyError, TypeError):
+                await emit({"type": "error", "status": 400, "detail": "expected {\"message_content\": \"...\"}"})
+                continue
+            if len(message_content) > WS_MAX_MESSAGE_CHARS:
+                await emit({"type": "error", "status": 413, "detail": f"Message too long. Expected at most {WS_MAX_MESSAGE_CHARS} characters"})
+                continue
+
+            try:
+                event = await run_in_threadpool(_session_turn, client, chat_id, state.user_id, message_content, on_delta)
+            except _ClientNotReading:
+                raise
+            except AdmissionRejected as e:
+                event = {"type": "error", "status": e.status_code, "detail": e.detail, "retry_after": e.retry_after}
+            except HTTPException as e:
+                if e.status_code == 404:
+                    # the chat was deleted while connected; every later turn would fail too
+                    observe_request("WS", "/chats/{chat_id}/ws", 404, time.perf_counter() - start)
+                    await websocket.close(code=WS_CHAT_NOT_FOUND, reason="Chat not found")
+                    return
+                event = {"type": "error", "status": e.status_code, "detail": e.detail}
+            except DeadlineExceeded:
+                event = {"type": "error", "status": 504, "detail": "The model did not answer in time"}
+            except CircuitOpen:
+                event = {"type": "error", "status": 503, "detail": "The model is unavailable, try again later"}
+            except Exception:
+                # one failed turn (provider error, chat deleted meanwhile) must not end the session
+                event = {"type": "error", "status": 500, "detail": "Internal error while answering"}
+            observe_request("WS", "/chats/{chat_id}/ws", event.get("status", 200), time.perf_counter() - start)
+            await emit(event)
+    except WebSocketDisconnect:
+        pass
+    except _ClientNotReading:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="client is not reading")
+    finally:
+        title_scheduler.unsubscribe(chat_id, on_title)
+        sender.cancel()
@@ -1,25 +1,40 @@
 import os
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
 from datetime import datetime
 from fastapi import APIRouter, UploadFile, HTTPException
+from fastapi.responses import StreamingResponse
 from pathlib import Path
 
-from backend.database.models import User, Documents, ChatDocument, DocumentChunks
-from .helpers import _get_user_chat_or_404, _sha256_bytes, retrieve_top_k, build_context
+from backend.database.models import User, Documents, ChatDocument, DocumentChunks, DocumentSummaries
+from .helpers import _get_user_chat_or_404, _sha256_bytes, _known_chunk_embeddings, _answer_from_document_cache, retrieve_top_k, retrieve_top_k_batch, build_context
 from backend.database.security import get_current_user
-from backend.database.schemas import UploadDocumentResponse, ProcessDocumentResponse, AskRequest, AskResponse
+from backend.database.schemas import UploadDocumentResponse, ProcessDocumentResponse, AskRequest, AskResponse, AskBatchRequest
 from fastapi.params import Depends, File, Body
 from sqlalchemy.orm import Session
 
-from backend.database.db import get_db
+from backend.database.db import get_db, SessionLocal
 
-from backend.services.rag.document_processor import extract_text_from_file, chunk_splitter, embed_text, embed_query
+from backend.services.rag.document_processor import extract_text_from_file, chunk_document, embed_text, embed_query, embed_queries
 from backend.services.llm_client.gemini_client import answer_question
+from backend.services.metrics import track_stage
+from backend.services.llm_client.scheduler import AdmissionRejected, Priority, llm_priority
+from backend.services.llm_client.resilience import CircuitOpen, DeadlineExceeded
+from backend.services.chat_state import chat_state_cache
+from backend.services.rag.document_profile import build_document_profile
+from backend.services.llm_client.context_cache import invalidate_document_cache
+from backend.services.llm_client.provider import get_genai_client, use_client
 
 router = APIRouter()
 
 BASE_STORAGE_DIR = Path(os.getenv("BASE_STORAGE_DIR"))
 ALLOWED_MIME = os.getenv("ALLOWED_MIME")
 MAX_BYTES = int(os.getenv("MAX_BYTES"))
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "5000"))
+ASK_BATCH_CONCURRENCY = int(os.getenv("ASK_BATCH_CONCURRENCY", "8"))
+ASK_BATCH_RETRIEVE_SIZE = int(os.getenv("ASK_BATCH_RETRIEVE_SIZE", "100"))
 
 @router.post("/chats/{chat_id}/documents/upload", response_model = UploadDocumentResponse)
 def upload_document_to_chat (
@@ -45,7 +60,9 @@ def upload_document_to_chat (
     sha = _sha256_bytes(data)
     original_name = file.filename or "uploaded_file"
 
-    existing = db.query(Documents).filter(Documents.sha256 == sha).first()
+    # locked until the link commits: the document GC skips locked rows, and if it deleted this
+    # one first the lookup comes back empty and the file is stored as a new document
+    existing = db.query(Documents).filter(Documents.sha256 == sha).with_for_update().first()
 
     if existing:
         doc = existing
@@ -56,7 +73,8 @@ def upload_document_to_chat (
         if not safe_name:
             safe_name = "file"
 
-        storage_name = f"{current_user.user_id}_{sha}_{safe_name}"
+        # unique per upload, so a GC run removing a collected copy's file cannot take this one
+        storage_name = f"{current_user.user_id}_{sha}_{uuid.uuid4().hex[:8]}_{safe_name}"
         storage_path = BASE_STORAGE_DIR / storage_name
         storage_path.write_bytes(data)
 
@@ -70,6 +88,7 @@ def upload_document_to_chat (
             file_size = len(data),
             sha256 = sha,
             status = "uploaded",
+            status_updated_at = datetime.utcnow(),
             created_at = datetime.utcnow(),
         )
         db.add(doc)
@@ -85,6 +104,8 @@ def upload_document_to_chat (
         link = ChatDocument(chat_id=chat_id, document_id=doc.document_id, enabled=True)
         db.add(link)
         db.commit()
+        profile = db.get(DocumentSummaries, doc.document_id) if existing else None
+        chat_state_cache.add_document(chat_id, doc.document_id, doc.title, profile.summary if profile else None)
 
     return {
         "document": doc,
@@ -92,51 +113,108 @@ def upload_document_to_chat (
     }
 
 
-@router.post("/documents/{document_id}/process", response_model = ProcessDocumentResponse)
-def process_document (
-        document_id: int,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user)
-):
+def _set_status(doc: Documents, status: str):
+    # the GC treats a document stuck in "processing" past a timeout as abandoned
+    doc.status = status
+    doc.status_updated_at = datetime.utcnow()
 
-    doc = db.query(Documents).filter(Documents.document_id == document_id).first()
-    if not doc:
-        raise HTTPException(status_code = 404, detail = f"Document {document_id} not found")
 
-    path = doc.storage_path
+def _ingest_document(db: Session, doc: Documents, user_id: int) -> tuple[list[DocumentChunks], int]:
+    document_id = doc.document_id
 
-    if not path:
-        raise HTTPException(status_code = 400, detail = "Document has no file path")
+    with track_stage("extract"):
+        text = extract_text_from_file(doc.storage_path, "")
+
+    processed_path = BASE_STORAGE_DIR / f"{document_id}_processed.txt"
+    BASE_STORAGE_DIR.mkdir(parents = True, exist_ok = True)
+    processed_path.write_text(text)
+    doc.processed_text_path = str(processed_path)
+
+    with track_stage("chunk"):
+        chunks = chunk_document(text)
 
-    text = extract_text_from_file(path, "")
+    known = _known_chunk_embeddings(db, {c.content_hash for c in chunks})
 
-    chunks = chunk_splitter(text)
+    missing: dict[str, str] = {}
+    for c in chunks:
+        if c.content_hash not in known:
+            missing.setdefault(c.content_hash, c.text)
 
-    embeddings = embed_text(chunks = chunks)
+    with llm_priority(Priority.INGESTION, user_id):
+        new_embeddings = embed_text(chunks = list(missing.values()))
 
-    if len(chunks) != len(embeddings):
+    if len(missing) != len(new_embeddings):
         raise HTTPException(status_code = 500, detail = "Chunks/embeddings count mismatch")
 
+    known.update(zip(missing.keys(), new_embeddings))
+
     rows = []
     now = datetime.utcnow()
-    for i, (chunk_text, emb) in enumerate(zip(chunks, embeddings)):
+    for i, c in enumerate(chunks):
         rows.append(
             DocumentChunks(
                 document_id=document_id,
                 chunk_index=i,
-                content=chunk_text,
-                embedding=emb,
+                content=c.text,
+                content_hash=c.content_hash,
+                embedding=known[c.content_hash],
                 created_at=now,
             )
         )
 
-    db.add_all(rows)
+    with track_stage("profile"), llm_priority(Priority.INGESTION, user_id):
+        build_document_profile(db, document_id, doc.title, text, [r.embedding for r in rows])
+
+    invalidate_document_cache(db, document_id)
+
+    with track_stage("insert"):
+        db.query(DocumentChunks).filter(DocumentChunks.document_id == document_id).delete(synchronize_session=False)
+        db.add_all(rows)
+        _set_status(doc, "ready")
+        db.commit()
+
+    linked_chats = db.query(ChatDocument.chat_id).filter(ChatDocument.document_id == document_id).all()
+    for (chat_id, ) in linked_chats:
+        chat_state_cache.evict(chat_id)
+
+    return rows, len(new_embeddings)
+
+
+@router.post("/documents/{document_id}/process", response_model = ProcessDocumentResponse)
+def process_document (
+        document_id: int,
+        db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_user),
+        client = Depends(get_genai_client),
+):
+
+    doc = db.query(Documents).filter(Documents.document_id == document_id).first()
+    if not doc:
+        raise HTTPException(status_code = 404, detail = f"Document {document_id} not found")
+
+    path = doc.storage_path
+
+    if not path:
+        raise HTTPException(status_code = 400, detail = "Document has no file path")
+
+    # while processing, the document GC leaves the document alone even if no chat links it yet
+    _set_status(doc, "processing")
     db.commit()
+    try:
+        with use_client(client):
+            rows, embedded = _ingest_document(db, doc, current_user.user_id)
+    except Exception:
+        db.rollback()
+        _set_status(doc, "failed")
+        db.commit()
+        raise
 
     return {
         "document_id": document_id,
         "chunks_saved": len(rows),
-        "vector_dim": len(embeddings[0]) if embeddings else 0,
+        "chunks_embedded": embedded,
+        "chunks_reused": len(rows) - embedded,
+        "vector_dim": len(rows[0].embedding) if rows else 0,
         "status": "ready",
     }
 
@@ -146,14 +224,30 @@ def ask_document(
     document_id: int,
     payload: AskRequest = Body(...),
     db: Session = Depends(get_db),
+    client = Depends(get_genai_client),
 ):
     question = payload.question.strip()
     if not question:
         raise HTTPException(status_code=400, detail="question is empty")
 
+    with use_client(client), llm_priority(Priority.INTERACTIVE):
+        return _ask_document(db, document_id, question, payload.k)
+
+
+def _ask_document(db: Session, document_id: int, question: str, k: int) -> dict:
+    doc = db.query(Documents).filter(Documents.document_id == document_id).first()
+    cached = _answer_from_document_cache(db, doc, question) if doc else None
+    if cached is not None:
+        return {
+            "document_id": document_id,
+            "question": question,
+            "answer": cached,
+            "sources": [],
+        }
+
     qvec = embed_query(question)
 
-    top_chunks = retrieve_top_k(db, document_id=document_id, query_vec=qvec, k=payload.k)
+    top_chunks = retrieve_top_k(db, document_id=document_id, query_vec=qvec, k=k)
 
     if not top_chunks:
         return {
@@ -181,4 +275,94 @@ def ask_document(
     }
 
 
+def _answer_batch_item(document_id: int, index: int, question: str, top_chunks) -> dict:
+    if not top_chunks:
+        answer = "I don't know based on the document."
+    else:
+        answer = answer_question(question, build_context(top_chunks))
+
+    return {
+        "index": index,
+        "document_id": document_id,
+        "question": question,
+        "answer": answer,
+        "sources": [
+            {
+                "chunk_id": c.chunk_id,
+                "chunk_index": c.chunk_index,
+            }
+            for c in top_chunks
+        ],
+    }
+
+
+def _batch_error(index: int, document_id: int, question: str, error: Exception) -> dict:
+    # raw exception text can carry SQL, provider responses or internal paths
+    if isinstance(error, AdmissionRejected):
+        status_code, detail = error.status_code, error.detail
+    elif isinstance(error, DeadlineExceeded):
+        status_code, detail = 504, "The model did not answer in time"
+    elif isinstance(error, CircuitOpen):
+        status_code, detail = 503, "The model is unavailable, try again later"
+    else:
+        status_code, detail = 500, "Failed to answer this question"
+    return {"index": index, "document_id": document_id, "question": question, "status": status_code, "error": detail}
+
+
+@router.post("/documents/{document_id}/ask/batch")
+def ask_document_batch(
+    document_id: int,
+    payload: AskBatchRequest = Body(...),
+    client = Depends(get_genai_client),
+):
+    questions = [q.strip() for q in payload.questions]
+    if any(not q for q in questions):
+        raise HTTPException(status_code=400, detail="question is empty")
 
+    if len(questions) > ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"Too many questions. Expected at most {ASK_BATCH_MAX_QUESTIONS}, received {len(questions)}")
+
+    # scoped per call, not around stream(): each step of the body runs in a fresh context copy
+    def answer(i: int, question: str, top_chunks) -> dict:
+        with use_client(client), llm_priority(Priority.INGESTION):
+            return _answer_batch_item(document_id, i, question, top_chunks)
+
+    def retrieve(db: Session, offset: int) -> list:
+        # one sub-batch at a time keeps the query-vector parameter and the result rows bounded
+        with use_client(client), llm_priority(Priority.INGESTION):
+            qvecs = embed_queries(questions[offset:offset + ASK_BATCH_RETRIEVE_SIZE])
+        top_chunks = retrieve_top_k_batch(db, document_id=document_id, query_vecs=qvecs, k=payload.k)
+        db.rollback()
+        return top_chunks
+
+    def stream():
+        # its own session: the request's may already be closed while the body streams
+        db = SessionLocal()
+        pool = ThreadPoolExecutor(max_workers=ASK_BATCH_CONCURRENCY)
+        try:
+            for offset in range(0, len(questions), ASK_BATCH_RETRIEVE_SIZE):
+                batch = list(enumerate(questions[offset:offset + ASK_BATCH_RETRIEVE_SIZE], start=offset))
+                try:
+                    top_chunks_per_question = retrieve(db, offset)
+                except Exception as e:
+                    db.rollback()
+                    for i, question in batch:
+                        yield json.dumps(_batch_error(i, document_id, question, e)) + "\n"
+                    continue
+
+                futures = {
+                    pool.submit(copy_context().run, answer, i, question, top_chunks): i
+                    for (i, question), top_chunks in zip(batch, top_chunks_per_question)
+                }
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        item = future.result()
+                    except Exception as e:
+                        item = _batch_error(i, document_id, questions[i], e)
+                    yield json.dumps(item) + "\n"
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            db.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -1,15 +1,26 @@
 import os
 import hashlib
 
-from fastapi import HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, select
+from fastapi import HTTPException, Request, Response
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import and_, cast, func, select, text, update
+from pgvector.sqlalchemy import HALFVEC
 
 from backend.database.db import SessionLocal
-from backend.database.models import Chats, Messages, DocumentChunks
-from backend.services.llm_client.gemini_client import generate_chat_title
+from backend.database.models import ArchivedChats, Chats, Messages, DocumentChunks, Documents, ChatDocument, DocumentSummaries
+from backend.services.llm_client.gemini_client import generate_chat_title, generate_chat_titles_batch, answer_question
+from backend.services.llm_client.context_cache import get_document_cache, drop_document_cache, is_cache_missing
+from backend.services.metrics import track_stage
+from backend.services.llm_client.scheduler import AdmissionRejected, Priority, llm_priority
+from backend.services.llm_client.resilience import CircuitOpen, DeadlineExceeded
+from backend.services.chat_state import ChatState, CachedMessage, chat_state_cache
+from backend.services.title_scheduler import TitleScheduler
+from backend.services.chat_archive import archived_messages, archived_fingerprint
 
 TITLE_REFRESH_EVERY_N_MESSAGES = int(os.getenv("TITLE_REFRESH_EVERY_N_MESSAGES"))
+RETRIEVAL_ENGINE = os.getenv("RETRIEVAL_ENGINE", "sql")
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "100"))
+HNSW_ITERATIVE_SCAN = os.getenv("HNSW_ITERATIVE_SCAN", "relaxed_order")
 
 def _get_user_chat_or_404(db: Session, chat_id: int, user_id: int) -> Chats:
     chat = (
@@ -21,29 +32,239 @@ def _get_user_chat_or_404(db: Session, chat_id: int, user_id: int) -> Chats:
         raise HTTPException(status_code=404, detail="Chat not found")
     return chat
 
+def _load_chat_state(db: Session, chat_id: int) -> ChatState | None:
+    chat = db.query(Chats).filter(Chats.chat_id == chat_id).first()
+    if chat is None:
+        return None
+
+    rows = (
+        db.query(Messages.message_id, Messages.role, Messages.message_content)
+        .filter(Messages.chat_id == chat_id)
+        .order_by(Messages.message_id.desc())
+        .limit(chat_state_cache.history_size)
+        .all()
+    )
+    messages = [CachedMessage(r.message_id, r.role, r.message_content) for r in reversed(rows)]
+    if len(messages) < chat_state_cache.history_size:
+        older = archived_messages(db, chat_id)[-(chat_state_cache.history_size - len(messages)):]
+        messages = [CachedMessage(m.message_id, m.role, m.message_content) for m in older] + messages
+
+    return ChatState(
+        chat_id=chat.chat_id,
+        user_id=chat.user_id,
+        chat_title=chat.chat_title,
+        is_title_locked=bool(chat.is_title_locked),
+        last_titled_message_id=chat.last_titled_message_id,
+        messages=messages,
+        documents=_enabled_documents(db, chat_id),
+    )
+
+def _enabled_documents(db: Session, chat_id: int) -> list[dict]:
+    docs = (
+        db.query(Documents.document_id, Documents.title, DocumentSummaries.summary)
+        .join(ChatDocument, ChatDocument.document_id == Documents.document_id)
+        .outerjoin(DocumentSummaries, DocumentSummaries.document_id == Documents.document_id)
+        .filter(ChatDocument.chat_id == chat_id, ChatDocument.enabled == True)
+        .all()
+    )
+    return [{"document_id": d.document_id, "title": d.title, "summary": d.summary} for d in docs]
+
+def _latest_message_id(db: Session, chat_id: int) -> int:
+    latest = db.query(func.max(Messages.message_id)).filter(Messages.chat_id == chat_id).scalar()
+    if latest is None:
+        latest = archived_fingerprint(db, chat_id)[1]
+    return latest or 0
+
+def _documents_key(documents: list[dict]) -> list[tuple]:
+    return sorted((d["document_id"], d["title"], d["summary"]) for d in documents)
+
+def _is_current(db: Session, cached: ChatState) -> bool:
+    """Whether a cached state still matches the database: the chat row, its newest
+    message and its enabled documents (with their summaries) are all compared."""
+    chat = db.query(Chats.chat_title, Chats.is_title_locked, Chats.last_titled_message_id).filter(Chats.chat_id == cached.chat_id).first()
+    if chat is None:
+        return False
+    if (chat.chat_title, bool(chat.is_title_locked), chat.last_titled_message_id) != (
+            cached.chat_title, cached.is_title_locked, cached.last_titled_message_id):
+        return False
+    if cached.last_message_id() != _latest_message_id(db, cached.chat_id):
+        return False
+    return _documents_key(cached.documents) == _documents_key(_enabled_documents(db, cached.chat_id))
+
+def _get_user_chat_state_or_404(db: Session, chat_id: int, user_id: int) -> ChatState:
+    # other workers write through only to their own caches, so check ours against the database
+    state = chat_state_cache.get_or_load(
+        chat_id,
+        lambda: _load_chat_state(db, chat_id),
+        is_current=lambda cached: _is_current(db, cached),
+    )
+    if state is None or state.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    return state
+
 def _count_messages(db: Session, chat_id: int) -> int:
     return db.query(Messages).filter(Messages.chat_id == chat_id).count()
 
 def _get_recent_history_for_title(db: Session, chat_id: int, limit: int = 12) -> list[dict]:
+    # the opening messages name a chat; once it has been archived they are in cold storage
+    history = [{"role": m.role, "content": m.message_content} for m in archived_messages(db, chat_id)[:limit]]
+    if len(history) >= limit:
+        return history
     rows = (
         db.query(Messages)
         .filter(Messages.chat_id == chat_id)
         .order_by(Messages.created_at.asc())
-        .limit(limit)
+        .limit(limit - len(history))
         .all()
     )
-    return [{"role": m.role, "content": m.message_content} for m in rows]
+    return history + [{"role": m.role, "content": m.message_content} for m in rows]
+
+def _archived_since(db: Session, chat_id: int, after_id: int | None, archived_last_id: int) -> int:
+    # every archived id is below every hot one, so the archive only counts when it ends after after_id
+    if after_id is None or archived_last_id <= after_id:
+        return 0
+    return sum(1 for m in archived_messages(db, chat_id) if m.message_id > after_id)
+
+def _due_title_refreshes(db: Session, pending: dict[int, int]) -> dict[int, int]:
+    since_titled = func.count(Messages.message_id).filter(
+        Messages.message_id > func.coalesce(Chats.last_titled_message_id, 0)
+    )
+    # outer joins: an archived chat may have few or no hot messages left
+    rows = db.execute(
+        select(
+            Chats.chat_id,
+            Chats.user_id,
+            Chats.last_titled_message_id,
+            func.count(Messages.message_id).label("hot"),
+            func.max(Messages.message_id).label("hot_last_id"),
+            since_titled.label("hot_since"),
+            ArchivedChats.message_count.label("archived"),
+            ArchivedChats.last_message_id.label("archived_last_id"),
+        )
+        .outerjoin(Messages, Messages.chat_id == Chats.chat_id)
+        .outerjoin(ArchivedChats, ArchivedChats.chat_id == Chats.chat_id)
+        .where(Chats.chat_id.in_(list(pending)), Chats.is_title_locked == False)
+        .group_by(Chats.chat_id, ArchivedChats.chat_id)
+    ).all()
+
+    due = {}
+    for r in rows:
+        if r.user_id != pending[r.chat_id] or r.hot + (r.archived or 0) < 2:
+            continue
+        if r.last_titled_message_id is not None:
+            since = r.hot_since + _archived_since(db, r.chat_id, r.last_titled_message_id, r.archived_last_id or 0)
+            if since < TITLE_REFRESH_EVERY_N_MESSAGES:
+                continue
+        due[r.chat_id] = r.hot_last_id or r.archived_last_id
+    return due
+
+def _recent_histories_for_titles(db: Session, chat_ids, limit: int = 12) -> dict[int, list[dict]]:
+    ranked = (
+        select(
+            Messages.chat_id,
+            Messages.role,
+            Messages.message_content,
+            func.row_number().over(
+                partition_by=Messages.chat_id,
+                order_by=(Messages.created_at.asc(), Messages.message_id.asc()),
+            ).label("position"),
+        )
+        .where(Messages.chat_id.in_(chat_ids))
+        .subquery()
+    )
+    rows = db.execute(
+        select(ranked.c.chat_id, ranked.c.role, ranked.c.message_content)
+        .where(ranked.c.position <= limit)
+        .order_by(ranked.c.chat_id, ranked.c.position)
+    ).all()
+
+    hot = {chat_id: [] for chat_id in chat_ids}
+    for r in rows:
+        hot[r.chat_id].append({"role": r.role, "content": r.message_content})
+
+    archived = set(db.execute(select(ArchivedChats.chat_id).where(ArchivedChats.chat_id.in_(chat_ids))).scalars())
+    histories = {}
+    for chat_id in chat_ids:
+        # archived messages come first: they are the chat's opening
+        older = [{"role": m.role, "content": m.message_content} for m in archived_messages(db, chat_id)[:limit]] if chat_id in archived else []
+        histories[chat_id] = (older + hot[chat_id])[:limit]
+    return histories
 
-def _background_refresh_title(chat_id: int, user_id: int):
+def refresh_chat_titles_batch(pending: dict[int, int]):
+    """Titles every due chat in `pending` (chat_id -> user_id, one user's chats as the
+    TitleScheduler batches them) with one LLM call and one session."""
     db = SessionLocal()
     try:
-        chat = _get_user_chat_or_404(db, chat_id, user_id)
-        refresh_chat_title_core(db, chat, chat_id)
+        due = _due_title_refreshes(db, pending)
+        if not due:
+            return
+        histories = _recent_histories_for_titles(db, list(due))
+        # no transaction stays open across the LLM call
+        db.rollback()
+
+        with llm_priority(Priority.TITLE):
+            titles = generate_chat_titles_batch(histories)
+
+        updated = []
+        for chat_id, title in titles.items():
+            title = " ".join(title.replace("—", " ").replace("-", " ").split()[:3])
+            if not title:
+                continue
+            # a title the user set while the batch was generating wins
+            result = db.execute(
+                update(Chats)
+                .where(Chats.chat_id == chat_id, Chats.is_title_locked == False)
+                .values(chat_title=title, last_titled_message_id=due[chat_id])
+            )
+            if result.rowcount:
+                updated.append((chat_id, title))
+        db.commit()
     finally:
         db.close()
 
+    for chat_id, title in updated:
+        chat_state_cache.update_chat(chat_id, chat_title=title, last_titled_message_id=due[chat_id])
+        title_scheduler.publish(chat_id, title)
+
+title_scheduler = TitleScheduler(refresh_chat_titles_batch)
+
+
+def retrieve_top_k(db, document_id: int, query_vec: list[float], k: int = 5, engine: str = RETRIEVAL_ENGINE):
+    with track_stage("retrieve"):
+        return _retrieve_top_k(db, document_id, query_vec, k, engine)
+
+
+def _retrieve_top_k(db, document_id: int, query_vec: list[float], k: int, engine: str):
+    if engine == "numpy":
+        from backend.services.rag import vector_index
+
+        chunks = vector_index.top_k(db, document_id, query_vec, k)
+        if chunks is not None:
+            return chunks
+    elif engine == "hnsw":
+        # uses the per-partition halfvec indexes from backend.database.partitioning
+        db.execute(text("SELECT set_config('hnsw.ef_search', :ef, true)"), {"ef": str(HNSW_EF_SEARCH)})
+        if HNSW_ITERATIVE_SCAN:
+            # keeps scanning past the document_id filter until k rows match (pgvector 0.8+); it
+            # still stops at hnsw.max_scan_tuples, so a small document in a large partition can
+            # come back with fewer than k chunks
+            db.execute(text("SELECT set_config('hnsw.iterative_scan', :mode, true)"), {"mode": HNSW_ITERATIVE_SCAN})
+        distance = cast(DocumentChunks.embedding, HALFVEC(3072)).cosine_distance(cast(query_vec, HALFVEC(3072)))
+        # relaxed_order may return the k rows slightly out of order; the materialized CTE
+        # keeps the index scan and the outer query puts them back in distance order
+        nearest = (
+            select(DocumentChunks, distance.label("distance"))
+            .where(DocumentChunks.document_id == document_id)
+            .order_by(distance)
+            .limit(k)
+            .cte("nearest")
+            .prefix_with("MATERIALIZED")
+        )
+        chunk = aliased(DocumentChunks, nearest)
+        return db.execute(select(chunk).order_by(nearest.c.distance)).scalars().all()
+    elif engine != "sql":
+        raise ValueError(f"Unknown retrieval engine: {engine}")
 
-def retrieve_top_k(db, document_id: int, query_vec: list[float], k: int = 5):
     sql_statement = (
         select(DocumentChunks)
         .where(DocumentChunks.document_id == document_id)
@@ -53,32 +274,113 @@ def retrieve_top_k(db, document_id: int, query_vec: list[float], k: int = 5):
     return db.execute(sql_statement).scalars().all()
 
 
+def _vector_literal(vec) -> str:
+    return "[" + ",".join(str(float(x)) for x in vec) + "]"
+
+
+def retrieve_top_k_batch(db, document_id: int, query_vecs: list[list[float]], k: int = 5) -> list[list]:
+    if not query_vecs:
+        return []
+
+    sql_statement = text(
+        """
+        SELECT q.ord, c.chunk_id, c.chunk_index, c.content, c.distance
+        FROM unnest(CAST(:query_vecs AS text[])) WITH ORDINALITY AS q(vec, ord)
+        CROSS JOIN LATERAL (
+            SELECT chunk_id, chunk_index, content, embedding <=> CAST(q.vec AS vector) AS distance
+            FROM document_chunks
+            WHERE document_id = :document_id
+            ORDER BY distance
+            LIMIT :k
+        ) AS c
+        ORDER BY q.ord, c.distance
+        """
+    )
+    with track_stage("retrieve_batch"):
+        rows = db.execute(
+            sql_statement,
+            {
+                "query_vecs": [_vector_literal(v) for v in query_vecs],
+                "document_id": document_id,
+                "k": k,
+            },
+        ).all()
+
+    results = [[] for _ in query_vecs]
+    for row in rows:
+        results[row.ord - 1].append(row)
+    return results
+
+
+def _answer_from_document_cache(db: Session, doc: Documents, question: str) -> str | None:
+    cache_name = get_document_cache(doc)
+    if cache_name is None:
+        return None
+    try:
+        return answer_question(question, "", cached_content=cache_name)
+    except (AdmissionRejected, DeadlineExceeded, CircuitOpen):
+        # the retrieval path would queue for and call the same provider; answer 429/503/504
+        raise
+    except Exception as e:
+        if is_cache_missing(e):
+            # expired or evicted on the provider side; forget it and use retrieval this time
+            drop_document_cache(doc.document_id)
+        return None
+
+
 def build_context(chunks) -> str:
     return "\n\n".join(
         f"[chunk {c.chunk_index}]\n{c.content}"
         for c in chunks
     )
 
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+def _cached_json_response(request: Request, etag: str, adapter, load_rows) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    rows = load_rows()
+    return Response(
+        content=adapter.dump_json(adapter.validate_python([r._asdict() for r in rows])),
+        media_type="application/json",
+        headers=headers,
+    )
+
 def _sha256_bytes(data: bytes) -> str:
     return hashlib.sha256(data).hexdigest()
 
+def _known_chunk_embeddings(db: Session, hashes: set[str], batch_size: int = 1000) -> dict:
+    known = {}
+    hashes = list(hashes)
+    for start in range(0, len(hashes), batch_size):
+        batch = hashes[start:start + batch_size]
+        rows = db.execute(
+            select(DocumentChunks.content_hash, DocumentChunks.embedding)
+            .where(DocumentChunks.content_hash.in_(batch), DocumentChunks.embedding.is_not(None))
+            .distinct(DocumentChunks.content_hash)
+        ).all()
+        known.update((r.content_hash, r.embedding) for r in rows)
+    return known
+
 def refresh_chat_title_core(db: Session, chat: Chats, chat_id: int) -> dict:
     if getattr(chat, "is_title_locked", False):
         return {"updated": False, "reason": "title_locked_by_user", "chat_title": chat.chat_title}
 
-    total = db.query(Messages).filter(Messages.chat_id == chat_id).count()
+    archived_count, archived_last_id = archived_fingerprint(db, chat_id)
+    total = db.query(Messages).filter(Messages.chat_id == chat_id).count() + archived_count
     if total < 2:
         return {"updated": False, "reason": "not_enough_messages", "chat_title": chat.chat_title}
 
     last_titled_id = getattr(chat, "last_titled_message_id", None)
 
-    last_msg = (
-        db.query(Messages)
-        .filter(Messages.chat_id == chat_id)
-        .order_by(Messages.message_id.desc())
-        .first()
-    )
-    if not last_msg:
+    last_message_id = _latest_message_id(db, chat_id)
+    if not last_message_id:
         return {"updated": False, "reason": "no_messages", "chat_title": chat.chat_title}
 
     if last_titled_id is not None:
@@ -86,7 +388,7 @@ def refresh_chat_title_core(db: Session, chat: Chats, chat_id: int) -> dict:
             db.query(Messages)
             .filter(Messages.chat_id == chat_id, Messages.message_id > last_titled_id)
             .count()
-        )
+        ) + _archived_since(db, chat_id, last_titled_id, archived_last_id)
         if since < TITLE_REFRESH_EVERY_N_MESSAGES:
             return {
                 "updated": False,
@@ -105,9 +407,10 @@ def refresh_chat_title_core(db: Session, chat: Chats, chat_id: int) -> dict:
         return {"updated": False, "reason": "empty_title", "chat_title": chat.chat_title}
 
     chat.chat_title = new_title
-    chat.last_titled_message_id = last_msg.message_id
+    chat.last_titled_message_id = last_message_id
 
     db.commit()
     db.refresh(chat)
+    chat_state_cache.update_chat(chat_id, chat_title=chat.chat_title, last_titled_message_id=chat.last_titled_message_id)
 
     return {"updated": True, "reason": "auto_refreshed", "chat_title": chat.chat_title}
\ No newline at end of file
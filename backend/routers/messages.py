@@ -1,27 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from typing import List
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from backend.database.models import Messages, Chats
 from backend.database.schemas import MessageOut, MessageCreate
 from backend.database.db import get_db
+from backend.services.chat_state import chat_state_cache
+from backend.services.chat_archive import archived_fingerprint, archived_messages
+from backend.routers.helpers import _cached_json_response
 
 router = APIRouter()
 
+_message_list_adapter = TypeAdapter(List[MessageOut])
+
 @router.get("/chats/{chat_id}/messages", response_model=List[MessageOut])
-def get_messages(chat_id: int, limit: int = 50, db: Session = Depends(get_db)):
-    chat = db.query(Chats).filter(Chats.chat_id == chat_id).first()
+def get_messages(request: Request, chat_id: int, limit: int = 50, db: Session = Depends(get_db)):
+    chat = db.query(Chats.chat_id).filter(Chats.chat_id == chat_id).first()
     if chat is None:
         raise HTTPException(status_code=404, detail="Chat not found")
 
-    messages = (
-        db.query(Messages)
-        .filter(Messages.chat_id == chat_id)
-        .order_by(Messages.created_at.asc())
-        .limit(limit)
-        .all()
-    )
-    return messages
+    # messages are append-only, so count and newest id identify the listing;
+    # archiving only moves messages, so summing both tiers keeps the tag stable
+    count, max_id = db.execute(
+        select(func.count(Messages.message_id), func.max(Messages.message_id))
+        .where(Messages.chat_id == chat_id)
+    ).one()
+    archived_count, archived_max_id = archived_fingerprint(db, chat_id)
+    etag = f'"messages-{chat_id}-{limit}-{count + archived_count}-{max(max_id or 0, archived_max_id)}"'
+
+    def load_rows():
+        archived = archived_messages(db, chat_id)[:limit] if archived_count else []
+        if len(archived) >= limit:
+            return archived
+        return archived + db.execute(
+            select(Messages.message_id, Messages.chat_id, Messages.role, Messages.created_at, Messages.message_content)
+            .where(Messages.chat_id == chat_id)
+            .order_by(Messages.created_at.asc(), Messages.message_id.asc())
+            .limit(limit - len(archived))
+        ).all()
+
+    return _cached_json_response(request, etag, _message_list_adapter, load_rows)
 
 
 @router.post("/chats/{chat_id}/messages", response_model=MessageOut)
@@ -39,5 +59,6 @@ def create_messages(chat_id: int, message: MessageCreate, db: Session = Depends(
     db.add(message_db)
     db.commit()
     db.refresh(message_db)
+    chat_state_cache.append_message(chat_id, message_db.message_id, message_db.role, message_db.message_content)
 
     return message_db
\ No newline at end of file
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import threading
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from backend.database.db import SessionLocal
+from backend.database.models import ArchivedChats, Chats, Messages
+from backend.services.metrics import record_archive_run
+
+CHAT_ARCHIVE_AFTER_DAYS = int(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "90"))
+CHAT_ARCHIVE_BATCH_SIZE = int(os.getenv("CHAT_ARCHIVE_BATCH_SIZE", "100"))
+CHAT_ARCHIVE_INTERVAL_SECONDS = int(os.getenv("CHAT_ARCHIVE_INTERVAL_SECONDS", "0"))
+
+ArchivedMessage = namedtuple("ArchivedMessage", ["message_id", "chat_id", "role", "created_at", "message_content"])
+
+
+def _encode(messages: list[ArchivedMessage]) -> bytes:
+    rows = [[m.message_id, m.role, m.message_content, m.created_at.isoformat()] for m in messages]
+    return zlib.compress(json.dumps(rows, ensure_ascii = False).encode(), 6)
+
+
+def _decode(chat_id: int, payload: bytes) -> list[ArchivedMessage]:
+    return [
+        ArchivedMessage(message_id, chat_id, role, datetime.fromisoformat(created_at), content)
+        for message_id, role, content, created_at in json.loads(zlib.decompress(payload))
+    ]
+
+
+def archived_fingerprint(db: Session, chat_id: int) -> tuple[int, int]:
+    row = db.execute(
+        select(ArchivedChats.message_count, ArchivedChats.last_message_id).where(ArchivedChats.chat_id == chat_id)
+    ).first()
+    return (row.message_count, row.last_message_id) if row else (0, 0)
+
+
+def archived_messages(db: Session, chat_id: int) -> list[ArchivedMessage]:
+    """Messages moved to cold storage for `chat_id`, oldest first. Every archived message
+    predates the chat's remaining hot messages."""
+    payload = db.execute(select(ArchivedChats.payload).where(ArchivedChats.chat_id == chat_id)).scalar_one_or_none()
+    return _decode(chat_id, payload) if payload else []
+
+
+def _inactive_chats(db: Session, cutoff: datetime, after_id: int, limit: int) -> list[tuple[int, int]]:
+    return db.execute(
+        select(Messages.chat_id, func.max(Messages.message_id))
+        .where(Messages.chat_id > after_id)
+        .group_by(Messages.chat_id)
+        .having(func.max(Messages.created_at) < cutoff)
+        .order_by(Messages.chat_id)
+        .limit(limit)
+    ).all()
+
+
+def _archive_chat(db: Session, chat_id: int, last_id: int) -> int:
+    rows = db.execute(
+        select(Messages.message_id, Messages.chat_id, Messages.role, Messages.created_at, Messages.message_content)
+        .where(Messages.chat_id == chat_id, Messages.message_id <= last_id)
+        .order_by(Messages.created_at.asc(), Messages.message_id.asc())
+    ).all()
+    if not rows:
+        return 0
+
+    archive = db.get(ArchivedChats, chat_id, with_for_update = True)
+    messages = _decode(chat_id, archive.payload) if archive else []
+    messages += [ArchivedMessage(*r) for r in rows]
+
+    if archive is None:
+        archive = ArchivedChats(chat_id = chat_id)
+        db.add(archive)
+    archive.payload = _encode(messages)
+    archive.message_count = len(messages)
+    archive.last_message_id = max(m.message_id for m in messages)
+    archive.last_message_at = max(m.created_at for m in messages)
+    archive.archived_at = datetime.utcnow()
+
+    # only the archived ids are removed; a message written meanwhile stays hot
+    db.query(Messages).filter(Messages.chat_id == chat_id, Messages.message_id <= last_id).delete(synchronize_session = False)
+    return len(rows)
+
+
+def archive_inactive_chats(
+        older_than_days: int = CHAT_ARCHIVE_AFTER_DAYS,
+        batch_size: int = CHAT_ARCHIVE_BATCH_SIZE,
+) -> tuple[int, int]:
+    """Moves the messages of chats idle for `older_than_days` into compressed rows of
+    archived_chats, one batch of chats per transaction. Returns (chats, messages)."""
+    cutoff = datetime.utcnow() - timedelta(days = older_than_days)
+    chats = messages = 0
+    after_id = 0
+
+    while True:
+        db = SessionLocal()
+        try:
+            candidates = _inactive_chats(db, cutoff, after_id, batch_size)
+            if not candidates:
+                break
+            after_id = candidates[-1][0]
+
+            last_ids = dict(candidates)
+            locked = db.execute(
+                select(Chats.chat_id)
+                .where(Chats.chat_id.in_(list(last_ids)))
+                .with_for_update(skip_locked = True)
+            ).scalars().all()
+
+            for chat_id in locked:
+                moved = _archive_chat(db, chat_id, last_ids[chat_id])
+                chats += 1 if moved else 0
+                messages += moved
+            db.commit()
+        finally:
+            db.close()
+
+    return chats, messages
+
+
+def _run_periodically(stop: threading.Event, interval_seconds: int):
+    while not stop.wait(interval_seconds):
+        try:
+            chats, messages = archive_inactive_chats()
+        except Exception:
+            record_archive_run(0, 0, failed = True)
+            continue
+        record_archive_run(chats, messages)
+
+
+def start_archive_worker(interval_seconds: int = CHAT_ARCHIVE_INTERVAL_SECONDS) -> threading.Event | None:
+    if interval_seconds <= 0:
+        return None
+    stop = threading.Event()
+    threading.Thread(target = _run_periodically, args = (stop, interval_seconds), name = "chat-archive", daemon = True).start()
+    return stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Move messages of inactive chats into compressed cold storage")
+    parser.add_argument("--older-than-days", type = int, default = CHAT_ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type = int, default = CHAT_ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    chats, messages = archive_inactive_chats(args.older_than_days, args.batch_size)
+    print(f"archived {messages} messages from {chats} chats")
+
+
+if __name__ == "__main__":
+    main()
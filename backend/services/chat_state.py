@@ -0,0 +1,152 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Callable
+
+CHAT_STATE_CACHE_SIZE = int(os.getenv("CHAT_STATE_CACHE_SIZE", "1024"))
+CHAT_STATE_HISTORY_SIZE = int(os.getenv("CHAT_STATE_HISTORY_SIZE", "50"))
+
+
+@dataclass(frozen = True)
+class CachedMessage:
+    message_id: int
+    role: str
+    content: str
+
+
+@dataclass
+class ChatState:
+    chat_id: int
+    user_id: int
+    chat_title: str
+    is_title_locked: bool
+    last_titled_message_id: int | None
+    messages: list[CachedMessage] = field(default_factory = list)
+    documents: list[dict] = field(default_factory = list)
+
+    def history(self) -> list[dict]:
+        return [{"role": m.role, "content": m.content} for m in self.messages]
+
+    def last_message_id(self) -> int:
+        return self.messages[-1].message_id if self.messages else 0
+
+    def last_user_message(self) -> CachedMessage | None:
+        for m in reversed(self.messages):
+            if m.role == "user":
+                return m
+        return None
+
+
+class ChatStateCache:
+    """Per-worker LRU of chat state, kept current write-through by the routers.
+
+    Every write bumps a per-chat generation; a loader that read the database before
+    a concurrent write landed cannot install its (now stale) snapshot."""
+
+    def __init__(self, max_chats: int = CHAT_STATE_CACHE_SIZE, history_size: int = CHAT_STATE_HISTORY_SIZE):
+        self.max_chats = max_chats
+        self.history_size = history_size
+        self._lock = threading.Lock()
+        self._states: OrderedDict[int, ChatState] = OrderedDict()
+        self._generations: OrderedDict[int, int] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_chats > 0
+
+    def _bump(self, chat_id: int):
+        self._generations[chat_id] = self._generations.get(chat_id, 0) + 1
+        self._generations.move_to_end(chat_id)
+        while len(self._generations) > self.max_chats * 4:
+            stale_id, _ = self._generations.popitem(last = False)
+            self._states.pop(stale_id, None)
+
+    def generation(self, chat_id: int) -> int:
+        with self._lock:
+            return self._generations.get(chat_id, 0)
+
+    def get(self, chat_id: int) -> ChatState | None:
+        with self._lock:
+            state = self._states.get(chat_id)
+            if state is None:
+                return None
+            self._states.move_to_end(chat_id)
+            return replace(state, messages = list(state.messages), documents = list(state.documents))
+
+    def put(self, state: ChatState, generation: int) -> bool:
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self._generations.get(state.chat_id, 0) != generation:
+                return False
+            state.messages = sorted(state.messages, key = lambda m: m.message_id)[-self.history_size:]
+            self._states[state.chat_id] = state
+            self._states.move_to_end(state.chat_id)
+            while len(self._states) > self.max_chats:
+                self._states.popitem(last = False)
+            return True
+
+    def get_or_load(
+            self,
+            chat_id: int,
+            loader: Callable[[], ChatState | None],
+            is_current: Callable[[ChatState], bool] | None = None,
+    ) -> ChatState | None:
+        state = self.get(chat_id)
+        if state is not None:
+            if is_current is None or is_current(state):
+                return state
+            # another worker wrote to this chat; our copy is behind
+            self.evict(chat_id)
+        generation = self.generation(chat_id)
+        state = loader()
+        if state is not None:
+            self.put(state, generation)
+            state = replace(state, messages = list(state.messages), documents = list(state.documents))
+        return state
+
+    def evict(self, chat_id: int):
+        with self._lock:
+            self._bump(chat_id)
+            self._states.pop(chat_id, None)
+
+    def append_message(self, chat_id: int, message_id: int, role: str, content: str):
+        with self._lock:
+            self._bump(chat_id)
+            state = self._states.get(chat_id)
+            if state is None:
+                return
+            messages = state.messages
+            if any(m.message_id == message_id for m in messages):
+                return
+            messages.append(CachedMessage(message_id, role, content))
+            if len(messages) > 1 and messages[-2].message_id > message_id:
+                messages.sort(key = lambda m: m.message_id)
+            del messages[:-self.history_size]
+
+    def update_chat(self, chat_id: int, **fields):
+        with self._lock:
+            self._bump(chat_id)
+            state = self._states.get(chat_id)
+            if state is None:
+                return
+            for name, value in fields.items():
+                setattr(state, name, value)
+
+    def add_document(self, chat_id: int, document_id: int, title: str, summary: str | None = None):
+        with self._lock:
+            self._bump(chat_id)
+            state = self._states.get(chat_id)
+            if state is None:
+                return
+            if all(d["document_id"] != document_id for d in state.documents):
+                state.documents.append({"document_id": document_id, "title": title, "summary": summary})
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+            self._generations.clear()
+
+
+chat_state_cache = ChatStateCache()
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend.database.db import SessionLocal
+from backend.database.models import Documents, DocumentContextCaches
+from backend.services.llm_client.provider import get_client
+from backend.services.llm_client.gemini_client import ANSWER_INSTRUCTIONS, MODEL_NAME
+from backend.services.llm_client.resilience import resilient_call
+from backend.services.llm_client.scheduler import AdmissionRejected, llm_slot
+from backend.services.llm_client.single_flight import SingleFlight
+from backend.services.metrics import track_stage
+
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "0") == "1"
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+CONTEXT_CACHE_REFRESH_MARGIN_SECONDS = int(os.getenv("CONTEXT_CACHE_REFRESH_MARGIN_SECONDS", "60"))
+CONTEXT_CACHE_MIN_CHARS = int(os.getenv("CONTEXT_CACHE_MIN_CHARS", "16000"))
+CONTEXT_CACHE_MAX_CHARS = int(os.getenv("CONTEXT_CACHE_MAX_CHARS", "2000000"))
+CONTEXT_CACHE_FAILURE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_FAILURE_TTL_SECONDS", "300"))
+
+# one create per (document, model) at a time; other documents are not held up behind it
+_create_flight = SingleFlight("context_cache_create")
+_failed_until: dict[tuple[int, str], float] = {}
+_failed_lock = threading.Lock()
+
+
+def create_cache(text: str, model: str = MODEL_NAME, ttl_seconds: int = CONTEXT_CACHE_TTL_SECONDS, display_name: str | None = None):
+    from google.genai import types
+
+    config = types.CreateCachedContentConfig(
+        display_name = display_name,
+        system_instruction = ANSWER_INSTRUCTIONS,
+        contents = [{"role": "user", "parts": [{"text": f"CONTEXT:\n{text}"}]}],
+        ttl = f"{ttl_seconds}s",
+    )
+    # no hedging: a second in-flight create would upload and bill the document twice
+    with llm_slot(), track_stage("context_cache_create"):
+        return resilient_call("context_cache_create", model,
+            lambda: get_client().caches.create(model = model, config = config), hedge = False)
+
+
+def delete_cache(cache_name: str):
+    try:
+        get_client().caches.delete(name = cache_name)
+    except Exception:
+        # the provider drops expired caches on its own
+        pass
+
+
+def is_cache_missing(error: BaseException) -> bool:
+    """The provider no longer has the cache: it expired or was evicted (404), or the
+    API reports it as not found or inaccessible (403)."""
+    code = getattr(error, "code", None)
+    if not isinstance(code, int):
+        code = getattr(error, "status_code", None)
+    return code == 404 or (code == 403 and "cache" in str(error).lower())
+
+
+def is_cacheable(text: str) -> bool:
+    return CONTEXT_CACHE_MIN_CHARS <= len(text) <= CONTEXT_CACHE_MAX_CHARS
+
+
+def _lookup(db: Session, document_id: int, model: str) -> DocumentContextCaches | None:
+    return (
+        db.query(DocumentContextCaches)
+        .populate_existing()
+        .filter(DocumentContextCaches.document_id == document_id, DocumentContextCaches.model == model)
+        .first()
+    )
+
+
+def _recently_failed(key: tuple[int, str]) -> bool:
+    with _failed_lock:
+        until = _failed_until.get(key)
+        if until is None:
+            return False
+        if until > time.monotonic():
+            return True
+        del _failed_until[key]
+        return False
+
+
+def _remember_failure(key: tuple[int, str]):
+    with _failed_lock:
+        _failed_until[key] = time.monotonic() + CONTEXT_CACHE_FAILURE_TTL_SECONDS
+
+
+def _create_document_cache(db: Session, doc: Documents, model: str, text: str) -> str:
+    margin = timedelta(seconds = CONTEXT_CACHE_REFRESH_MARGIN_SECONDS)
+    row = _lookup(db, doc.document_id, model)
+    if row is not None and row.expires_at - margin > datetime.utcnow():
+        return row.cache_name
+
+    cache = create_cache(text, model, display_name = f"document-{doc.document_id}")
+    usage = getattr(cache, "usage_metadata", None)
+    values = {
+        "cache_name": cache.name,
+        "token_count": getattr(usage, "total_token_count", None),
+        "expires_at": datetime.utcnow() + timedelta(seconds = CONTEXT_CACHE_TTL_SECONDS),
+        "created_at": datetime.utcnow(),
+    }
+
+    # another worker may store its own cache for the document meanwhile; only one row
+    # wins, and the loser deletes the cache it just paid for and uses the winner's
+    try:
+        if row is None:
+            db.add(DocumentContextCaches(document_id = doc.document_id, model = model, **values))
+            db.flush()
+            won = True
+        else:
+            replaced = row.cache_name
+            won = db.execute(
+                update(DocumentContextCaches)
+                .where(
+                    DocumentContextCaches.document_id == doc.document_id,
+                    DocumentContextCaches.model == model,
+                    DocumentContextCaches.cache_name == replaced,
+                )
+                .values(**values)
+            ).rowcount == 1
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        won = False
+
+    if won:
+        if row is not None and replaced != cache.name:
+            delete_cache(replaced)
+        return cache.name
+
+    delete_cache(cache.name)
+    row = _lookup(db, doc.document_id, model)
+    if row is None:
+        raise RuntimeError(f"Context cache for document {doc.document_id} vanished while creating it")
+    return row.cache_name
+
+
+def get_document_cache(doc: Documents, model: str = MODEL_NAME) -> str | None:
+    """Name of a live provider cache holding the document, creating one when needed.
+    None means answer through retrieval: caching is off, the document is out of range,
+    or creating its cache failed recently."""
+    if not CONTEXT_CACHE_ENABLED or not doc.processed_text_path:
+        return None
+
+    key = (doc.document_id, model)
+    if _recently_failed(key):
+        return None
+    margin = timedelta(seconds = CONTEXT_CACHE_REFRESH_MARGIN_SECONDS)
+
+    # cache bookkeeping commits on its own session so it never commits the caller's open transaction
+    db = SessionLocal()
+    try:
+        row = _lookup(db, doc.document_id, model)
+        if row is not None and row.expires_at - margin > datetime.utcnow():
+            return row.cache_name
+
+        path = Path(doc.processed_text_path)
+        if not path.exists():
+            return None
+        text = path.read_text()
+        if not is_cacheable(text):
+            return None
+
+        try:
+            return _create_flight.do(key, lambda: _create_document_cache(db, doc, model, text))
+        except AdmissionRejected:
+            # load shedding, not a cache problem; the caller answers 429
+            raise
+        except Exception:
+            # the document is still answerable through retrieval; skip its cache for a while
+            # instead of paying for a failing create on every question
+            db.rollback()
+            _remember_failure(key)
+            return None
+    finally:
+        db.close()
+
+
+def drop_document_cache(document_id: int, model: str = MODEL_NAME):
+    db = SessionLocal()
+    try:
+        db.query(DocumentContextCaches).filter(
+            DocumentContextCaches.document_id == document_id,
+            DocumentContextCaches.model == model,
+        ).delete(synchronize_session = False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def invalidate_document_cache(db: Session, document_id: int):
+    rows = db.query(DocumentContextCaches).filter(DocumentContextCaches.document_id == document_id).all()
+    for row in rows:
+        delete_cache(row.cache_name)
+        db.delete(row)
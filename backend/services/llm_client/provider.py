@@ -0,0 +1,81 @@
+import importlib.util
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_client = None
+_lock = threading.Lock()
+_scoped_client: ContextVar = ContextVar("genai_client", default = None)
+
+
+def _build_client():
+    import httpx
+    from dotenv import load_dotenv
+    from google import genai
+    from google.genai import types
+
+    from backend.services.llm_client.resilience import GEMINI_DEADLINE_SECONDS
+
+    # the API key and transport settings are read when the client is first built
+    load_dotenv()
+
+    # a call abandoned at its deadline must not keep running (and using quota) after
+    # its scheduler slot is released, so the transport gives up no later than that
+    deadline_ms = int(GEMINI_DEADLINE_SECONDS * 1000)
+    timeout_ms = min(int(os.getenv("GEMINI_TIMEOUT_MS", str(deadline_ms))), deadline_ms)
+    limits = httpx.Limits(
+        max_connections = int(os.getenv("GEMINI_MAX_CONNECTIONS", "64")),
+        max_keepalive_connections = int(os.getenv("GEMINI_MAX_KEEPALIVE_CONNECTIONS", "32")),
+        keepalive_expiry = float(os.getenv("GEMINI_KEEPALIVE_EXPIRY", "60")),
+    )
+    http2 = os.getenv("GEMINI_HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+    client_args = {"limits": limits, "http2": http2}
+
+    http_options = types.HttpOptions(
+        timeout = timeout_ms,
+        client_args = client_args,
+        async_client_args = dict(client_args),
+    )
+    return genai.Client(api_key = os.getenv("GEMINI_API_KEY"), http_options = http_options)
+
+
+def get_client():
+    global _client
+    scoped = _scoped_client.get()
+    if scoped is not None:
+        return scoped
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
+
+
+def set_client(client):
+    """Replaces the process-wide client, used wherever no client is scoped with
+    use_client (background workers, CLI jobs)."""
+    global _client
+    with _lock:
+        _client = client
+
+
+def reset_client():
+    set_client(None)
+
+
+@contextmanager
+def use_client(client):
+    """Routes every Gemini call in this context, and in contexts copied from it
+    (run_in_threadpool, copy_context().run), through client."""
+    token = _scoped_client.set(client)
+    try:
+        yield client
+    finally:
+        _scoped_client.reset(token)
+
+
+def get_genai_client():
+    """FastAPI dependency; override it in app.dependency_overrides to swap the client
+    for the routes that call Gemini."""
+    return get_client()
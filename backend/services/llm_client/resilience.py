@@ -0,0 +1,216 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import Any, Callable
+
+from backend.services.metrics import record_resilience_event
+from backend.services.llm_client.scheduler import AdmissionRejected
+
+GEMINI_DEADLINE_SECONDS = float(os.getenv("GEMINI_DEADLINE_SECONDS", "30"))
+GEMINI_EMBED_DEADLINE_SECONDS = float(os.getenv("GEMINI_EMBED_DEADLINE_SECONDS", "15"))
+GEMINI_HEDGE = os.getenv("GEMINI_HEDGE", "1") == "1"
+GEMINI_HEDGE_MIN_DELAY = float(os.getenv("GEMINI_HEDGE_MIN_DELAY", "0.25"))
+GEMINI_HEDGE_MIN_SAMPLES = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_RESET_SECONDS = float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+GEMINI_RESILIENCE_POOL_SIZE = int(os.getenv("GEMINI_RESILIENCE_POOL_SIZE", "64"))
+FALLBACK_MODEL_NAME = os.getenv("FALLBACK_MODEL_NAME")
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitOpen(RuntimeError):
+    pass
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 500):
+        self._samples: deque[float] = deque(maxlen = window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        with self._lock:
+            if len(self._samples) < GEMINI_HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = GEMINI_BREAKER_FAILURES, reset_seconds: float = GEMINI_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._probe_in_flight:
+                return False
+            # half-open: let a single probe through
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        # a non-transient error proves nothing either way; let the next call probe again
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+_pool = ThreadPoolExecutor(max_workers = GEMINI_RESILIENCE_POOL_SIZE, thread_name_prefix = "gemini")
+_trackers: dict[str, LatencyTracker] = {}
+_breakers: dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def _tracker(operation: str) -> LatencyTracker:
+    with _registry_lock:
+        return _trackers.setdefault(operation, LatencyTracker())
+
+
+def _breaker(model: str) -> CircuitBreaker:
+    with _registry_lock:
+        return _breakers.setdefault(model, CircuitBreaker())
+
+
+def is_transient(error: BaseException) -> bool:
+    """Timeouts, connection failures, 429 and 5xx say something about the provider;
+    anything else (a 400 for one bad prompt) would fail the same way on every retry."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None)
+    if not isinstance(code, int):
+        code = getattr(error, "status_code", None)
+    if isinstance(code, int):
+        return code == 429 or code >= 500
+    httpx = sys.modules.get("httpx")
+    return httpx is not None and isinstance(error, httpx.TransportError)
+
+
+def _timed(fn: Callable[[], Any]) -> tuple[Any, float]:
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def _submit(fn: Callable[[], Any]):
+    # each attempt runs in a copy of the caller's context, so a client scoped with
+    # use_client (and other request context) reaches the worker thread
+    return _pool.submit(copy_context().run, _timed, fn)
+
+
+def resilient_call(
+        operation: str,
+        model: str,
+        fn: Callable[[], Any],
+        deadline: float = GEMINI_DEADLINE_SECONDS,
+        hedge: bool | None = None,
+) -> Any:
+    if hedge is None:
+        hedge = GEMINI_HEDGE
+
+    breaker = _breaker(model)
+    if not breaker.allow():
+        record_resilience_event(operation, "circuit_open")
+        raise CircuitOpen(f"Circuit open for model {model}")
+
+    tracker = _tracker(operation)
+    hedge_delay = None
+    if hedge:
+        p95 = tracker.percentile(0.95)
+        if p95 is not None:
+            hedge_delay = max(GEMINI_HEDGE_MIN_DELAY, p95)
+
+    expires = time.perf_counter() + deadline
+    primary = _submit(fn)
+    pending = {primary}
+    hedged = False
+    error: BaseException | None = None
+
+    while pending:
+        remaining = expires - time.perf_counter()
+        if remaining <= 0:
+            break
+        timeout = remaining
+        if hedge_delay is not None and not hedged:
+            timeout = min(timeout, hedge_delay)
+
+        done, pending = wait(pending, timeout = timeout, return_when = FIRST_COMPLETED)
+        for future in done:
+            try:
+                result, elapsed = future.result()
+            except Exception as e:
+                error = e
+                continue
+            tracker.record(elapsed)
+            breaker.record_success()
+            if hedged:
+                record_resilience_event(operation, "primary_won" if future is primary else "hedge_won")
+            return result
+
+        if hedge_delay is not None and not hedged and not done:
+            hedged = True
+            record_resilience_event(operation, "hedged")
+            pending.add(_submit(fn))
+        elif not pending and error is not None and is_transient(error) and hedge_delay is not None and not hedged:
+            # the primary failed fast before the hedge fired; retry once in its place
+            hedged = True
+            record_resilience_event(operation, "retried")
+            pending.add(_submit(fn))
+
+    if error is not None and not pending:
+        if is_transient(error):
+            breaker.record_failure()
+        else:
+            breaker.release_probe()
+        record_resilience_event(operation, "failed")
+        raise error
+    breaker.record_failure()
+    record_resilience_event(operation, "deadline_exceeded")
+    raise DeadlineExceeded(f"{operation} did not complete within {deadline:.1f}s")
+
+
+def _warrants_fallback(error: BaseException) -> bool:
+    # a shed request would only queue again for the fallback, and a client error (bad
+    # prompt, bad request) fails the same way on any model; AdmissionRejected carries
+    # 429/503 status codes, so it is ruled out before is_transient sees it
+    if isinstance(error, AdmissionRejected):
+        return False
+    return isinstance(error, (CircuitOpen, DeadlineExceeded)) or is_transient(error)
+
+
+def with_fallback(operation: str, model: str, fn: Callable[[str], Any], fallback_model: str | None = FALLBACK_MODEL_NAME) -> Any:
+    try:
+        return fn(model)
+    except Exception as e:
+        if not fallback_model or fallback_model == model or not _warrants_fallback(e):
+            raise
+        record_resilience_event(operation, "fallback")
+        return fn(fallback_model)
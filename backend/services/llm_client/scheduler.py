@@ -0,0 +1,178 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+
+from backend.services.metrics import LLM_QUEUE_WAIT, LLM_QUEUE_DEPTH, LLM_RUNNING, LLM_REJECTED
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    TITLE = 1
+    INGESTION = 2
+    # calls made outside any llm_priority block
+    BACKGROUND = 3
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: int = 1):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "user_id", "granted", "ready")
+
+    def __init__(self, priority: Priority, seq: int, user_id: int | None, lock: threading.Lock):
+        self.priority = priority
+        self.seq = seq
+        self.user_id = user_id
+        self.granted = False
+        # one condition per waiter, so a freed slot wakes only the ticket it is given to
+        self.ready = threading.Condition(lock)
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class LLMScheduler:
+    def __init__(
+            self,
+            max_concurrency: int,
+            per_user_concurrency: int,
+            per_user_max_queued: int,
+            max_queue_depth: dict[Priority, int],
+            max_wait_seconds: float,
+    ):
+        self.max_concurrency = max_concurrency
+        self.per_user_concurrency = per_user_concurrency
+        self.per_user_max_queued = per_user_max_queued
+        self.max_queue_depth = max_queue_depth
+        self.max_wait_seconds = max_wait_seconds
+
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        # heap ordered by (priority, seq)
+        self._waiting: list[_Ticket] = []
+        self._running = 0
+        self._running_per_user: Counter = Counter()
+        self._queued_per_user: Counter = Counter()
+        self._queued_per_priority: Counter = Counter()
+
+    def _user_has_capacity(self, user_id: int | None) -> bool:
+        return user_id is None or self._running_per_user[user_id] < self.per_user_concurrency
+
+    def _dispatch(self):
+        # hands free slots to the best waiting tickets; tickets of users at their cap
+        # are set aside and go back on the heap afterwards
+        skipped = []
+        while self._waiting and self._running < self.max_concurrency:
+            ticket = heapq.heappop(self._waiting)
+            if not self._user_has_capacity(ticket.user_id):
+                skipped.append(ticket)
+                continue
+            self._unqueue(ticket)
+            self._running += 1
+            if ticket.user_id is not None:
+                self._running_per_user[ticket.user_id] += 1
+            ticket.granted = True
+            ticket.ready.notify()
+        for ticket in skipped:
+            heapq.heappush(self._waiting, ticket)
+        LLM_RUNNING.set(self._running)
+
+    def _reject(self, priority: Priority, reason: str, status_code: int, detail: str):
+        LLM_REJECTED.labels(priority.name.lower(), reason).inc()
+        raise AdmissionRejected(status_code, detail)
+
+    def _unqueue(self, ticket: _Ticket):
+        self._queued_per_priority[ticket.priority] -= 1
+        if ticket.user_id is not None:
+            self._queued_per_user[ticket.user_id] -= 1
+        LLM_QUEUE_DEPTH.labels(ticket.priority.name.lower()).set(self._queued_per_priority[ticket.priority])
+
+    def acquire(self, priority: Priority, user_id: int | None = None) -> _Ticket:
+        start = time.perf_counter()
+        with self._lock:
+            if user_id is not None and self._queued_per_user[user_id] >= self.per_user_max_queued:
+                self._reject(priority, "user_queue_full", 429, "Too many concurrent LLM requests for this user")
+            if self._queued_per_priority[priority] >= self.max_queue_depth[priority]:
+                self._reject(priority, "queue_full", 503, "LLM capacity exhausted, try again later")
+
+            ticket = _Ticket(priority, next(self._seq), user_id, self._lock)
+            heapq.heappush(self._waiting, ticket)
+            self._queued_per_priority[priority] += 1
+            if user_id is not None:
+                self._queued_per_user[user_id] += 1
+            LLM_QUEUE_DEPTH.labels(priority.name.lower()).set(self._queued_per_priority[priority])
+            self._dispatch()
+
+            deadline = start + self.max_wait_seconds
+            while not ticket.granted:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    # still waiting, so it holds no slot; removal is O(n) but only on timeout
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._unqueue(ticket)
+                    self._reject(priority, "wait_timeout", 503, "Timed out waiting for LLM capacity")
+                ticket.ready.wait(remaining)
+
+        LLM_QUEUE_WAIT.labels(priority.name.lower()).observe(time.perf_counter() - start)
+        return ticket
+
+    def release(self, ticket: _Ticket):
+        with self._lock:
+            self._running -= 1
+            if ticket.user_id is not None:
+                self._running_per_user[ticket.user_id] -= 1
+                if self._running_per_user[ticket.user_id] <= 0:
+                    del self._running_per_user[ticket.user_id]
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, priority: Priority, user_id: int | None = None):
+        ticket = self.acquire(priority, user_id)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+
+llm_scheduler = LLMScheduler(
+    max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+    per_user_concurrency = int(os.getenv("LLM_PER_USER_CONCURRENCY", "4")),
+    per_user_max_queued = int(os.getenv("LLM_PER_USER_MAX_QUEUED", "16")),
+    max_queue_depth = {
+        Priority.INTERACTIVE: int(os.getenv("LLM_MAX_QUEUE_INTERACTIVE", "128")),
+        Priority.TITLE: int(os.getenv("LLM_MAX_QUEUE_TITLE", "32")),
+        Priority.INGESTION: int(os.getenv("LLM_MAX_QUEUE_INGESTION", "32")),
+        Priority.BACKGROUND: int(os.getenv("LLM_MAX_QUEUE_BACKGROUND", "32")),
+    },
+    max_wait_seconds = float(os.getenv("LLM_MAX_WAIT_SECONDS", "30")),
+)
+
+_call_context: ContextVar[tuple[Priority, int | None]] = ContextVar("llm_call_context", default = (Priority.BACKGROUND, None))
+
+
+@contextmanager
+def llm_priority(priority: Priority, user_id: int | None = None):
+    token = _call_context.set((priority, user_id))
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+
+@contextmanager
+def llm_slot():
+    priority, user_id = _call_context.get()
+    with llm_scheduler.slot(priority, user_id):
+        yield
@@ -0,0 +1,64 @@
+import threading
+from typing import Any, Callable, Hashable
+
+from backend.services.metrics import record_single_flight
+from backend.services.llm_client.scheduler import AdmissionRejected
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "leader")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.leader = threading.get_ident()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses identical concurrent calls: the first caller for a key runs the
+    function, everyone arriving while it is in flight waits for and shares its result."""
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is not None and call.leader == threading.get_ident():
+                    # waiting on our own call would never return
+                    raise RuntimeError(f"Re-entrant {self.operation} call for a key this thread is already running")
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self._calls[key] = call
+
+            record_single_flight(self.operation, coalesced = not leader)
+
+            if not leader:
+                call.done.wait()
+                if isinstance(call.error, AdmissionRejected):
+                    # the leader's own user or queue was over its limit; that says nothing
+                    # about this caller, who retries and gets its own admission decision
+                    continue
+                if call.error is not None:
+                    raise call.error
+                return call.result
+
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+            return call.result
+
+
+def history_key(history: list[dict]) -> tuple:
+    return tuple((m["role"], m["content"]) for m in history)
@@ -0,0 +1,166 @@
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_LATENCY = Histogram(
+    "rag_stage_latency_seconds",
+    "Latency of individual RAG pipeline stages",
+    ["stage"],
+    buckets = STAGE_BUCKETS,
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_latency_seconds",
+    "End-to-end HTTP request latency",
+    ["method", "route", "status"],
+    buckets = STAGE_BUCKETS,
+)
+
+LLM_TOKENS = Counter(
+    "gemini_tokens_total",
+    "Gemini token usage reported in response usage metadata",
+    ["model", "kind"],
+)
+
+SINGLE_FLIGHT_CALLS = Counter(
+    "gemini_single_flight_calls_total",
+    "Gemini calls seen by the single-flight layer; role=coalesced calls were served by another in-flight call",
+    ["operation", "role"],
+)
+
+LLM_QUEUE_WAIT = Histogram(
+    "llm_scheduler_wait_seconds",
+    "Time LLM calls spent queued in the scheduler before getting a slot",
+    ["priority"],
+    buckets = STAGE_BUCKETS,
+)
+
+LLM_QUEUE_DEPTH = Gauge(
+    "llm_scheduler_queue_depth",
+    "LLM calls currently waiting in the scheduler",
+    ["priority"],
+)
+
+LLM_RUNNING = Gauge(
+    "llm_scheduler_running",
+    "LLM calls currently holding a scheduler slot",
+)
+
+LLM_REJECTED = Counter(
+    "llm_scheduler_rejected_total",
+    "LLM calls shed by the scheduler",
+    ["priority", "reason"],
+)
+
+GEMINI_RESILIENCE_EVENTS = Counter(
+    "gemini_resilience_events_total",
+    "Hedges, deadline expiries, circuit breaker rejections and fallbacks for Gemini calls",
+    ["operation", "event"],
+)
+
+DOCUMENT_GC_RECLAIMED = Counter(
+    "document_gc_reclaimed_total",
+    "Documents, chunks and bytes removed by the orphaned document collector",
+    ["kind"],
+)
+
+DOCUMENT_GC_RUNS = Counter(
+    "document_gc_runs_total",
+    "Orphaned document collector runs",
+    ["outcome"],
+)
+
+CHAT_ARCHIVED = Counter(
+    "chat_archived_total",
+    "Chats and messages moved into cold storage by the chat archiver",
+    ["kind"],
+)
+
+CHAT_ARCHIVE_RUNS = Counter(
+    "chat_archive_runs_total",
+    "Chat archiver runs",
+    ["outcome"],
+)
+
+_USAGE_FIELDS = (
+    ("prompt", "prompt_token_count"),
+    ("candidates", "candidates_token_count"),
+    ("cached", "cached_content_token_count"),
+    ("total", "total_token_count"),
+)
+
+_request_id: ContextVar[str | None] = ContextVar("request_id", default = None)
+_spans: ContextVar[list | None] = ContextVar("request_spans", default = None)
+
+
+@contextmanager
+def track_stage(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage).observe(elapsed)
+        spans = _spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def record_usage(response, model: str):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for kind, field in _USAGE_FIELDS:
+        value = getattr(usage, field, None)
+        if value:
+            LLM_TOKENS.labels(model, kind).inc(value)
+
+
+def record_single_flight(operation: str, coalesced: bool):
+    SINGLE_FLIGHT_CALLS.labels(operation, "coalesced" if coalesced else "leader").inc()
+
+
+def record_resilience_event(operation: str, event: str):
+    GEMINI_RESILIENCE_EVENTS.labels(operation, event).inc()
+
+
+def record_gc_run(documents: int, chunks: int, reclaimed_bytes: int, failed: bool = False):
+    DOCUMENT_GC_RUNS.labels("error" if failed else "ok").inc()
+    DOCUMENT_GC_RECLAIMED.labels("documents").inc(documents)
+    DOCUMENT_GC_RECLAIMED.labels("chunks").inc(chunks)
+    DOCUMENT_GC_RECLAIMED.labels("bytes").inc(reclaimed_bytes)
+
+
+def record_archive_run(chats: int, messages: int, failed: bool = False):
+    CHAT_ARCHIVE_RUNS.labels("error" if failed else "ok").inc()
+    CHAT_ARCHIVED.labels("chats").inc(chats)
+    CHAT_ARCHIVED.labels("messages").inc(messages)
+
+
+def start_request_trace(request_id: str | None = None) -> tuple[str, list]:
+    request_id = request_id or uuid.uuid4().hex
+    spans: list = []
+    _request_id.set(request_id)
+    _spans.set(spans)
+    return request_id, spans
+
+
+def current_request_id() -> str | None:
+    return _request_id.get()
+
+
+def server_timing_header(spans: list) -> str:
+    return ", ".join(f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in spans)
+
+
+def observe_request(method: str, route: str, status_code: int, elapsed: float):
+    REQUEST_LATENCY.labels(method, route, str(status_code)).observe(elapsed)
+
+
+def render_latest() -> tuple[bytes, str]:
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import zlib
+from dataclasses import dataclass
+from typing import List
+
+CHUNK_TARGET_TOKENS = int(os.getenv("CHUNK_TARGET_TOKENS", "384"))
+CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", "128"))
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "768"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+# "tokens" here are the word and punctuation runs matched by TOKEN_RE, not the
+# embedding model's tokens; a model tokenizer usually produces more of them.
+# CHARS_PER_TOKEN converts character budgets to these tokens for callers that
+# still size chunks in characters (about one word plus its space).
+CHARS_PER_TOKEN = 5
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+_MASK64 = (1 << 64) - 1
+
+
+@dataclass(frozen = True)
+class Chunk:
+    text: str
+    content_hash: str
+    token_count: int
+    start: int
+    end: int
+
+
+class ChunkingEngine:
+    """Splits text into chunks of TOKEN_RE tokens whose boundaries are chosen by a
+    rolling gear hash over the token stream, so an edit only moves the boundaries
+    near it. Every chunk, overlap included, holds at most max_tokens tokens."""
+
+    def __init__(
+            self,
+            target_tokens: int = CHUNK_TARGET_TOKENS,
+            min_tokens: int = CHUNK_MIN_TOKENS,
+            max_tokens: int = CHUNK_MAX_TOKENS,
+            overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    ):
+        if not 0 < min_tokens <= target_tokens <= max_tokens:
+            raise ValueError("Expected 0 < min_tokens <= target_tokens <= max_tokens")
+        if not 0 <= overlap_tokens < min_tokens:
+            raise ValueError("Expected 0 <= overlap_tokens < min_tokens")
+
+        self.target_tokens = target_tokens
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+        if max_tokens - overlap_tokens < min_tokens:
+            raise ValueError("Expected max_tokens - overlap_tokens >= min_tokens")
+
+        spread = max(1, target_tokens - min_tokens)
+        self.mask = (1 << max(1, spread.bit_length() - 1)) - 1
+
+    def boundaries(self, tokens: list[str]) -> list[int]:
+        cuts = []
+        gear: dict[str, int] = {}
+        h = 0
+        last_cut = 0
+        mask = self.mask
+        min_tokens = self.min_tokens
+        # the overlap is prepended in split(), so leave room for it under the cap
+        max_tokens = self.max_tokens - self.overlap_tokens
+
+        for i, token in enumerate(tokens):
+            value = gear.get(token)
+            if value is None:
+                value = zlib.crc32(token.encode()) * 0x9E3779B1
+                gear[token] = value
+            h = ((h << 1) + value) & _MASK64
+
+            size = i + 1 - last_cut
+            if size < min_tokens:
+                continue
+            if (h >> 16) & mask == 0 or size >= max_tokens:
+                cuts.append(i + 1)
+                last_cut = i + 1
+
+        if last_cut < len(tokens):
+            cuts.append(len(tokens))
+        return cuts
+
+    def split(self, text: str) -> List[Chunk]:
+        matches = list(TOKEN_RE.finditer(text))
+        if not matches:
+            return []
+
+        tokens = [m.group() for m in matches]
+        chunks = []
+        start_token = 0
+        for end_token in self.boundaries(tokens):
+            first = max(0, start_token - self.overlap_tokens)
+            start = matches[first].start()
+            end = matches[end_token - 1].end()
+            piece = text[start:end]
+            chunks.append(
+                Chunk(
+                    text = piece,
+                    content_hash = hashlib.sha256(piece.encode()).hexdigest(),
+                    token_count = end_token - first,
+                    start = start,
+                    end = end,
+                )
+            )
+            start_token = end_token
+        return chunks
+
+
+default_engine = ChunkingEngine()
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import argparse
+import os
+import threading
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from backend.database.db import SessionLocal
+from backend.database.models import (
+    ChatDocument, Documents, DocumentChunks, DocumentSummaries, DocumentRepresentatives, DocumentContextCaches,
+)
+from backend.services.llm_client.context_cache import delete_cache
+from backend.services.metrics import record_gc_run
+
+DOCUMENT_GC_MIN_AGE_SECONDS = int(os.getenv("DOCUMENT_GC_MIN_AGE_SECONDS", "86400"))
+DOCUMENT_GC_BATCH_SIZE = int(os.getenv("DOCUMENT_GC_BATCH_SIZE", "50"))
+DOCUMENT_GC_INTERVAL_SECONDS = int(os.getenv("DOCUMENT_GC_INTERVAL_SECONDS", "0"))
+# a document still "processing" after this long belongs to a worker that crashed or was killed
+DOCUMENT_GC_STALE_PROCESSING_SECONDS = int(os.getenv("DOCUMENT_GC_STALE_PROCESSING_SECONDS", "3600"))
+
+# rows that hang off a document, deleted children first so this also works on
+# databases created before the foreign keys carried ON DELETE CASCADE
+_DEPENDENT_TABLES = (DocumentContextCaches, DocumentRepresentatives, DocumentSummaries, DocumentChunks)
+
+
+@dataclass
+class GCReport:
+    dry_run: bool
+    documents: int = 0
+    chunks: int = 0
+    row_bytes: int = 0
+    file_bytes: int = 0
+    vector_cache_bytes: int = 0
+    context_caches: int = 0
+
+    @property
+    def reclaimable_bytes(self) -> int:
+        return self.row_bytes + self.file_bytes + self.vector_cache_bytes
+
+
+def _file_size(path: str | Path | None) -> int:
+    if not path:
+        return 0
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def find_orphans(
+        db: Session,
+        min_age_seconds: int,
+        limit: int,
+        after_id: int = 0,
+        lock: bool = False,
+        stale_processing_seconds: int = DOCUMENT_GC_STALE_PROCESSING_SECONDS,
+) -> list[Documents]:
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds = min_age_seconds)
+    stale_cutoff = now - timedelta(seconds = stale_processing_seconds)
+    referenced = select(ChatDocument.document_id).where(ChatDocument.document_id == Documents.document_id).exists()
+    settled = or_(
+        Documents.status != "processing",
+        func.coalesce(Documents.status_updated_at, Documents.created_at) < stale_cutoff,
+    )
+
+    query = (
+        select(Documents)
+        .where(
+            Documents.document_id > after_id,
+            Documents.created_at < cutoff,
+            settled,
+            ~referenced,
+        )
+        .order_by(Documents.document_id)
+        .limit(limit)
+    )
+    if lock:
+        # a concurrent upload linking one of these documents waits on the row lock
+        query = query.with_for_update(of = Documents, skip_locked = True)
+    return list(db.execute(query).scalars())
+
+
+def _measure(db: Session, document_ids: list[int], report: GCReport):
+    # imported here: main imports this module, and vector_index pulls in numpy and
+    # registers Session listeners that a web worker without the index should not pay for
+    from backend.services.rag import vector_index
+
+    chunks, chunk_bytes = db.execute(
+        select(
+            func.count(DocumentChunks.chunk_id),
+            func.coalesce(func.sum(func.pg_column_size(DocumentChunks.content) + func.pg_column_size(DocumentChunks.embedding)), 0),
+        ).where(DocumentChunks.document_id.in_(document_ids))
+    ).one()
+    profile_bytes = db.execute(
+        select(func.coalesce(func.sum(func.pg_column_size(DocumentRepresentatives.embedding)), 0))
+        .where(DocumentRepresentatives.document_id.in_(document_ids))
+    ).scalar_one()
+    profile_bytes += db.execute(
+        select(func.coalesce(func.sum(func.pg_column_size(DocumentSummaries.centroid) + func.pg_column_size(DocumentSummaries.summary)), 0))
+        .where(DocumentSummaries.document_id.in_(document_ids))
+    ).scalar_one()
+
+    report.chunks += int(chunks)
+    report.row_bytes += int(chunk_bytes) + int(profile_bytes)
+    for document_id in document_ids:
+        report.vector_cache_bytes += sum(_file_size(p) for p in vector_index.cache_files(document_id))
+
+
+def collect_garbage(
+        dry_run: bool = True,
+        min_age_seconds: int = DOCUMENT_GC_MIN_AGE_SECONDS,
+        batch_size: int = DOCUMENT_GC_BATCH_SIZE,
+) -> GCReport:
+    """Removes documents no chat links to, one batch per transaction. Files, vector
+    index files and provider caches are only removed after their batch commits."""
+    report = GCReport(dry_run = dry_run)
+    after_id = 0
+
+    while True:
+        db = SessionLocal()
+        try:
+            docs = find_orphans(db, min_age_seconds, batch_size, after_id = after_id, lock = not dry_run)
+            if not docs:
+                break
+            after_id = docs[-1].document_id
+            document_ids = [d.document_id for d in docs]
+            paths = [p for d in docs for p in (d.storage_path, d.processed_text_path) if p]
+
+            _measure(db, document_ids, report)
+            report.documents += len(docs)
+            report.file_bytes += sum(_file_size(p) for p in paths)
+            cache_names = list(db.execute(
+                select(DocumentContextCaches.cache_name).where(DocumentContextCaches.document_id.in_(document_ids))
+            ).scalars())
+            report.context_caches += len(cache_names)
+
+            if dry_run:
+                continue
+
+            for table in _DEPENDENT_TABLES:
+                db.query(table).filter(table.document_id.in_(document_ids)).delete(synchronize_session = False)
+            db.query(Documents).filter(Documents.document_id.in_(document_ids)).delete(synchronize_session = False)
+            db.commit()
+        finally:
+            db.close()
+
+        for path in paths:
+            Path(path).unlink(missing_ok = True)
+        from backend.services.rag import vector_index
+        for document_id in document_ids:
+            vector_index.invalidate(document_id)
+        for name in cache_names:
+            delete_cache(name)
+
+    return report
+
+
+def _run_periodically(stop: threading.Event, interval_seconds: int):
+    while not stop.wait(interval_seconds):
+        try:
+            report = collect_garbage(dry_run = False)
+        except Exception:
+            record_gc_run(0, 0, 0, failed = True)
+            continue
+        record_gc_run(report.documents, report.chunks, report.reclaimable_bytes)
+
+
+def start_gc_worker(interval_seconds: int = DOCUMENT_GC_INTERVAL_SECONDS) -> threading.Event | None:
+    if interval_seconds <= 0:
+        return None
+    stop = threading.Event()
+    threading.Thread(target = _run_periodically, args = (stop, interval_seconds), name = "document-gc", daemon = True).start()
+    return stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Remove documents that no chat references")
+    parser.add_argument("--apply", action = "store_true", help = "delete instead of only reporting reclaimable space")
+    parser.add_argument("--min-age", type = int, default = DOCUMENT_GC_MIN_AGE_SECONDS)
+    parser.add_argument("--batch-size", type = int, default = DOCUMENT_GC_BATCH_SIZE)
+    args = parser.parse_args()
+
+    report = collect_garbage(dry_run = not args.apply, min_age_seconds = args.min_age, batch_size = args.batch_size)
+    for name, value in asdict(report).items():
+        print(f"{name}: {value}")
+    print(f"reclaimable_bytes: {report.reclaimable_bytes}")
+
+
+if __name__ == "__main__":
+    main()
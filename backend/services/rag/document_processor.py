@@ -4,20 +4,16 @@ import os
 from pathlib import Path
 from typing import List
 
-from google import genai
-from google.genai import types
-
-from pypdf import PdfReader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-
-
-from dotenv import load_dotenv
-load_dotenv()
+from backend.services.metrics import track_stage
+from backend.services.llm_client.provider import get_client
+from backend.services.llm_client.single_flight import SingleFlight
+from backend.services.llm_client.scheduler import llm_slot
+from backend.services.llm_client.resilience import resilient_call, GEMINI_EMBED_DEADLINE_SECONDS
+from backend.services.rag.chunking import Chunk, ChunkingEngine, default_engine, CHARS_PER_TOKEN
 
 MAX_BATCH = int(os.getenv("MAX_BATCH"))
 
-client = genai.Client(api_key = os.getenv("GEMINI_API_KEY"))
-
+_query_flight = SingleFlight("embed_query")
 
 def extract_text_from_file(path: str, mime_type: str) -> str:
     path = Path(path)
@@ -28,6 +24,8 @@ def extract_text_from_file(path: str, mime_type: str) -> str:
         return path.read_text()
 
     if mime_type == "application/pdf" or path.suffix.lower() == ".pdf":
+        from pypdf import PdfReader
+
         reader = PdfReader(path)
         parts = [ ]
         for page in reader.pages:
@@ -37,16 +35,31 @@ def extract_text_from_file(path: str, mime_type: str) -> str:
     raise ValueError(f"Unsupported file type: {mime_type}")
 
 
-def chunk_splitter(text: str, chunk_size: int = 1500, chunk_overlap: int = 150) -> List[str]:
+def chunk_document(text: str, engine: ChunkingEngine = default_engine) -> List[Chunk]:
+    return engine.split(text)
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size = chunk_size,
-        chunk_overlap = chunk_overlap,
+
+def chunk_splitter(text: str, chunk_size: int = 1500, chunk_overlap: int = 150) -> List[str]:
+    """chunk_size and chunk_overlap are in characters, as before; they are converted
+    to chunking tokens with CHARS_PER_TOKEN, so chunk lengths are approximate."""
+
+    target_tokens = max(2, chunk_size // CHARS_PER_TOKEN)
+    overlap_tokens = chunk_overlap // CHARS_PER_TOKEN
+    min_tokens = max(overlap_tokens + 1, target_tokens // 3)
+    engine = ChunkingEngine(
+        target_tokens = max(target_tokens, min_tokens),
+        min_tokens = min_tokens,
+        max_tokens = max(target_tokens, min_tokens) * 2 + overlap_tokens,
+        overlap_tokens = overlap_tokens,
     )
 
-    chunks = splitter.split_text(text)
+    return [c.text for c in chunk_document(text, engine)]
+
 
-    return chunks
+def _embed_http_options():
+    from google.genai import types
+
+    return types.HttpOptions(timeout = int(GEMINI_EMBED_DEADLINE_SECONDS * 1000))
 
 
 def embed_text(
@@ -58,14 +71,23 @@ def embed_text(
 
     embeddings: List[List[float]] = []
 
+    from google.genai import types
+
     for start in range(0, len(chunks), batch_size):
         batch = chunks[start:start + batch_size]
 
-        result = client.models.embed_content(
-            model = model,
-            contents = batch,
-            config = types.EmbedContentConfig(task_type = task_type)
-        )
+        with llm_slot(), track_stage("embed_batch"):
+            result = resilient_call(
+                "embed_batch",
+                model,
+                lambda: get_client().models.embed_content(
+                    model = model,
+                    contents = batch,
+                    config = types.EmbedContentConfig(task_type = task_type, http_options = _embed_http_options()),
+                ),
+                deadline = GEMINI_EMBED_DEADLINE_SECONDS,
+                hedge = False,
+            )
 
         for vector in result.embeddings:
             embeddings.append(vector.values)
@@ -73,13 +95,34 @@ def embed_text(
     return embeddings
 
 
-def embed_query(text: str, model: str = "gemini-embedding-001", task_type: str = "RETRIEVAL_QUERY"):
-
-    result = client.models.embed_content(
-        model=model,
-        contents=[text],
-        config=types.EmbedContentConfig(task_type=task_type)
-    )
+def embed_queries(
+        texts: List[str],
+        model: str = "gemini-embedding-001",
+        task_type: str = "RETRIEVAL_QUERY",
+        batch_size: int = MAX_BATCH,
+) -> List[List[float]]:
+    return embed_text(chunks = texts, model = model, task_type = task_type, batch_size = batch_size)
+
+
+def _embed_query(text: str, model: str, task_type: str):
+    from google.genai import types
+
+    with llm_slot(), track_stage("embed_query"):
+        result = resilient_call(
+            "embed_query",
+            model,
+            lambda: get_client().models.embed_content(
+                model=model,
+                contents=[text],
+                config=types.EmbedContentConfig(task_type=task_type, http_options=_embed_http_options()),
+            ),
+            deadline=GEMINI_EMBED_DEADLINE_SECONDS,
+        )
 
     return result.embeddings[0].values
 
+
+def embed_query(text: str, model: str = "gemini-embedding-001", task_type: str = "RETRIEVAL_QUERY"):
+
+    return _query_flight.do((model, task_type, text), lambda: _embed_query(text, model, task_type))
+
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import os
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from backend.database.models import DocumentSummaries, DocumentRepresentatives
+from backend.services.llm_client.gemini_client import summarize_document
+
+DOC_REPRESENTATIVES = int(os.getenv("DOC_REPRESENTATIVES", "8"))
+DOC_SUMMARY_MAX_CHARS = int(os.getenv("DOC_SUMMARY_MAX_CHARS", "20000"))
+
+
+def _normalize(matrix):
+    import numpy as np
+
+    norms = np.linalg.norm(matrix, axis = -1, keepdims = True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def representative_vectors(embeddings, k: int = DOC_REPRESENTATIVES, iterations: int = 10, seed: int = 0):
+    # numpy only loads once a document is processed, not with the app
+    import numpy as np
+
+    matrix = _normalize(np.asarray([np.asarray(e, dtype = np.float32) for e in embeddings]))
+    n = len(matrix)
+    centroid = _normalize(matrix.mean(axis = 0))
+    k = min(k, n)
+
+    # spherical k-means with k-means++ seeding; cluster means become the representatives
+    rng = np.random.default_rng(seed)
+    centers = [matrix[rng.integers(n)]]
+    for _ in range(1, k):
+        sims = np.max(matrix @ np.stack(centers).T, axis = 1)
+        dist = np.clip(1.0 - sims, 0.0, None)
+        total = dist.sum()
+        idx = rng.choice(n, p = dist / total) if total > 0 else rng.integers(n)
+        centers.append(matrix[idx])
+    centers = np.stack(centers)
+
+    for _ in range(iterations):
+        labels = np.argmax(matrix @ centers.T, axis = 1)
+        for j in range(k):
+            members = matrix[labels == j]
+            if len(members):
+                centers[j] = _normalize(members.mean(axis = 0))
+
+    labels = np.argmax(matrix @ centers.T, axis = 1)
+    weights = np.bincount(labels, minlength = k)
+    order = np.argsort(-weights)
+    return centroid, [(centers[j], int(weights[j])) for j in order if weights[j] > 0]
+
+
+def build_document_profile(db: Session, document_id: int, title: str, text: str, embeddings) -> DocumentSummaries:
+    summary = ""
+    if text.strip():
+        try:
+            summary = summarize_document(title, text[:DOC_SUMMARY_MAX_CHARS])
+        except Exception:
+            # provider error or load shedding: the embeddings are already paid for, and without
+            # a summary ranking still has the representative vectors; a reprocess fills it in
+            summary = ""
+
+    db.query(DocumentRepresentatives).filter(DocumentRepresentatives.document_id == document_id).delete(synchronize_session=False)
+
+    centroid = None
+    if len(embeddings):
+        centroid, reps = representative_vectors(embeddings)
+        db.add_all(
+            DocumentRepresentatives(document_id = document_id, rank = rank, weight = weight, embedding = vec.tolist())
+            for rank, (vec, weight) in enumerate(reps)
+        )
+
+    profile = db.get(DocumentSummaries, document_id)
+    if profile is None:
+        profile = DocumentSummaries(document_id = document_id)
+        db.add(profile)
+    profile.summary = summary or None
+    profile.centroid = centroid.tolist() if centroid is not None else None
+    profile.chunk_count = len(embeddings)
+    profile.created_at = datetime.utcnow()
+    return profile
+
+
+def rank_documents(db: Session, document_ids: list[int], query_vec, limit: int | None = None) -> list[int]:
+    if len(document_ids) <= 1:
+        return list(document_ids)
+
+    distance = func.min(DocumentRepresentatives.embedding.cosine_distance(query_vec))
+    rows = db.execute(
+        select(DocumentRepresentatives.document_id, distance.label("distance"))
+        .where(DocumentRepresentatives.document_id.in_(document_ids))
+        .group_by(DocumentRepresentatives.document_id)
+        .order_by(distance)
+    ).all()
+
+    ranked = [r.document_id for r in rows]
+    seen = set(ranked)
+    ranked += [d for d in document_ids if d not in seen]
+    return ranked[:limit] if limit else ranked
@@ -1,9 +1,30 @@
+from backend.services.metrics import track_stage, record_usage
+from backend.services.llm_client.single_flight import SingleFlight
+from backend.services.llm_client.scheduler import llm_slot
+from backend.services.llm_client.resilience import resilient_call
+
+ROUTING_MODEL = "gemini-2.5-flash"
+
+_routing_flight = SingleFlight("should_use_rag")
+
+
+def _route(client, prompt: str):
+    with llm_slot(), track_stage("route"):
+        response = resilient_call(
+            "should_use_rag",
+            ROUTING_MODEL,
+            lambda: client.models.generate_content(model = ROUTING_MODEL, contents = prompt),
+        )
+    record_usage(response, ROUTING_MODEL)
+    return response
+
+
 def should_use_rag(client, question:str, documents: list[dict]) -> bool:
     if not documents:
         return False
 
     docs_list = "\n".join(
-        f"- {doc['title']}"
+        f"- {doc['title']}: {doc['summary']}" if doc.get("summary") else f"- {doc['title']}"
         for doc in documents
     )
 
@@ -26,10 +47,7 @@ def should_use_rag(client, question:str, documents: list[dict]) -> bool:
     Respond with exactly YES or NO.
     """
 
-    response = client.models.generate_content(
-        model = "gemini-2.5-flash",
-        contents = prompt,
-    )
+    response = _routing_flight.do((id(client), prompt), lambda: _route(client, prompt))
 
     decision = (response.text or "").strip().upper()
 
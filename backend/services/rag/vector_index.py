@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from backend.database.models import DocumentChunks
+
+VECTOR_CACHE_DIR = Path(os.getenv("VECTOR_CACHE_DIR", ".vector_cache"))
+VECTOR_INDEX_MAX_CHUNKS = int(os.getenv("VECTOR_INDEX_MAX_CHUNKS", "2000"))
+VECTOR_INDEX_MAX_DOCS = int(os.getenv("VECTOR_INDEX_MAX_DOCS", "256"))
+
+
+class DocumentVectorIndex:
+    def __init__(self, document_id: int, fingerprint: tuple[int, int, int], chunk_ids: np.ndarray, matrix: np.ndarray):
+        self.document_id = document_id
+        self.fingerprint = fingerprint
+        self.chunk_ids = chunk_ids
+        self.matrix = matrix
+
+    def search(self, query_vec, k: int) -> list[tuple[int, float]]:
+        n = len(self.chunk_ids)
+        k = min(k, n)
+        if k <= 0:
+            return []
+
+        q = np.asarray(query_vec, dtype = np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+
+        # rows are L2-normalised at build time, so the dot product is the cosine similarity
+        scores = self.matrix @ q
+        if k < n:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(n)
+        top = top[np.argsort(-scores[top], kind = "stable")]
+
+        return [(int(self.chunk_ids[i]), float(scores[i])) for i in top]
+
+
+_indexes: OrderedDict[int, DocumentVectorIndex] = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cache_paths(document_id: int, fingerprint: tuple[int, int, int]) -> tuple[Path, Path]:
+    stem = "_".join(str(part) for part in (document_id, *fingerprint))
+    return VECTOR_CACHE_DIR / f"{stem}.npy", VECTOR_CACHE_DIR / f"{stem}.ids.npy"
+
+
+def cache_files(document_id: int) -> list[Path]:
+    if not VECTOR_CACHE_DIR.exists():
+        return []
+    return list(VECTOR_CACHE_DIR.glob(f"{document_id}_*.npy"))
+
+
+def _remove_cache_files(document_id: int, keep: tuple[Path, ...] = ()):
+    for path in cache_files(document_id):
+        if path not in keep:
+            path.unlink(missing_ok = True)
+
+
+def _fingerprint(db: Session, document_id: int) -> tuple[int, int, int]:
+    # count and max id catch inserts and deletes, bulk ones included; every update bumps a
+    # row's version, so the sum catches in-place changes no matter which process made them
+    count, max_id, versions = db.execute(
+        select(
+            func.count(DocumentChunks.chunk_id),
+            func.max(DocumentChunks.chunk_id),
+            func.sum(DocumentChunks.version),
+        )
+        .where(DocumentChunks.document_id == document_id)
+    ).one()
+    return int(count or 0), int(max_id or 0), int(versions or 0)
+
+
+def _write_atomic(path: Path, array: np.ndarray):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def _build(db: Session, document_id: int, fingerprint: tuple[int, int, int]) -> DocumentVectorIndex:
+    matrix_path, ids_path = _cache_paths(document_id, fingerprint)
+
+    if matrix_path.exists() and ids_path.exists():
+        matrix = np.load(matrix_path, mmap_mode = "r")
+        chunk_ids = np.load(ids_path)
+        return DocumentVectorIndex(document_id, fingerprint, chunk_ids, matrix)
+
+    rows = db.execute(
+        select(DocumentChunks.chunk_id, DocumentChunks.embedding)
+        .where(DocumentChunks.document_id == document_id, DocumentChunks.embedding.is_not(None))
+        .order_by(DocumentChunks.chunk_id)
+    ).all()
+
+    chunk_ids = np.fromiter((r.chunk_id for r in rows), dtype = np.int64, count = len(rows))
+    if rows:
+        matrix = np.vstack([np.asarray(r.embedding, dtype = np.float32) for r in rows])
+        norms = np.linalg.norm(matrix, axis = 1, keepdims = True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+    else:
+        matrix = np.zeros((0, 0), dtype = np.float32)
+
+    VECTOR_CACHE_DIR.mkdir(parents = True, exist_ok = True)
+    _write_atomic(matrix_path, matrix)
+    _write_atomic(ids_path, chunk_ids)
+    _remove_cache_files(document_id, keep = (matrix_path, ids_path))
+
+    matrix = np.load(matrix_path, mmap_mode = "r")
+    return DocumentVectorIndex(document_id, fingerprint, chunk_ids, matrix)
+
+
+def get_index(db: Session, document_id: int) -> DocumentVectorIndex | None:
+    fingerprint = _fingerprint(db, document_id)
+    if fingerprint[0] > VECTOR_INDEX_MAX_CHUNKS:
+        return None
+
+    with _lock:
+        index = _indexes.get(document_id)
+        if index is not None and index.fingerprint == fingerprint:
+            _indexes.move_to_end(document_id)
+            return index
+
+    index = _build(db, document_id, fingerprint)
+
+    with _lock:
+        _indexes[document_id] = index
+        _indexes.move_to_end(document_id)
+        while len(_indexes) > VECTOR_INDEX_MAX_DOCS:
+            _indexes.popitem(last = False)
+    return index
+
+
+def top_k(db: Session, document_id: int, query_vec, k: int = 5) -> list[DocumentChunks] | None:
+    index = get_index(db, document_id)
+    if index is None:
+        return None
+
+    hits = index.search(query_vec, k)
+    if not hits:
+        return []
+
+    ids = [chunk_id for chunk_id, _ in hits]
+    rows = db.execute(select(DocumentChunks).where(DocumentChunks.chunk_id.in_(ids))).scalars().all()
+    by_id = {r.chunk_id: r for r in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def invalidate(document_id: int):
+    with _lock:
+        _indexes.pop(document_id, None)
+    _remove_cache_files(document_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_documents(session: Session, flush_context):
+    changed = session.info.setdefault("vector_index_changed", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, DocumentChunks) and obj.document_id is not None:
+            changed.add(obj.document_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_documents(session: Session):
+    for document_id in session.info.pop("vector_index_changed", ()):
+        invalidate(document_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_documents(session: Session):
+    session.info.pop("vector_index_changed", None)
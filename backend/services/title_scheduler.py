@@ -0,0 +1,114 @@
+import os
+import threading
+from typing import Callable
+
+TITLE_SCHEDULER_INTERVAL_SECONDS = float(os.getenv("TITLE_SCHEDULER_INTERVAL_SECONDS", "2"))
+TITLE_BATCH_SIZE = int(os.getenv("TITLE_BATCH_SIZE", "20"))
+TITLE_MAX_ATTEMPTS = int(os.getenv("TITLE_MAX_ATTEMPTS", "3"))
+
+
+class TitleScheduler:
+    """Collects title refresh triggers per chat and hands them to `flush` in batches
+    from one background thread. Repeated triggers for a pending chat coalesce, and a
+    batch only ever holds chats of one user."""
+
+    def __init__(
+            self,
+            flush: Callable[[dict[int, int]], None],
+            interval_seconds: float = TITLE_SCHEDULER_INTERVAL_SECONDS,
+            max_batch: int = TITLE_BATCH_SIZE,
+            max_attempts: int = TITLE_MAX_ATTEMPTS,
+    ):
+        self.interval_seconds = interval_seconds
+        self.max_batch = max(1, max_batch)
+        self.max_attempts = max(1, max_attempts)
+        self._flush = flush
+        self._lock = threading.Lock()
+        self._pending: dict[int, int] = {}
+        self._attempts: dict[int, int] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._listeners: dict[int, list[Callable[[int, str], None]]] = {}
+
+    def request(self, chat_id: int, user_id: int) -> bool:
+        with self._lock:
+            coalesced = chat_id in self._pending
+            self._pending[chat_id] = user_id
+            if len(self._pending) >= self.max_batch:
+                self._wake.set()
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target = self._run, name = "title-scheduler", daemon = True)
+                self._thread.start()
+        return coalesced
+
+    def subscribe(self, chat_id: int, callback: Callable[[int, str], None]):
+        with self._lock:
+            self._listeners.setdefault(chat_id, []).append(callback)
+
+    def unsubscribe(self, chat_id: int, callback: Callable[[int, str], None]):
+        with self._lock:
+            callbacks = self._listeners.get(chat_id, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._listeners.pop(chat_id, None)
+
+    def publish(self, chat_id: int, title: str):
+        with self._lock:
+            callbacks = list(self._listeners.get(chat_id, ()))
+        for callback in callbacks:
+            try:
+                callback(chat_id, title)
+            except Exception:
+                pass
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def run_once(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        # one prompt never carries conversations of different users
+        by_user: dict[int, list[int]] = {}
+        for chat_id, user_id in pending.items():
+            by_user.setdefault(user_id, []).append(chat_id)
+
+        for user_id, chat_ids in by_user.items():
+            for start in range(0, len(chat_ids), self.max_batch):
+                batch = {chat_id: user_id for chat_id in chat_ids[start:start + self.max_batch]}
+                try:
+                    self._flush(batch)
+                except Exception:
+                    self._requeue(batch)
+                else:
+                    with self._lock:
+                        for chat_id in batch:
+                            self._attempts.pop(chat_id, None)
+
+    def _requeue(self, batch: dict[int, int]):
+        # titles are best effort: a failed batch is retried on the next runs, a few times
+        with self._lock:
+            for chat_id, user_id in batch.items():
+                attempts = self._attempts.get(chat_id, 0) + 1
+                if attempts >= self.max_attempts:
+                    self._attempts.pop(chat_id, None)
+                    continue
+                self._attempts[chat_id] = attempts
+                self._pending.setdefault(chat_id, user_id)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+            self.run_once()
+
+    def stop(self, timeout: float | None = None):
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
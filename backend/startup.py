@@ -0,0 +1,40 @@
+import importlib
+import os
+
+# lazy:    everything heavy is built on first use
+# eager:   each worker imports heavy modules and builds clients during lifespan startup
+# preload: heavy modules are imported when backend.main is imported (e.g. by a gunicorn --preload
+#          master, so forked workers share those pages); clients are still built per worker
+STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy")
+
+HEAVY_MODULES = (
+    "google.genai",
+    "google.genai.types",
+    "httpx",
+    "pypdf",
+    "passlib.context",
+    "passlib.handlers.bcrypt",
+)
+
+
+def preload_modules():
+    from backend.database.security import get_pwd_context
+
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+    get_pwd_context()
+
+
+def build_clients():
+    from backend.database.db import get_engine
+    from backend.database.security import get_token_settings
+    from backend.services.llm_client.provider import get_client
+
+    get_token_settings()
+    get_engine()
+    get_client()
+
+
+def warm_up():
+    preload_modules()
+    build_clients()
@@ -0,0 +1,70 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("MODEL_NAME", "fake-model")
+os.environ.setdefault("GEMINI_API_KEY", "fake")
+
+from fake_gemini import FakeGeminiClient, install_fake_client
+from synthetic_data import synthetic_document, synthetic_questions
+
+
+def run(questions: list[str], fake: FakeGeminiClient, context: str, cache_name: str | None) -> dict:
+    from backend.services.llm_client.gemini_client import answer_question
+
+    samples = []
+    start_usage = len(fake.models.usage)
+    for question in questions:
+        start = time.perf_counter()
+        answer_question(question, context, cached_content = cache_name)
+        samples.append(time.perf_counter() - start)
+
+    usage = fake.models.usage[start_usage:]
+    return {
+        "p50_ms": statistics.median(samples) * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "prompt_tokens": sum(u.prompt_token_count for u in usage),
+        "cached_tokens": sum(u.cached_content_token_count for u in usage),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Latency and token cost of answering from a cached context versus re-sending it")
+    parser.add_argument("--doc-bytes", type = int, default = 200_000)
+    parser.add_argument("--questions", type = int, default = 30)
+    parser.add_argument("--latency", type = float, default = 0.05)
+    parser.add_argument("--latency-per-1k-prompt-tokens", type = float, default = 0.01)
+    parser.add_argument("--cached-token-price-ratio", type = float, default = 0.25, help = "price of a cached input token relative to a regular one")
+    args = parser.parse_args()
+
+    from backend.services.llm_client.context_cache import create_cache
+
+    fake = install_fake_client(FakeGeminiClient(
+        latency = args.latency,
+        latency_per_1k_prompt_tokens = args.latency_per_1k_prompt_tokens,
+    ))
+    text = synthetic_document(args.doc_bytes, seed = 3)
+    questions = synthetic_questions(args.questions, seed = 4)
+
+    inline = run(questions, fake, text, None)
+    cache = create_cache(text, display_name = "benchmark")
+    cached = run(questions, fake, "", cache.name)
+
+    for name, stats in (("inline context", inline), ("cached context", cached)):
+        regular = stats["prompt_tokens"] - stats["cached_tokens"]
+        cost_units = regular + stats["cached_tokens"] * args.cached_token_price_ratio
+        print(
+            f"{name:>15}: p50 {stats['p50_ms']:.1f} ms, mean {stats['mean_ms']:.1f} ms, "
+            f"prompt tokens {stats['prompt_tokens']}, cached {stats['cached_tokens']}, input cost units {cost_units:.0f}"
+        )
+    print(f"one-off cache creation: {cache.usage_metadata.total_token_count} tokens (plus storage for the TTL)")
+
+
+if __name__ == "__main__":
+    main()
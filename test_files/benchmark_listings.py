@@ -0,0 +1,74 @@
+import argparse
+import json
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from pydantic import TypeAdapter
+
+from synthetic_data import synthetic_chat
+from backend.database.models import Messages
+from backend.database.schemas import MessageOut
+
+MessageRow = namedtuple("MessageRow", ["message_id", "chat_id", "role", "created_at", "message_content"])
+
+
+def build_rows(n_messages: int) -> list[MessageRow]:
+    start = datetime(2024, 1, 1)
+    history = synthetic_chat(n_messages // 2 + 1, seed = 3)[:n_messages]
+    return [
+        MessageRow(i + 1, 1, m["role"], start + timedelta(seconds = i), m["content"])
+        for i, m in enumerate(history)
+    ]
+
+
+def orm_path(rows: list[MessageRow]) -> bytes:
+    # what FastAPI does for response_model=List[MessageOut] with ORM results:
+    # validate from attributes, dump to jsonable python, then json.dumps
+    objects = [Messages(**r._asdict()) for r in rows]
+    adapter = TypeAdapter(List[MessageOut])
+    validated = adapter.validate_python(objects, from_attributes = True)
+    return json.dumps(adapter.dump_python(validated, mode = "json")).encode()
+
+
+def lean_path(rows: list[MessageRow], adapter) -> bytes:
+    return adapter.dump_json(adapter.validate_python([r._asdict() for r in rows]))
+
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Serialization cost of GET /chats/{chat_id}/messages")
+    parser.add_argument("--messages", type = int, default = 10_000)
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+
+    rows = build_rows(args.messages)
+    adapter = TypeAdapter(List[MessageOut])
+    assert json.loads(orm_path(rows)) == json.loads(lean_path(rows, adapter))
+
+    orm = best_of(args.repeat, lambda: orm_path(rows))
+    lean = best_of(args.repeat, lambda: lean_path(rows, adapter))
+    size_kb = len(lean_path(rows, adapter)) / 1024
+
+    print(f"messages: {len(rows)}, payload: {size_kb:.0f} KiB")
+    print(f"orm + pydantic + json.dumps: {orm * 1000:.1f} ms")
+    print(f"row tuples + TypeAdapter.dump_json: {lean * 1000:.1f} ms ({orm / lean:.1f}x)")
+    print("etag match: 304 after a count/max(message_id) query, no rows loaded or serialized")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+BENCH_ENV = {
+    "GEMINI_API_KEY": "fake",
+    "MODEL_NAME": "fake-model",
+    "MAX_BATCH": "100",
+    "SECRET_KEY": "benchmark-secret",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "TITLE_REFRESH_EVERY_N_MESSAGES": "6",
+    "ALLOWED_MIME": "text/plain,application/pdf",
+    "MAX_BYTES": str(64 * 1024 * 1024),
+    "BASE_STORAGE_DIR": tempfile.mkdtemp(prefix = "rag-bench-"),
+}
+for key, value in BENCH_ENV.items():
+    os.environ.setdefault(key, value)
+
+from fake_gemini import FakeGeminiClient, install_fake_client
+from synthetic_data import synthetic_document, synthetic_questions
+
+
+def percentiles(samples: list[float]) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "n": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+    }
+
+
+def bench_ingestion(api, headers, chat_id: int, doc_bytes: int, n_docs: int, nonce: str) -> tuple[dict, list[int]]:
+    document_ids = []
+    total_bytes = 0
+    total_chunks = 0
+    elapsed = 0.0
+
+    for i in range(n_docs):
+        text = synthetic_document(doc_bytes, seed = i, nonce = nonce)
+        r = api.post(
+            f"/chats/{chat_id}/documents/upload",
+            headers = headers,
+            files = {"file": (f"bench_{i}.txt", text.encode(), "text/plain")},
+        )
+        r.raise_for_status()
+        document_id = r.json()["document"]["document_id"]
+
+        start = time.perf_counter()
+        r = api.post(f"/documents/{document_id}/process", headers = headers)
+        elapsed += time.perf_counter() - start
+        r.raise_for_status()
+
+        document_ids.append(document_id)
+        total_bytes += len(text.encode())
+        total_chunks += r.json()["chunks_saved"]
+
+    return {
+        "documents": n_docs,
+        "chunks": total_chunks,
+        "seconds": elapsed,
+        "mb_per_s": total_bytes / 1e6 / elapsed if elapsed else 0.0,
+        "chunks_per_s": total_chunks / elapsed if elapsed else 0.0,
+    }, document_ids
+
+
+def bench_retrieval(document_ids: list[int], questions: list[str], engine: str) -> dict:
+    from backend.database.db import SessionLocal
+    from backend.routers.helpers import retrieve_top_k
+    from backend.services.rag.document_processor import embed_queries
+
+    qvecs = embed_queries(questions)
+    samples = []
+    db = SessionLocal()
+    try:
+        for document_id in document_ids:
+            retrieve_top_k(db, document_id = document_id, query_vec = qvecs[0], engine = engine)
+            for qvec in qvecs:
+                start = time.perf_counter()
+                retrieve_top_k(db, document_id = document_id, query_vec = qvec, engine = engine)
+                samples.append(time.perf_counter() - start)
+    finally:
+        db.close()
+    return percentiles(samples)
+
+
+def bench_generate(api, headers, chat_id: int, questions: list[str]) -> dict:
+    samples = []
+    for question in questions:
+        r = api.post(f"/chats/{chat_id}/messages", json = {"role": "user", "message_content": question})
+        r.raise_for_status()
+
+        start = time.perf_counter()
+        r = api.post(f"/chats/{chat_id}/generate", headers = headers)
+        samples.append(time.perf_counter() - start)
+        r.raise_for_status()
+    return percentiles(samples)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for section in ("retrieval_sql", "retrieval_numpy", "generate"):
+        old, new = baseline.get(section, {}), results.get(section, {})
+        if old.get("p95_ms") and new.get("p95_ms", 0) > old["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{section}: p95 {new['p95_ms']:.1f}ms > baseline {old['p95_ms']:.1f}ms")
+    old, new = baseline.get("ingestion", {}), results.get("ingestion", {})
+    if old.get("chunks_per_s") and new.get("chunks_per_s", 0) < old["chunks_per_s"] * (1 - tolerance):
+        regressions.append(f"ingestion: {new['chunks_per_s']:.1f} chunks/s < baseline {old['chunks_per_s']:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Offline RAG benchmark against a fake Gemini backend")
+    parser.add_argument("--latency", type = float, default = 0.05, help = "fake generate/embed latency in seconds")
+    parser.add_argument("--embed-latency-per-item", type = float, default = 0.001)
+    parser.add_argument("--jitter", type = float, default = 0.0)
+    parser.add_argument("--docs", type = int, default = 3)
+    parser.add_argument("--doc-bytes", type = int, default = 200_000)
+    parser.add_argument("--questions", type = int, default = 50)
+    parser.add_argument("--turns", type = int, default = 20)
+    parser.add_argument("--output", type = Path)
+    parser.add_argument("--baseline", type = Path)
+    parser.add_argument("--tolerance", type = float, default = 0.2)
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    fake = install_fake_client(FakeGeminiClient(
+        latency = args.latency,
+        embed_latency_per_item = args.embed_latency_per_item,
+        jitter = args.jitter,
+    ))
+
+    nonce = uuid.uuid4().hex[:8]
+    api = TestClient(app)
+    r = api.post("/auth/register", json = {
+        "username": f"bench-{nonce}",
+        "email": f"bench-{nonce}@example.com",
+        "password": "benchmark-password",
+    })
+    r.raise_for_status()
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    chat_id = api.post("/chats", json = {"chat_title": "benchmark"}, headers = headers).json()["chat_id"]
+    questions = synthetic_questions(args.questions, seed = 1)
+
+    results = {}
+    results["ingestion"], document_ids = bench_ingestion(api, headers, chat_id, args.doc_bytes, args.docs, nonce)
+    results["retrieval_sql"] = bench_retrieval(document_ids, questions, "sql")
+    results["retrieval_numpy"] = bench_retrieval(document_ids, questions, "numpy")
+    results["generate"] = bench_generate(api, headers, chat_id, questions[:args.turns])
+    results["fake_calls"] = dict(fake.models.calls)
+
+    print(json.dumps(results, indent = 2))
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent = 2))
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("MODEL_NAME", "fake-model")
+os.environ.setdefault("GEMINI_API_KEY", "fake")
+
+from fake_gemini import FakeGeminiClient, install_fake_client
+from benchmark_rag import percentiles
+
+
+def run(n_calls: int, concurrency: int) -> dict:
+    from backend.services.llm_client.gemini_client import answer_question
+
+    def one(i: int) -> float:
+        start = time.perf_counter()
+        answer_question(f"question {i}", f"context for question {i}")
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers = concurrency) as pool:
+        samples = list(pool.map(one, range(n_calls)))
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Tail latency of answer_question with and without hedging")
+    parser.add_argument("--latency", type = float, default = 0.05)
+    parser.add_argument("--jitter", type = float, default = 0.02)
+    parser.add_argument("--tail-latency", type = float, default = 1.0)
+    parser.add_argument("--tail-probability", type = float, default = 0.05)
+    parser.add_argument("--calls", type = int, default = 400)
+    parser.add_argument("--concurrency", type = int, default = 8)
+    args = parser.parse_args()
+
+    from backend.services.llm_client import resilience
+
+    for hedge in (False, True):
+        resilience.GEMINI_HEDGE = hedge
+        resilience._trackers.clear()
+        fake = install_fake_client(FakeGeminiClient(
+            latency = args.latency,
+            jitter = args.jitter,
+            tail_latency = args.tail_latency,
+            tail_probability = args.tail_probability,
+        ))
+        stats = run(args.calls, args.concurrency)
+        stats["upstream_calls"] = fake.models.calls["generate_content"]
+        print(f"hedging={'on ' if hedge else 'off'}", {k: round(v, 1) for k, v in stats.items()})
+
+
+if __name__ == "__main__":
+    main()
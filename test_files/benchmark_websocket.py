@@ -0,0 +1,82 @@
+import argparse
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from benchmark_rag import percentiles
+from fake_gemini import FakeGeminiClient, install_fake_client
+from synthetic_data import synthetic_questions
+
+
+def bench_rest(api, headers, chat_id: int, questions: list[str]) -> dict:
+    samples = []
+    for question in questions:
+        start = time.perf_counter()
+        r = api.post(f"/chats/{chat_id}/turn", json = {"message_content": question}, headers = headers)
+        samples.append(time.perf_counter() - start)
+        r.raise_for_status()
+    return percentiles(samples)
+
+
+def bench_websocket(api, token: str, chat_id: int, questions: list[str]) -> tuple[dict, float]:
+    samples = []
+    start = time.perf_counter()
+    with api.websocket_connect(f"/chats/{chat_id}/ws", subprotocols = ["bearer", token]) as ws:
+        assert ws.receive_json()["type"] == "ready"
+        connect_seconds = time.perf_counter() - start
+
+        for question in questions:
+            start = time.perf_counter()
+            ws.send_json({"message_content": question})
+            while True:
+                event = ws.receive_json()
+                if event["type"] == "reply":
+                    break
+                if event["type"] == "error":
+                    raise RuntimeError(event)
+            samples.append(time.perf_counter() - start)
+    return percentiles(samples), connect_seconds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Per-turn overhead of the REST /turn flow versus a chat WebSocket session")
+    parser.add_argument("--latency", type = float, default = 0.0, help = "fake Gemini latency; 0 isolates server overhead")
+    parser.add_argument("--turns", type = int, default = 200)
+    parser.add_argument("--output", type = Path)
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    install_fake_client(FakeGeminiClient(latency = args.latency))
+
+    nonce = uuid.uuid4().hex[:8]
+    api = TestClient(app)
+    r = api.post("/auth/register", json = {
+        "username": f"bench-ws-{nonce}",
+        "email": f"bench-ws-{nonce}@example.com",
+        "password": "benchmark-password",
+    })
+    r.raise_for_status()
+    token = r.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    questions = synthetic_questions(args.turns, seed = 5)
+    rest_chat = api.post("/chats", json = {"chat_title": "rest"}, headers = headers).json()["chat_id"]
+    ws_chat = api.post("/chats", json = {"chat_title": "websocket"}, headers = headers).json()["chat_id"]
+
+    results = {"rest_turn": bench_rest(api, headers, rest_chat, questions)}
+    results["websocket_turn"], results["websocket_connect_ms"] = bench_websocket(api, token, ws_chat, questions)
+
+    print(json.dumps(results, indent = 2))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent = 2))
+
+
+if __name__ == "__main__":
+    main()
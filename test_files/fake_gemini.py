@@ -0,0 +1,227 @@
+import hashlib
+import random
+import re
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+@dataclass
+class FakeUsage:
+    prompt_token_count: int
+    candidates_token_count: int
+    total_token_count: int
+    cached_content_token_count: int = 0
+
+
+@dataclass
+class FakeResponse:
+    text: str
+    usage_metadata: FakeUsage
+
+
+@dataclass
+class FakeEmbedding:
+    values: list[float]
+
+
+@dataclass
+class FakeEmbedResponse:
+    embeddings: list[FakeEmbedding]
+
+
+def _contents_text(contents) -> str:
+    if isinstance(contents, str):
+        return contents
+    parts = []
+    for item in contents:
+        if isinstance(item, str):
+            parts.append(item)
+        elif isinstance(item, dict):
+            parts.extend(p.get("text", "") for p in item.get("parts", []))
+        else:
+            parts.extend(getattr(p, "text", "") or "" for p in getattr(item, "parts", []) or [])
+    return "\n".join(parts)
+
+
+class FakeAPIError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+@dataclass
+class FakeCachedContent:
+    name: str
+    model: str
+    text: str
+    usage_metadata: FakeUsage
+
+
+class FakeCaches:
+    def __init__(self):
+        self.store: dict[str, FakeCachedContent] = {}
+
+    def create(self, model: str, config = None) -> FakeCachedContent:
+        if isinstance(config, dict):
+            instruction, contents = config.get("system_instruction"), config.get("contents", [])
+        else:
+            instruction, contents = getattr(config, "system_instruction", None), getattr(config, "contents", None) or []
+        text = "\n".join(filter(None, [instruction if isinstance(instruction, str) else None, _contents_text(contents)]))
+        tokens = len(TOKEN_RE.findall(text))
+        cache = FakeCachedContent(
+            name = f"cachedContents/fake-{len(self.store) + 1}",
+            model = model,
+            text = text,
+            usage_metadata = FakeUsage(tokens, 0, tokens),
+        )
+        self.store[cache.name] = cache
+        return cache
+
+    def get(self, name: str) -> FakeCachedContent:
+        if name not in self.store:
+            raise FakeAPIError(404, f"CachedContent not found: {name}")
+        return self.store[name]
+
+    def delete(self, name: str):
+        self.store.pop(name, None)
+
+
+class FakeModels:
+    def __init__(
+            self,
+            latency: float,
+            embed_latency_per_item: float,
+            jitter: float,
+            dim: int,
+            seed: int,
+            tail_latency: float = 0.0,
+            tail_probability: float = 0.0,
+            error_rate: float = 0.0,
+            error_code: int = 503,
+            latency_per_1k_prompt_tokens: float = 0.0,
+            caches: FakeCaches | None = None,
+    ):
+        self.latency = latency
+        self.embed_latency_per_item = embed_latency_per_item
+        self.jitter = jitter
+        self.dim = dim
+        self.tail_latency = tail_latency
+        self.tail_probability = tail_probability
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.latency_per_1k_prompt_tokens = latency_per_1k_prompt_tokens
+        self.caches = caches or FakeCaches()
+        self.rng = random.Random(seed)
+        self.calls = {"generate_content": 0, "embed_content": 0}
+        self.usage: list[FakeUsage] = []
+
+    def _sleep(self, extra: float = 0.0):
+        delay = self.latency + extra
+        if self.jitter:
+            delay += self.rng.uniform(0, self.jitter)
+        if self.tail_probability and self.rng.random() < self.tail_probability:
+            delay += self.tail_latency
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise FakeAPIError(self.error_code, "injected fake Gemini failure")
+        if delay > 0:
+            time.sleep(delay)
+
+    def _embed(self, text: str) -> list[float]:
+        # feature hashing keeps related texts close, so retrieval results stay meaningful
+        vec = np.zeros(self.dim, dtype = np.float32)
+        for token in TOKEN_RE.findall(text.lower()):
+            h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size = 8).digest(), "little")
+            vec[h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        if norm:
+            vec /= norm
+        return vec.tolist()
+
+    def generate_content(self, model: str, contents, config = None) -> FakeResponse:
+        self.calls["generate_content"] += 1
+        prompt = _contents_text(contents)
+        prompt_tokens = len(TOKEN_RE.findall(prompt))
+
+        cached_tokens = 0
+        cache_name = config.get("cached_content") if isinstance(config, dict) else getattr(config, "cached_content", None)
+        if cache_name:
+            cached = self.caches.get(cache_name)
+            cached_tokens = cached.usage_metadata.total_token_count
+            prompt = cached.text + "\n" + prompt
+
+        # cached tokens are already processed on the provider side and add no per-request latency
+        self._sleep(self.latency_per_1k_prompt_tokens * prompt_tokens / 1000)
+
+        if "routing agent" in prompt:
+            text = "YES"
+        elif "Generate a chat title" in prompt:
+            text = "Synthetic Chat Title"
+        else:
+            words = TOKEN_RE.findall(prompt)[-20:]
+            text = "Synthetic answer: " + " ".join(words)
+
+        candidate_tokens = len(TOKEN_RE.findall(text))
+        usage = FakeUsage(
+            prompt_tokens + cached_tokens,
+            candidate_tokens,
+            prompt_tokens + cached_tokens + candidate_tokens,
+            cached_content_token_count = cached_tokens,
+        )
+        self.usage.append(usage)
+        return FakeResponse(text = text, usage_metadata = usage)
+
+    def generate_content_stream(self, model: str, contents, config = None):
+        response = self.generate_content(model, contents, config)
+        words = response.text.split(" ")
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            yield FakeResponse(text = word if last else word + " ", usage_metadata = response.usage_metadata if last else None)
+
+    def embed_content(self, model: str, contents, config = None) -> FakeEmbedResponse:
+        self.calls["embed_content"] += 1
+        texts = [contents] if isinstance(contents, str) else list(contents)
+        self._sleep(self.embed_latency_per_item * len(texts))
+        return FakeEmbedResponse(embeddings = [FakeEmbedding(self._embed(t)) for t in texts])
+
+
+@dataclass
+class FakeGeminiClient:
+    latency: float = 0.05
+    embed_latency_per_item: float = 0.001
+    jitter: float = 0.0
+    dim: int = 3072
+    seed: int = 0
+    tail_latency: float = 0.0
+    tail_probability: float = 0.0
+    error_rate: float = 0.0
+    error_code: int = 503
+    latency_per_1k_prompt_tokens: float = 0.0
+    models: FakeModels = field(init = False)
+    caches: FakeCaches = field(init = False)
+
+    def __post_init__(self):
+        self.caches = FakeCaches()
+        self.models = FakeModels(
+            self.latency,
+            self.embed_latency_per_item,
+            self.jitter,
+            self.dim,
+            self.seed,
+            tail_latency = self.tail_latency,
+            tail_probability = self.tail_probability,
+            error_rate = self.error_rate,
+            error_code = self.error_code,
+            latency_per_1k_prompt_tokens = self.latency_per_1k_prompt_tokens,
+            caches = self.caches,
+        )
+
+
+def install_fake_client(fake: FakeGeminiClient):
+    from backend.services.llm_client.provider import set_client
+
+    set_client(fake)
+    return fake
@@ -0,0 +1,52 @@
+"""In-memory SQLite stand-in for the Postgres schema.
+
+Only for tests of code whose SQL is portable; pgvector columns are stored as text
+and pg_column_size is emulated so the document GC can measure rows."""
+import os
+
+# module-level settings the routers read at import time
+for name, value in {
+    "MODEL_NAME": "fake-model",
+    "MAX_BATCH": "100",
+    "TITLE_REFRESH_EVERY_N_MESSAGES": "6",
+    "ALLOWED_MIME": "text/plain",
+    "MAX_BYTES": "1000000",
+    "BASE_STORAGE_DIR": "/tmp/rag-tests",
+    "DATABASE_URL": "sqlite://",
+    "SECRET_KEY": "test-secret",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+}.items():
+    os.environ.setdefault(name, value)
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend.database import db as database
+from backend.database.models import Base
+
+
+def _pg_column_size(value) -> int:
+    if value is None:
+        return 0
+    return len(value) if isinstance(value, (str, bytes)) else 8
+
+
+def make_engine():
+    engine = create_engine("sqlite://", connect_args = {"check_same_thread": False}, poolclass = StaticPool)
+
+    @event.listens_for(engine, "connect")
+    def _register_functions(dbapi_connection, _):
+        dbapi_connection.create_function("pg_column_size", 1, _pg_column_size)
+
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def install_sqlite(monkeypatch) -> sessionmaker:
+    """Points SessionLocal/get_db at a fresh in-memory database for one test."""
+    engine = make_engine()
+    monkeypatch.setattr(database, "_engine", engine)
+    database._session_factory.configure(bind = engine)
+    return sessionmaker(bind = engine)
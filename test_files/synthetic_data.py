@@ -0,0 +1,51 @@
+import random
+
+TOPICS = {
+    "astronomy": "star planet orbit galaxy telescope nebula comet gravity light year eclipse",
+    "cooking": "oven flour sugar butter recipe bake simmer knife pan spice dough",
+    "finance": "budget invoice interest loan equity dividend ledger audit revenue tax",
+    "medicine": "patient dose symptom diagnosis therapy clinic vaccine enzyme tissue nurse",
+    "software": "server request database index latency cache thread deploy commit query",
+}
+
+FILLER = "the a of and to in is for on with that as by this from it at be".split()
+
+
+def synthetic_paragraph(rng: random.Random, topic: str, sentences: int = 6) -> str:
+    vocab = TOPICS[topic].split()
+    out = []
+    for _ in range(sentences):
+        words = [rng.choice(vocab) if rng.random() < 0.5 else rng.choice(FILLER) for _ in range(rng.randint(8, 18))]
+        out.append(" ".join(words).capitalize() + ".")
+    return " ".join(out)
+
+
+def synthetic_document(target_bytes: int, seed: int = 0, nonce: str = "") -> str:
+    rng = random.Random(seed)
+    topics = list(TOPICS)
+    parts = [f"Synthetic document {seed} {nonce}".strip()]
+    size = len(parts[0])
+    while size < target_bytes:
+        paragraph = synthetic_paragraph(rng, rng.choice(topics))
+        parts.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(parts)
+
+
+def synthetic_questions(n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(n):
+        topic = rng.choice(list(TOPICS))
+        words = rng.sample(TOPICS[topic].split(), 3)
+        questions.append(f"What does the document say about {words[0]}, {words[1]} and {words[2]}?")
+    return questions
+
+
+def synthetic_chat(n_turns: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    history = []
+    for _ in range(n_turns):
+        history.append({"role": "user", "content": synthetic_paragraph(rng, rng.choice(list(TOPICS)), sentences = 2)})
+        history.append({"role": "assistant", "content": synthetic_paragraph(rng, rng.choice(list(TOPICS)), sentences = 3)})
+    return history
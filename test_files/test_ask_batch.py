@@ -0,0 +1,79 @@
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("prometheus_client")
+pytest.importorskip("pgvector")
+pytest.importorskip("google.genai")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from fake_gemini import FakeGeminiClient, install_fake_client
+from sqlite_db import install_sqlite
+from backend.routers import documents
+
+
+@pytest.fixture
+def api(monkeypatch):
+    install_sqlite(monkeypatch)
+    install_fake_client(FakeGeminiClient(latency = 0.0, dim = 8))
+    app = FastAPI()
+    app.include_router(documents.router)
+    return TestClient(app)
+
+
+def chunk(i: int):
+    return SimpleNamespace(chunk_id = i, chunk_index = i, content = f"chunk {i}")
+
+
+def ask(api, questions: list[str], k: int = 2):
+    r = api.post("/documents/1/ask/batch", json = {"questions": questions, "k": k})
+    return r, [json.loads(line) for line in r.text.splitlines()] if r.status_code == 200 else []
+
+
+def test_retrieval_runs_in_bounded_sub_batches(api, monkeypatch):
+    sizes = []
+
+    def retrieve_top_k_batch(db, document_id, query_vecs, k = 5):
+        sizes.append(len(query_vecs))
+        return [[chunk(1)] for _ in query_vecs]
+
+    monkeypatch.setattr(documents, "retrieve_top_k_batch", retrieve_top_k_batch)
+    monkeypatch.setattr(documents, "ASK_BATCH_RETRIEVE_SIZE", 4)
+
+    r, items = ask(api, [f"question {i}" for i in range(10)])
+
+    assert r.status_code == 200
+    assert sizes == [4, 4, 2]
+    assert sorted(item["index"] for item in items) == list(range(10))
+    assert all(item["answer"] and item["sources"] == [{"chunk_id": 1, "chunk_index": 1}] for item in items)
+
+
+def test_failed_sub_batch_reports_each_question_without_internals(api, monkeypatch):
+    def retrieve_top_k_batch(db, document_id, query_vecs, k = 5):
+        if len(query_vecs) == 2:
+            raise RuntimeError('relation "document_chunks" does not exist')
+        return [[] for _ in query_vecs]
+
+    monkeypatch.setattr(documents, "retrieve_top_k_batch", retrieve_top_k_batch)
+    monkeypatch.setattr(documents, "ASK_BATCH_RETRIEVE_SIZE", 3)
+
+    _, items = ask(api, [f"question {i}" for i in range(5)])
+
+    errors = sorted((item for item in items if "error" in item), key = lambda item: item["index"])
+    assert [item["index"] for item in errors] == [3, 4]
+    assert all(item["status"] == 500 and "document_chunks" not in item["error"] for item in errors)
+    assert sum("answer" in item for item in items) == 3
+
+
+@pytest.mark.parametrize("k", [0, -1])
+def test_non_positive_k_is_rejected(api, k):
+    r, _ = ask(api, ["question"], k = k)
+
+    assert r.status_code == 422
@@ -0,0 +1,144 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("dotenv")
+pytest.importorskip("pgvector")
+pytest.importorskip("prometheus_client")
+
+from sqlite_db import install_sqlite
+from backend.database.models import ArchivedChats, Chats, Messages, User
+from backend.services import chat_archive
+from backend.services.chat_archive import ArchivedMessage, _decode, _encode, archive_inactive_chats, archived_messages
+
+
+@pytest.fixture
+def db(monkeypatch):
+    sessions = install_sqlite(monkeypatch)
+    session = sessions()
+    session.add(User(user_id = 1, username = "u", email = "u@example.com", password = "x"))
+    session.add(Chats(chat_id = 1, user_id = 1, chat_title = "Old chat"))
+    session.add(Chats(chat_id = 2, user_id = 1, chat_title = "Active chat"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def add_messages(db, chat_id: int, contents: list[str], days_ago: int):
+    start = datetime.utcnow() - timedelta(days = days_ago)
+    for i, content in enumerate(contents):
+        db.add(Messages(chat_id = chat_id, role = "user" if i % 2 == 0 else "assistant", message_content = content, created_at = start + timedelta(seconds = i)))
+    db.commit()
+
+
+def contents(messages) -> list[str]:
+    return [m.message_content for m in messages]
+
+
+def test_archive_payload_round_trip_and_compresses():
+    start = datetime(2024, 1, 1)
+    messages = [
+        ArchivedMessage(i, 7, "user" if i % 2 else "assistant", start + timedelta(minutes = i), f"message {i} ünïcode " * 20)
+        for i in range(1, 201)
+    ]
+
+    payload = _encode(messages)
+
+    assert _decode(7, payload) == messages
+    assert len(payload) < sum(len(m.message_content.encode()) for m in messages) / 5
+
+
+def test_archive_and_read_back_round_trip(db):
+    add_messages(db, 1, ["q1", "a1", "q2", "a2"], days_ago = 200)
+    add_messages(db, 2, ["recent", "reply"], days_ago = 1)
+
+    assert archive_inactive_chats(older_than_days = 90) == (1, 4)
+
+    assert contents(archived_messages(db, 1)) == ["q1", "a1", "q2", "a2"]
+    assert db.query(Messages).filter(Messages.chat_id == 1).count() == 0
+    assert contents(db.query(Messages).filter(Messages.chat_id == 2).order_by(Messages.message_id)) == ["recent", "reply"]
+    archive = db.get(ArchivedChats, 1)
+    assert (archive.message_count, archive.last_message_id) == (4, max(m.message_id for m in archived_messages(db, 1)))
+
+
+def test_rearchiving_appends_to_the_existing_archive(db):
+    add_messages(db, 1, ["q1", "a1"], days_ago = 300)
+    archive_inactive_chats(older_than_days = 90)
+    add_messages(db, 1, ["q2", "a2"], days_ago = 200)
+
+    assert archive_inactive_chats(older_than_days = 90) == (1, 2)
+    assert contents(archived_messages(db, 1)) == ["q1", "a1", "q2", "a2"]
+
+
+def test_message_listing_joins_archived_and_hot_messages(db):
+    pytest.importorskip("fastapi")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from backend.routers import messages
+
+    add_messages(db, 1, ["q1", "a1"], days_ago = 200)
+    archive_inactive_chats(older_than_days = 90)
+    add_messages(db, 1, ["back again", "welcome back"], days_ago = 0)
+
+    app = FastAPI()
+    app.include_router(messages.router)
+    listed = TestClient(app).get("/chats/1/messages").json()
+
+    assert [m["message_content"] for m in listed] == ["q1", "a1", "back again", "welcome back"]
+
+
+def test_title_refresh_reads_archived_history(db, monkeypatch):
+    pytest.importorskip("google.genai")
+    from backend.routers import helpers
+
+    add_messages(db, 1, ["solar panels?", "they convert light"], days_ago = 200)
+    # a hot message with a higher id; SQLite, unlike a Postgres sequence, reuses ids of deleted rows
+    add_messages(db, 2, ["recent"], days_ago = 0)
+    archive_inactive_chats(older_than_days = 90)
+    seen = []
+
+    def generate_chat_title(history):
+        seen.append(contents_of(history))
+        return "Solar Panel Basics"
+
+    monkeypatch.setattr(helpers, "generate_chat_title", generate_chat_title)
+
+    result = helpers.refresh_chat_title_core(db, db.get(Chats, 1), 1)
+
+    assert result["updated"] is True
+    assert seen[0] == ["solar panels?", "they convert light"]
+    assert db.get(Chats, 1).last_titled_message_id == archived_messages(db, 1)[-1].message_id
+
+    # the scheduled batch sees the same history, once enough new messages arrive
+    add_messages(db, 1, [f"m{i}" for i in range(helpers.TITLE_REFRESH_EVERY_N_MESSAGES)], days_ago = 0)
+    assert list(helpers._due_title_refreshes(db, {1: 1})) == [1]
+    assert helpers._recent_histories_for_titles(db, [1], limit = 3)[1] == [
+        {"role": "user", "content": "solar panels?"},
+        {"role": "assistant", "content": "they convert light"},
+        {"role": "user", "content": "m0"},
+    ]
+
+
+def contents_of(history: list[dict]) -> list[str]:
+    return [m["content"] for m in history]
+
+
+def test_archive_worker_is_off_by_default_and_records_runs(monkeypatch):
+    runs = []
+    monkeypatch.setattr(chat_archive, "archive_inactive_chats", lambda: (2, 10))
+    monkeypatch.setattr(chat_archive, "record_archive_run", lambda chats, messages, failed = False: runs.append((chats, messages, failed)))
+
+    assert chat_archive.start_archive_worker(0) is None
+
+    stop = chat_archive.start_archive_worker(0.01)
+    deadline = datetime.utcnow() + timedelta(seconds = 2)
+    while not runs and datetime.utcnow() < deadline:
+        stop.wait(0.01)
+    stop.set()
+
+    assert runs[0] == (2, 10, False)
@@ -0,0 +1,92 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("prometheus_client")
+pytest.importorskip("pgvector")
+pytest.importorskip("google.genai")
+pytest.importorskip("jose")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from sqlite_db import install_sqlite
+from backend.database.models import Chats, User
+from backend.database.security import create_access_token
+from backend.routers import chats
+from backend.services.chat_state import chat_state_cache
+
+
+@pytest.fixture
+def setup(monkeypatch):
+    sessions = install_sqlite(monkeypatch)
+    chat_state_cache.clear()
+    db = sessions()
+    for user_id in (1, 2):
+        db.add(User(user_id = user_id, username = f"u{user_id}", email = f"u{user_id}@example.com", password = "x"))
+    db.add(Chats(chat_id = 1, user_id = 1, chat_title = "First chat"))
+    db.add(Chats(chat_id = 2, user_id = 2, chat_title = "Other user"))
+    db.commit()
+
+    app = FastAPI()
+    app.include_router(chats.router)
+    api = TestClient(app, headers = {"Authorization": f"Bearer {create_access_token({'sub': '1'})}"})
+    yield api, db
+    db.close()
+    chat_state_cache.clear()
+
+
+def etag_of(api) -> str:
+    response = api.get("/chats")
+    assert response.status_code == 200
+    return response.headers["ETag"]
+
+
+def test_unchanged_list_is_not_modified(setup):
+    api, _ = setup
+    first = api.get("/chats")
+    etag = first.headers["ETag"]
+
+    again = api.get("/chats", headers = {"If-None-Match": etag})
+
+    assert first.json()[0]["chat_title"] == "First chat"
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert again.content == b""
+
+
+def test_title_change_create_and_delete_change_the_etag(setup):
+    api, db = setup
+    seen = [etag_of(api)]
+
+    db.get(Chats, 1).chat_title = "Renamed chat"
+    db.commit()
+    seen.append(etag_of(api))
+
+    # the title batch writes with a bulk update; onupdate still bumps updated_at
+    db.execute(update(Chats).where(Chats.chat_id == 1).values(is_title_locked = True))
+    db.commit()
+    seen.append(etag_of(api))
+
+    assert api.post("/chats", json = {"chat_title": "Second"}).status_code == 200
+    seen.append(etag_of(api))
+
+    assert api.delete("/chats/1").status_code == 204
+    seen.append(etag_of(api))
+
+    assert len(set(seen)) == len(seen)
+    assert api.get("/chats", headers = {"If-None-Match": seen[0]}).status_code == 200
+
+
+def test_other_users_changes_keep_the_etag(setup):
+    api, db = setup
+    etag = etag_of(api)
+
+    db.get(Chats, 2).chat_title = "Changed elsewhere"
+    db.commit()
+
+    assert api.get("/chats", headers = {"If-None-Match": etag}).status_code == 304
@@ -0,0 +1,157 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("prometheus_client")
+pytest.importorskip("pgvector")
+pytest.importorskip("google.genai")
+pytest.importorskip("jose")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from fake_gemini import FakeGeminiClient, install_fake_client
+from sqlite_db import install_sqlite
+from backend.database.models import Chats, ChatDocument, Documents, Messages, User
+from backend.database.security import create_access_token
+from backend.routers import chats
+from backend.services.chat_state import chat_state_cache
+from backend.services.llm_client.provider import get_client, get_genai_client
+from backend.services.llm_client.resilience import DeadlineExceeded
+
+
+@pytest.fixture
+def setup(monkeypatch):
+    sessions = install_sqlite(monkeypatch)
+    chat_state_cache.clear()
+    install_fake_client(FakeGeminiClient(latency = 0.0))
+    monkeypatch.setattr(chats.title_scheduler, "request", lambda chat_id, user_id: False)
+
+    db = sessions()
+    db.add(User(user_id = 1, username = "u", email = "u@example.com", password = "x"))
+    db.add(Chats(chat_id = 1, user_id = 1, chat_title = "New chat"))
+    db.commit()
+
+    app = FastAPI()
+    app.include_router(chats.router)
+    yield TestClient(app), db, create_access_token({"sub": "1"})
+    app.dependency_overrides.clear()
+    db.close()
+    chat_state_cache.clear()
+
+
+def connect(api, token: str, chat_id: int = 1):
+    return api.websocket_connect(f"/chats/{chat_id}/ws", subprotocols = ["bearer", token])
+
+
+def receive_reply(ws) -> tuple[list[str], dict]:
+    deltas = []
+    while True:
+        event = ws.receive_json()
+        if event["type"] == "delta":
+            deltas.append(event["text"])
+        elif event["type"] in ("reply", "error"):
+            return deltas, event
+
+
+def test_reply_is_streamed_and_stored(setup):
+    api, db, token = setup
+    with connect(api, token) as ws:
+        assert ws.receive_json()["type"] == "ready"
+        ws.send_json({"message_content": "hello there"})
+        deltas, reply = receive_reply(ws)
+
+    assert reply["type"] == "reply"
+    assert len(deltas) > 1
+    assert "".join(deltas) == reply["reply"]
+    assert [m.role for m in db.query(Messages).order_by(Messages.message_id)] == ["user", "assistant"]
+
+
+def test_invalid_token_is_rejected(setup):
+    api, _, _ = setup
+    with pytest.raises(WebSocketDisconnect) as e:
+        with connect(api, "not-a-token") as ws:
+            ws.receive_json()
+    assert e.value.code == 1008
+
+
+def test_document_linked_elsewhere_is_used_on_the_next_turn(setup, monkeypatch):
+    api, db, token = setup
+    seen = []
+    monkeypatch.setattr(chats, "_answer_turn", lambda db, question, documents, history, on_delta = None: (
+        seen.append([d["document_id"] for d in documents]) or ("ok", False, None, [])
+    ))
+
+    with connect(api, token) as ws:
+        ws.receive_json()
+        ws.send_json({"message_content": "first"})
+        receive_reply(ws)
+
+        # another worker links a document; neither this session nor its cache is told
+        db.add(Documents(
+            document_id = 7, user_id = 1, title = "doc", source_name = "a.txt", mime_type = "text/plain",
+            storage_path = "/tmp/a.txt", file_size = 1, sha256 = "7",
+        ))
+        db.add(ChatDocument(chat_id = 1, document_id = 7, enabled = True))
+        db.commit()
+
+        ws.send_json({"message_content": "second"})
+        receive_reply(ws)
+
+    assert seen == [[], [7]]
+
+
+def test_failed_turn_keeps_the_session_open(setup, monkeypatch):
+    api, _, token = setup
+    calls = iter([DeadlineExceeded("slow"), None])
+
+    def answer(db, question, documents, history, on_delta = None):
+        error = next(calls)
+        if error:
+            raise error
+        return "ok", False, None, []
+
+    monkeypatch.setattr(chats, "_answer_turn", answer)
+    with connect(api, token) as ws:
+        ws.receive_json()
+        ws.send_json({"message_content": "first"})
+        assert receive_reply(ws)[1] == {"type": "error", "status": 504, "detail": "The model did not answer in time"}
+        ws.send_json({"message_content": "second"})
+        assert receive_reply(ws)[1]["reply"] == "ok"
+
+
+def test_deleted_chat_closes_the_session(setup):
+    api, db, token = setup
+    with connect(api, token) as ws:
+        ws.receive_json()
+        db.query(Chats).delete()
+        db.commit()
+
+        ws.send_json({"message_content": "anyone there?"})
+        with pytest.raises(WebSocketDisconnect) as e:
+            ws.receive_json()
+    assert e.value.code == chats.WS_CHAT_NOT_FOUND
+
+
+def test_overridden_client_dependency_serves_every_model_call(setup):
+    api, _, token = setup
+    process_client = get_client()
+    scoped = FakeGeminiClient(latency = 0.0)
+    api.app.dependency_overrides[get_genai_client] = lambda: scoped
+
+    response = api.post("/chats/1/turn", json = {"message_content": "hello"}, headers = {"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    with connect(api, token) as ws:
+        assert ws.receive_json()["type"] == "ready"
+        ws.send_json({"message_content": "hello again"})
+        _, reply = receive_reply(ws)
+
+    assert reply["type"] == "reply"
+    assert scoped.models.calls["generate_content"] == 2
+    assert process_client.models.calls["generate_content"] == 0
+    # the scope ends with the request
+    assert get_client() is process_client
@@ -0,0 +1,129 @@
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.services.chat_state import CachedMessage, ChatState, ChatStateCache
+
+
+def make_state(chat_id: int, messages: list[CachedMessage] | None = None) -> ChatState:
+    return ChatState(
+        chat_id = chat_id,
+        user_id = 1,
+        chat_title = "New chat",
+        is_title_locked = False,
+        last_titled_message_id = None,
+        messages = messages or [],
+    )
+
+
+def test_lru_eviction():
+    cache = ChatStateCache(max_chats = 2, history_size = 10)
+    for chat_id in (1, 2):
+        cache.put(make_state(chat_id), cache.generation(chat_id))
+    cache.get(1)
+    cache.put(make_state(3), cache.generation(3))
+
+    assert cache.get(1) is not None
+    assert cache.get(2) is None
+    assert cache.get(3) is not None
+
+
+def test_stale_loader_cannot_overwrite_newer_write():
+    cache = ChatStateCache(max_chats = 8, history_size = 10)
+
+    def stale_loader():
+        # a message is committed while this loader is still reading the database
+        cache.append_message(1, 2, "assistant", "late reply")
+        return make_state(1, [CachedMessage(1, "user", "hi")])
+
+    state = cache.get_or_load(1, stale_loader)
+
+    assert [m.message_id for m in state.messages] == [1]
+    assert cache.get(1) is None
+
+
+def test_returned_state_is_a_copy():
+    cache = ChatStateCache(max_chats = 8, history_size = 10)
+    cache.put(make_state(1), cache.generation(1))
+
+    state = cache.get(1)
+    state.messages.append(CachedMessage(99, "user", "local only"))
+    state.documents.append({"document_id": 1, "title": "doc"})
+
+    assert cache.get(1).messages == []
+    assert cache.get(1).documents == []
+
+
+def test_concurrent_writers_keep_ordered_ring_buffer():
+    history_size = 50
+    cache = ChatStateCache(max_chats = 8, history_size = history_size)
+    cache.put(make_state(1), cache.generation(1))
+
+    writers = 8
+    per_writer = 200
+    barrier = threading.Barrier(writers)
+
+    def writer(offset: int):
+        barrier.wait()
+        for i in range(per_writer):
+            message_id = i * writers + offset + 1
+            cache.append_message(1, message_id, "user", f"m{message_id}")
+            cache.append_message(1, message_id, "user", f"m{message_id}")
+
+    threads = [threading.Thread(target = writer, args = (w,)) for w in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    ids = [m.message_id for m in cache.get(1).messages]
+    total = writers * per_writer
+    assert ids == list(range(total - history_size + 1, total + 1))
+
+
+def test_concurrent_title_and_document_updates():
+    cache = ChatStateCache(max_chats = 8, history_size = 10)
+    cache.put(make_state(1), cache.generation(1))
+
+    def add_documents(start: int):
+        for document_id in range(start, start + 100):
+            cache.add_document(1, document_id, f"doc {document_id}")
+            cache.add_document(1, document_id, f"doc {document_id}")
+
+    def lock_title():
+        for i in range(100):
+            cache.update_chat(1, chat_title = f"title {i}", is_title_locked = True)
+
+    threads = [threading.Thread(target = add_documents, args = (s,)) for s in (0, 100, 200)]
+    threads.append(threading.Thread(target = lock_title))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    state = cache.get(1)
+    assert sorted(d["document_id"] for d in state.documents) == list(range(300))
+    assert state.chat_title == "title 99"
+    assert state.is_title_locked
+
+
+def test_stale_entry_is_reloaded_after_a_write_that_bypassed_the_cache():
+    cache = ChatStateCache(max_chats = 8, history_size = 10)
+    database = [CachedMessage(1, "user", "first question")]
+
+    def loader():
+        return make_state(1, list(database))
+
+    def is_current(state):
+        return state.last_message_id() == database[-1].message_id
+
+    cache.get_or_load(1, loader, is_current)
+
+    # another worker stores a new user message; this cache never hears about it
+    database.append(CachedMessage(2, "user", "second question"))
+
+    state = cache.get_or_load(1, loader, is_current)
+    assert state.last_user_message().content == "second question"
+    assert cache.get(1).last_message_id() == 2
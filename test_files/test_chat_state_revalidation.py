@@ -0,0 +1,71 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("prometheus_client")
+pytest.importorskip("pgvector")
+pytest.importorskip("google.genai")
+
+from sqlite_db import install_sqlite
+from backend.database.models import Chats, ChatDocument, Documents, Messages, User
+from backend.routers.helpers import _get_user_chat_state_or_404
+from backend.services.chat_state import chat_state_cache
+
+
+@pytest.fixture
+def db(monkeypatch):
+    sessions = install_sqlite(monkeypatch)
+    chat_state_cache.clear()
+    session = sessions()
+    session.add(User(user_id = 1, username = "u", email = "u@example.com", password = "x"))
+    session.add(Chats(chat_id = 1, user_id = 1, chat_title = "New chat"))
+    session.add(Messages(message_id = 1, chat_id = 1, role = "user", message_content = "hi"))
+    session.commit()
+    yield session
+    session.close()
+    chat_state_cache.clear()
+
+
+def add_document(db, document_id: int):
+    db.add(Documents(
+        document_id = document_id, user_id = 1, title = f"doc {document_id}", source_name = "a.txt",
+        mime_type = "text/plain", storage_path = "/tmp/a.txt", file_size = 1, sha256 = str(document_id),
+    ))
+    db.add(ChatDocument(chat_id = 1, document_id = document_id, enabled = True))
+    db.commit()
+
+
+def test_document_linked_on_another_worker_is_seen(db):
+    assert _get_user_chat_state_or_404(db, 1, 1).documents == []
+
+    # another worker links a document; this worker's cache is not told
+    add_document(db, 7)
+
+    assert [d["document_id"] for d in _get_user_chat_state_or_404(db, 1, 1).documents] == [7]
+
+
+def test_disabled_document_and_title_lock_are_seen(db):
+    add_document(db, 7)
+    _get_user_chat_state_or_404(db, 1, 1)
+
+    db.query(ChatDocument).update({"enabled": False})
+    db.query(Chats).update({"chat_title": "Locked title", "is_title_locked": True})
+    db.commit()
+
+    state = _get_user_chat_state_or_404(db, 1, 1)
+    assert state.documents == []
+    assert state.chat_title == "Locked title"
+    assert state.is_title_locked
+
+
+def test_unchanged_chat_is_served_from_the_cache(db):
+    first = _get_user_chat_state_or_404(db, 1, 1)
+    generation = chat_state_cache.generation(1)
+
+    again = _get_user_chat_state_or_404(db, 1, 1)
+
+    assert again == first
+    assert chat_state_cache.generation(1) == generation
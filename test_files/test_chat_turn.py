@@ -0,0 +1,66 @@
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("prometheus_client")
+pytest.importorskip("pgvector")
+pytest.importorskip("google.genai")
+
+from sqlite_db import install_sqlite
+from backend.database.models import Chats, Messages, User
+from backend.routers import chats
+from backend.routers.helpers import _get_user_chat_state_or_404
+from backend.services.chat_state import chat_state_cache
+
+
+@pytest.fixture
+def db(monkeypatch):
+    sessions = install_sqlite(monkeypatch)
+    chat_state_cache.clear()
+    monkeypatch.setattr(chats.title_scheduler, "request", lambda chat_id, user_id: False)
+    session = sessions()
+    session.add(User(user_id = 1, username = "u", email = "u@example.com", password = "x"))
+    session.add(Chats(chat_id = 1, user_id = 1, chat_title = "New chat"))
+    session.commit()
+    yield session
+    session.close()
+    chat_state_cache.clear()
+
+
+def test_no_transaction_is_open_during_the_model_call(monkeypatch, db):
+    seen = {}
+
+    def generate_reply(history):
+        seen["in_transaction"] = db.in_transaction()
+        # committed, so visible from another connection's point of view too
+        with Session(bind = db.get_bind()) as other:
+            seen["stored"] = [m.message_content for m in other.query(Messages)]
+        return "hello back"
+
+    monkeypatch.setattr(chats, "generate_reply", generate_reply)
+    state = _get_user_chat_state_or_404(db, 1, 1)
+
+    result = chats._run_turn(db, state, "hello")
+
+    assert seen == {"in_transaction": False, "stored": ["hello"]}
+    assert result["reply"] == "hello back"
+    assert [m.message_content for m in db.query(Messages).order_by(Messages.message_id)] == ["hello", "hello back"]
+
+
+def test_failed_reply_keeps_the_user_message(monkeypatch, db):
+    def generate_reply(history):
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(chats, "generate_reply", generate_reply)
+    state = _get_user_chat_state_or_404(db, 1, 1)
+
+    with pytest.raises(RuntimeError):
+        chats._run_turn(db, state, "hello")
+
+    db.rollback()
+    assert [m.role for m in db.query(Messages)] == ["user"]
+    assert chat_state_cache.get(1).last_user_message().content == "hello"
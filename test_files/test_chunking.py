@@ -0,0 +1,57 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from synthetic_data import synthetic_document
+from backend.services.rag.chunking import TOKEN_RE, ChunkingEngine
+
+
+def insert_at(text: str, fraction: float, extra: str) -> str:
+    pos = int(len(text) * fraction)
+    return text[:pos] + extra + text[pos:]
+
+
+def test_small_edit_changes_only_local_chunks():
+    engine = ChunkingEngine()
+    text = synthetic_document(200_000, seed = 3)
+    before = engine.split(text)
+    after = engine.split(insert_at(text, 0.5, " edited "))
+
+    original = {c.content_hash for c in before}
+    changed = [i for i, c in enumerate(after) if c.content_hash not in original]
+
+    assert len(before) > 20
+    assert 0 < len(changed) <= 3
+    # the new chunks are adjacent to each other, around the edit
+    assert changed[-1] - changed[0] < len(changed)
+    assert len(after) // 4 < changed[0] < 3 * len(after) // 4
+
+
+def test_chunks_never_exceed_max_tokens_with_overlap():
+    engine = ChunkingEngine(target_tokens = 64, min_tokens = 32, max_tokens = 80, overlap_tokens = 16)
+    # a repeated single token never hits a hash boundary, so every cut is forced
+    chunks = engine.split("word " * 2000)
+
+    assert max(c.token_count for c in chunks) <= 80
+    assert all(c.token_count == len(TOKEN_RE.findall(c.text)) for c in chunks)
+
+
+def test_rejects_overlap_that_leaves_no_room_under_max():
+    with pytest.raises(ValueError):
+        ChunkingEngine(target_tokens = 64, min_tokens = 60, max_tokens = 64, overlap_tokens = 10)
+
+
+def test_chunk_splitter_sizes_are_characters(monkeypatch):
+    monkeypatch.setenv("MAX_BATCH", "100")
+    pytest.importorskip("google.genai")
+    from backend.services.rag.document_processor import chunk_splitter
+
+    text = synthetic_document(100_000, seed = 5)
+    chunks = chunk_splitter(text, chunk_size = 1500, chunk_overlap = 150)
+
+    mean = sum(len(c) for c in chunks) / len(chunks)
+    assert 750 < mean < 2250
+    assert max(len(c) for c in chunks) < 3 * 1500
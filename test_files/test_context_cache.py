@@ -0,0 +1,95 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("prometheus_client")
+pytest.importorskip("pgvector")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from fake_gemini import FakeAPIError, FakeGeminiClient, install_fake_client
+from backend.database.models import DocumentContextCaches
+from backend.services.llm_client import context_cache
+
+
+@pytest.fixture
+def sessions():
+    # the table has no Postgres-only columns, so an in-memory SQLite database stands in
+    engine = create_engine("sqlite://", connect_args = {"check_same_thread": False}, poolclass = StaticPool)
+    DocumentContextCaches.__table__.create(engine)
+    return sessionmaker(bind = engine)
+
+
+@pytest.fixture
+def fake():
+    fake = FakeGeminiClient()
+    install_fake_client(fake)
+    return fake
+
+
+def racing_create(fake, sessions, winner_name: str, existing: str | None = None):
+    """create_cache stand-in: a second worker stores its cache while ours is being created."""
+    def create(text, model, display_name = None):
+        other = sessions()
+        if existing is None:
+            other.add(DocumentContextCaches(
+                document_id = 1, model = model, cache_name = winner_name,
+                expires_at = datetime.utcnow() + timedelta(hours = 1),
+            ))
+        else:
+            row = other.get(DocumentContextCaches, (1, model))
+            row.cache_name = winner_name
+            row.expires_at = datetime.utcnow() + timedelta(hours = 1)
+        other.commit()
+        other.close()
+        return fake.caches.create(model, {"contents": [{"role": "user", "parts": [{"text": text}]}]})
+    return create
+
+
+def test_losing_insert_deletes_its_cache_and_uses_the_winner(monkeypatch, sessions, fake):
+    monkeypatch.setattr(context_cache, "create_cache", racing_create(fake, sessions, "cachedContents/winner"))
+    db = sessions()
+
+    name = context_cache._create_document_cache(db, SimpleNamespace(document_id = 1), "model", "text")
+
+    assert name == "cachedContents/winner"
+    assert fake.caches.store == {}
+
+
+def test_losing_refresh_deletes_its_cache_and_uses_the_winner(monkeypatch, sessions, fake):
+    db = sessions()
+    db.add(DocumentContextCaches(document_id = 1, model = "model", cache_name = "cachedContents/old", expires_at = datetime.utcnow()))
+    db.commit()
+    monkeypatch.setattr(context_cache, "create_cache", racing_create(fake, sessions, "cachedContents/winner", existing = "cachedContents/old"))
+
+    name = context_cache._create_document_cache(db, SimpleNamespace(document_id = 1), "model", "text")
+
+    assert name == "cachedContents/winner"
+    assert fake.caches.store == {}
+
+
+def test_refresh_replaces_and_deletes_the_expired_cache(monkeypatch, sessions, fake):
+    old = fake.caches.create("model", {"contents": []})
+    db = sessions()
+    db.add(DocumentContextCaches(document_id = 1, model = "model", cache_name = old.name, expires_at = datetime.utcnow()))
+    db.commit()
+    monkeypatch.setattr(context_cache, "create_cache", lambda text, model, display_name = None: fake.caches.create(model, {"contents": []}))
+
+    name = context_cache._create_document_cache(db, SimpleNamespace(document_id = 1), "model", "text")
+
+    assert name != old.name
+    assert list(fake.caches.store) == [name]
+
+
+def test_only_missing_caches_count_as_missing():
+    assert context_cache.is_cache_missing(FakeAPIError(404, "CachedContent not found"))
+    assert context_cache.is_cache_missing(FakeAPIError(403, "CachedContent not found (or permission denied)"))
+    assert not context_cache.is_cache_missing(FakeAPIError(403, "API key invalid"))
+    assert not context_cache.is_cache_missing(FakeAPIError(503, "unavailable"))
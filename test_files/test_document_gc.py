@@ -0,0 +1,85 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("prometheus_client")
+pytest.importorskip("pgvector")
+
+from fake_gemini import FakeGeminiClient, install_fake_client
+from sqlite_db import install_sqlite
+from backend.database.models import Chats, ChatDocument, DocumentChunks, Documents, User
+from backend.services.rag import document_gc
+
+OLD = datetime.utcnow() - timedelta(days = 2)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    sessions = install_sqlite(monkeypatch)
+    install_fake_client(FakeGeminiClient())
+    session = sessions()
+    session.add(User(user_id = 1, username = "u", email = "u@example.com", password = "x"))
+    session.add(Chats(chat_id = 1, user_id = 1, chat_title = "chat"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def add_document(db, tmp_path, document_id: int, created_at = OLD, status = "ready", status_updated_at = None, linked = False):
+    path = tmp_path / f"{document_id}.txt"
+    path.write_text("content")
+    db.add(Documents(
+        document_id = document_id, user_id = 1, title = "doc", source_name = "doc.txt", mime_type = "text/plain",
+        storage_path = str(path), file_size = 7, sha256 = str(document_id), status = status,
+        status_updated_at = status_updated_at, created_at = created_at,
+    ))
+    db.add(DocumentChunks(document_id = document_id, chunk_index = 0, content = "content", embedding = [0.0] * 3072))
+    if linked:
+        db.add(ChatDocument(chat_id = 1, document_id = document_id))
+    db.commit()
+    return path
+
+
+def remaining(db) -> list[int]:
+    db.rollback()
+    return [d for (d,) in db.query(Documents.document_id).order_by(Documents.document_id)]
+
+
+def test_only_old_unlinked_documents_are_collected(db, tmp_path):
+    orphan = add_document(db, tmp_path, 1)
+    add_document(db, tmp_path, 2, linked = True)
+    add_document(db, tmp_path, 3, created_at = datetime.utcnow())
+
+    report = document_gc.collect_garbage(dry_run = False)
+
+    assert report.documents == 1 and report.chunks == 1
+    assert remaining(db) == [2, 3]
+    assert db.query(DocumentChunks.document_id).distinct().count() == 2
+    assert not orphan.exists()
+
+
+def test_dry_run_reports_without_deleting(db, tmp_path):
+    orphan = add_document(db, tmp_path, 1)
+
+    report = document_gc.collect_garbage(dry_run = True)
+
+    assert report.documents == 1
+    assert report.file_bytes == 7
+    assert report.row_bytes > 0
+    assert remaining(db) == [1]
+    assert orphan.exists()
+
+
+def test_processing_documents_are_kept_until_stale(db, tmp_path):
+    add_document(db, tmp_path, 1, status = "processing", status_updated_at = datetime.utcnow())
+    add_document(db, tmp_path, 2, status = "processing", status_updated_at = OLD)
+    # processing from before status_updated_at existed: judged by its upload time
+    add_document(db, tmp_path, 3, status = "processing")
+
+    document_gc.collect_garbage(dry_run = False)
+
+    assert remaining(db) == [1]
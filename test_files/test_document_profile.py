@@ -0,0 +1,100 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("prometheus_client")
+pytest.importorskip("pgvector")
+
+from sqlite_db import install_sqlite
+from backend.database.models import DocumentRepresentatives, DocumentSummaries, Documents, User
+from backend.services.rag import document_profile
+from backend.services.rag.document_profile import build_document_profile, rank_documents, representative_vectors
+
+
+def clustered(centers: list[list[float]], per_cluster: list[int], noise: float = 0.01, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    points = [np.asarray(c) + noise * rng.standard_normal(len(c)) for c, n in zip(centers, per_cluster) for _ in range(n)]
+    return np.asarray(points, dtype = np.float32)
+
+
+def test_representatives_find_clusters_ordered_by_weight():
+    embeddings = clustered([[1, 0, 0], [0, 1, 0], [0, 0, 1]], [10, 5, 2])
+
+    centroid, reps = representative_vectors(embeddings, k = 3)
+
+    assert [weight for _, weight in reps] == [10, 5, 2]
+    assert [int(np.argmax(vec)) for vec, _ in reps] == [0, 1, 2]
+    for vec, _ in reps:
+        assert np.linalg.norm(vec) == pytest.approx(1.0, abs = 1e-5)
+    assert np.linalg.norm(centroid) == pytest.approx(1.0, abs = 1e-5)
+
+
+def test_representatives_never_exceed_the_chunk_count():
+    _, reps = representative_vectors(clustered([[1, 0]], [2]), k = 8)
+
+    assert 1 <= len(reps) <= 2
+    assert sum(weight for _, weight in reps) == 2
+
+
+def test_representatives_are_deterministic():
+    embeddings = clustered([[1, 0, 0], [0, 1, 0]], [6, 6], noise = 0.2)
+
+    first = representative_vectors(embeddings, k = 2)[1]
+    second = representative_vectors(embeddings, k = 2)[1]
+
+    assert all(np.array_equal(a, b) and wa == wb for (a, wa), (b, wb) in zip(first, second))
+
+
+class RankingDB:
+    """Answers rank_documents' single query with fixed (document_id, distance) rows."""
+
+    def __init__(self, rows: list[tuple[int, float]]):
+        self.rows = [SimpleNamespace(document_id = d, distance = dist) for d, dist in rows]
+        self.queries = 0
+
+    def execute(self, statement):
+        self.queries += 1
+        return SimpleNamespace(all = lambda: self.rows)
+
+
+def test_rank_documents_orders_by_nearest_representative():
+    db = RankingDB([(3, 0.1), (1, 0.4)])
+
+    assert rank_documents(db, [1, 2, 3], [0.0] * 3072) == [3, 1, 2]
+    assert rank_documents(db, [1, 2, 3], [0.0] * 3072, limit = 1) == [3]
+
+
+def test_rank_documents_skips_the_query_for_one_document():
+    db = RankingDB([])
+
+    assert rank_documents(db, [5], [0.0] * 3072) == [5]
+    assert db.queries == 0
+
+
+def test_profile_is_stored_without_summary_when_summarizing_fails(monkeypatch):
+    sessions = install_sqlite(monkeypatch)
+    db = sessions()
+    db.add(User(user_id = 1, username = "u", email = "u@example.com", password = "x"))
+    db.add(Documents(
+        document_id = 1, user_id = 1, title = "doc", source_name = "doc.txt", mime_type = "text/plain",
+        storage_path = "/tmp/doc.txt", file_size = 1, sha256 = "1",
+    ))
+    db.commit()
+
+    def summarize_document(title, text):
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(document_profile, "summarize_document", summarize_document)
+    embeddings = [[1.0] + [0.0] * 3071, [0.0, 1.0] + [0.0] * 3070]
+
+    profile = build_document_profile(db, 1, "doc", "some text", embeddings)
+    db.commit()
+
+    assert profile.summary is None
+    assert db.get(DocumentSummaries, 1).chunk_count == 2
+    assert db.query(DocumentRepresentatives).count() == 2
@@ -0,0 +1,166 @@
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("prometheus_client")
+
+from backend.services.llm_client import scheduler as scheduler_module
+from backend.services.llm_client.scheduler import AdmissionRejected, LLMScheduler, Priority, llm_priority, llm_slot
+
+
+def make_scheduler(**overrides) -> LLMScheduler:
+    options = dict(
+        max_concurrency = 1,
+        per_user_concurrency = 1,
+        per_user_max_queued = 8,
+        max_queue_depth = {p: 8 for p in Priority},
+        max_wait_seconds = 5.0,
+    )
+    options.update(overrides)
+    return LLMScheduler(**options)
+
+
+def wait_until(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def queued(scheduler: LLMScheduler) -> int:
+    with scheduler._lock:
+        return len(scheduler._waiting)
+
+
+def test_waiters_are_served_in_priority_order():
+    scheduler = make_scheduler()
+    holder = scheduler.acquire(Priority.INTERACTIVE)
+    order = []
+
+    def waiter(priority: Priority):
+        ticket = scheduler.acquire(priority)
+        order.append(priority)
+        scheduler.release(ticket)
+
+    threads = []
+    for priority in (Priority.INGESTION, Priority.TITLE, Priority.INTERACTIVE):
+        t = threading.Thread(target = waiter, args = (priority,))
+        t.start()
+        threads.append(t)
+        wait_until(lambda n = len(threads): queued(scheduler) == n)
+
+    scheduler.release(holder)
+    for t in threads:
+        t.join(timeout = 5)
+
+    assert order == [Priority.INTERACTIVE, Priority.TITLE, Priority.INGESTION]
+
+
+def test_per_user_cap_lets_other_users_through():
+    scheduler = make_scheduler(max_concurrency = 4, per_user_concurrency = 1)
+    busy_user = scheduler.acquire(Priority.INTERACTIVE, user_id = 1)
+    acquired = []
+
+    def second_call_from_same_user():
+        ticket = scheduler.acquire(Priority.INTERACTIVE, user_id = 1)
+        acquired.append(1)
+        scheduler.release(ticket)
+
+    blocked = threading.Thread(target = second_call_from_same_user)
+    blocked.start()
+    wait_until(lambda: queued(scheduler) == 1)
+
+    other_user = scheduler.acquire(Priority.INTERACTIVE, user_id = 2)
+    assert acquired == []
+
+    scheduler.release(other_user)
+    scheduler.release(busy_user)
+    blocked.join(timeout = 5)
+    assert acquired == [1]
+
+
+def test_user_queue_full_is_429_and_priority_queue_full_is_503():
+    scheduler = make_scheduler(per_user_max_queued = 1, max_queue_depth = {p: 1 for p in Priority}, max_wait_seconds = 2.0)
+    holder = scheduler.acquire(Priority.INTERACTIVE)
+
+    waiter = threading.Thread(target = lambda: scheduler.release(scheduler.acquire(Priority.TITLE, user_id = 1)))
+    waiter.start()
+    wait_until(lambda: queued(scheduler) == 1)
+
+    with pytest.raises(AdmissionRejected) as user_full:
+        scheduler.acquire(Priority.INTERACTIVE, user_id = 1)
+    with pytest.raises(AdmissionRejected) as queue_full:
+        scheduler.acquire(Priority.TITLE, user_id = 2)
+
+    scheduler.release(holder)
+    waiter.join(timeout = 5)
+
+    assert user_full.value.status_code == 429
+    assert queue_full.value.status_code == 503
+
+
+def test_wait_timeout_is_503_and_frees_the_queue_slot():
+    scheduler = make_scheduler(max_wait_seconds = 0.05)
+    holder = scheduler.acquire(Priority.INTERACTIVE)
+
+    with pytest.raises(AdmissionRejected) as timed_out:
+        scheduler.acquire(Priority.INTERACTIVE, user_id = 1)
+
+    assert timed_out.value.status_code == 503
+    assert queued(scheduler) == 0
+    scheduler.release(holder)
+    scheduler.release(scheduler.acquire(Priority.INTERACTIVE, user_id = 1))
+
+
+def test_release_grants_exactly_one_waiter_per_free_slot():
+    scheduler = make_scheduler(per_user_concurrency = 8)
+    holder = scheduler.acquire(Priority.INTERACTIVE)
+    granted = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def waiter():
+        ticket = scheduler.acquire(Priority.TITLE, user_id = 1)
+        with lock:
+            granted.append(ticket)
+        done.wait(5)
+        scheduler.release(ticket)
+
+    threads = [threading.Thread(target = waiter) for _ in range(4)]
+    for t in threads:
+        t.start()
+    wait_until(lambda: queued(scheduler) == 4)
+
+    scheduler.release(holder)
+    wait_until(lambda: len(granted) == 1)
+    time.sleep(0.05)
+    assert len(granted) == 1
+    assert queued(scheduler) == 3
+
+    done.set()
+    for t in threads:
+        t.join(timeout = 5)
+    assert len(granted) == 4
+
+
+def test_calls_outside_llm_priority_run_as_background(monkeypatch):
+    seen = []
+
+    class Recorder:
+        def slot(self, priority, user_id = None):
+            seen.append((priority, user_id))
+            return nullcontext()
+
+    monkeypatch.setattr(scheduler_module, "llm_scheduler", Recorder())
+    with llm_slot():
+        pass
+    with llm_priority(Priority.INTERACTIVE, 7), llm_slot():
+        pass
+
+    assert seen == [(Priority.BACKGROUND, None), (Priority.INTERACTIVE, 7)]
@@ -0,0 +1,97 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("prometheus_client")
+pytest.importorskip("pgvector")
+pytest.importorskip("jose")
+
+import sqlite_db  # noqa: F401  (settings the routers read at import)
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from backend.main import RequestTraceMiddleware
+from backend.services.metrics import track_stage
+
+STREAM_SECONDS = 0.2
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestTraceMiddleware)
+
+    @app.get("/items/{item_id}")
+    def get_item(item_id: int):
+        with track_stage("lookup"):
+            return {"item_id": item_id}
+
+    @app.get("/streams/{stream_id}")
+    def stream(stream_id: int):
+        def body():
+            yield "start\n"
+            with track_stage("streamed"):
+                time.sleep(STREAM_SECONDS)
+            yield "end\n"
+        return StreamingResponse(body(), media_type = "text/plain")
+
+    return app
+
+
+def latency(stat: str, route: str) -> float:
+    value = REGISTRY.get_sample_value(f"http_request_latency_seconds_{stat}", {"method": "GET", "route": route, "status": "200"})
+    return value or 0.0
+
+
+def test_server_timing_header_and_route_template_label():
+    api = TestClient(make_app())
+    before = latency("count", "/items/{item_id}")
+
+    response = api.get("/items/42", headers = {"X-Request-ID": "req-1"})
+
+    assert response.status_code == 200
+    assert response.headers["X-Request-ID"] == "req-1"
+    assert response.headers["Server-Timing"].startswith("lookup;dur=")
+    # labelled with the route template, not the concrete path
+    assert latency("count", "/items/{item_id}") == before + 1
+    assert REGISTRY.get_sample_value("http_request_latency_seconds_count", {"method": "GET", "route": "/items/42", "status": "200"}) is None
+
+
+def test_streamed_body_counts_in_the_request_latency():
+    api = TestClient(make_app())
+    before = latency("sum", "/streams/{stream_id}")
+
+    response = api.get("/streams/1")
+
+    assert response.text == "start\nend\n"
+    assert latency("sum", "/streams/{stream_id}") - before >= STREAM_SECONDS
+
+
+def test_spans_recorded_while_streaming_are_sent_as_a_trailer():
+    app = make_app()
+    messages = []
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/streams/1", "raw_path": b"/streams/1", "root_path": "", "query_string": b"", "headers": [],
+        "client": ("test", 1), "server": ("test", 80), "extensions": {"http.response.trailers": {}},
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+
+    start, trailer = messages[0], messages[-1]
+    assert start["trailers"] is True
+    assert (b"trailer", b"Server-Timing") in start["headers"]
+    assert trailer["type"] == "http.response.trailers"
+    assert dict(trailer["headers"])[b"server-timing"].startswith(b"streamed;dur=")
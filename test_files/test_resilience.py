@@ -0,0 +1,144 @@
+import itertools
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("prometheus_client")
+
+from fake_gemini import FakeAPIError, FakeGeminiClient
+from backend.services.llm_client import resilience
+from backend.services.llm_client.resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, resilient_call, with_fallback
+from backend.services.llm_client.scheduler import AdmissionRejected
+
+_names = itertools.count()
+
+
+def fresh_name(prefix: str) -> str:
+    # trackers and breakers are process-wide registries keyed by operation and model
+    return f"{prefix}-{next(_names)}"
+
+
+def warm_tracker(operation: str, seconds: float):
+    tracker = resilience._tracker(operation)
+    for _ in range(resilience.GEMINI_HEDGE_MIN_SAMPLES):
+        tracker.record(seconds)
+
+
+def generate(fake: FakeGeminiClient, model: str):
+    return lambda: fake.models.generate_content(model = model, contents = "hello")
+
+
+def test_breaker_opens_after_threshold_and_half_opens_for_one_probe():
+    breaker = CircuitBreaker(failure_threshold = 3, reset_seconds = 0.05)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.allow()
+
+
+def test_server_errors_open_the_circuit():
+    model = fresh_name("model")
+    fake = FakeGeminiClient(latency = 0.0, error_rate = 1.0, error_code = 503)
+
+    for _ in range(resilience.GEMINI_BREAKER_FAILURES):
+        with pytest.raises(FakeAPIError):
+            resilient_call(fresh_name("op"), model, generate(fake, model), hedge = False)
+
+    calls = fake.models.calls["generate_content"]
+    with pytest.raises(CircuitOpen):
+        resilient_call(fresh_name("op"), model, generate(fake, model), hedge = False)
+    assert fake.models.calls["generate_content"] == calls
+
+
+def test_client_errors_do_not_open_the_circuit():
+    model = fresh_name("model")
+    fake = FakeGeminiClient(latency = 0.0, error_rate = 1.0, error_code = 400)
+
+    for _ in range(resilience.GEMINI_BREAKER_FAILURES * 2):
+        with pytest.raises(FakeAPIError):
+            resilient_call(fresh_name("op"), model, generate(fake, model), hedge = False)
+
+    assert resilience._breaker(model).allow()
+
+
+def test_slow_primary_is_hedged():
+    operation, model = fresh_name("op"), fresh_name("model")
+    warm_tracker(operation, 0.01)
+    slow, fast = FakeGeminiClient(latency = 2.0), FakeGeminiClient(latency = 0.0)
+    attempts = iter((generate(slow, model), generate(fast, model)))
+
+    start = time.perf_counter()
+    response = resilient_call(operation, model, lambda: next(attempts)(), hedge = True)
+
+    assert response.text
+    assert time.perf_counter() - start < 1.0
+    assert fast.models.calls["generate_content"] == 1
+
+
+def test_fast_transient_failure_is_retried_once():
+    operation, model = fresh_name("op"), fresh_name("model")
+    warm_tracker(operation, 0.01)
+    failing = FakeGeminiClient(latency = 0.0, error_rate = 1.0, error_code = 503)
+    healthy = FakeGeminiClient(latency = 0.0)
+    attempts = iter((generate(failing, model), generate(healthy, model)))
+
+    assert resilient_call(operation, model, lambda: next(attempts)(), hedge = True).text
+
+
+def test_client_error_is_not_retried():
+    operation, model = fresh_name("op"), fresh_name("model")
+    warm_tracker(operation, 0.01)
+    fake = FakeGeminiClient(latency = 0.0, error_rate = 1.0, error_code = 400)
+
+    with pytest.raises(FakeAPIError):
+        resilient_call(operation, model, generate(fake, model), hedge = True)
+    assert fake.models.calls["generate_content"] == 1
+
+
+def test_deadline_is_enforced():
+    model = fresh_name("model")
+    fake = FakeGeminiClient(latency = 1.0)
+
+    start = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        resilient_call(fresh_name("op"), model, generate(fake, model), deadline = 0.1, hedge = False)
+    assert time.perf_counter() - start < 0.5
+
+
+def failing_then(error: Exception):
+    models = []
+
+    def call(model: str):
+        models.append(model)
+        if len(models) == 1:
+            raise error
+        return model
+    return call, models
+
+
+@pytest.mark.parametrize("error", [FakeAPIError(503, "unavailable"), DeadlineExceeded("slow"), CircuitOpen("open")])
+def test_fallback_on_provider_failure(error):
+    call, models = failing_then(error)
+
+    assert with_fallback(fresh_name("op"), "primary", call, fallback_model = "backup") == "backup"
+    assert models == ["primary", "backup"]
+
+
+@pytest.mark.parametrize("error", [AdmissionRejected(503, "shed"), FakeAPIError(400, "bad request"), ValueError("bad")])
+def test_no_fallback_on_shedding_or_client_errors(error):
+    call, models = failing_then(error)
+
+    with pytest.raises(type(error)):
+        with_fallback(fresh_name("op"), "primary", call, fallback_model = "backup")
+    assert models == ["primary"]
@@ -0,0 +1,35 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("prometheus_client")
+
+from fake_gemini import FakeGeminiClient
+from backend.services.rag.should_use_rag import should_use_rag
+
+
+def run_with_timeout(fn, timeout: float = 5.0):
+    result = {}
+    thread = threading.Thread(target = lambda: result.setdefault("value", fn()), daemon = True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "should_use_rag did not return"
+    return result["value"]
+
+
+def test_routes_through_the_model():
+    fake = FakeGeminiClient()
+
+    assert run_with_timeout(lambda: should_use_rag(fake, "what does the report say?", [{"title": "report"}])) is True
+    assert fake.models.calls["generate_content"] == 1
+
+
+def test_no_documents_skips_the_model():
+    fake = FakeGeminiClient()
+
+    assert should_use_rag(fake, "hello", []) is False
+    assert fake.models.calls["generate_content"] == 0
@@ -0,0 +1,117 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("prometheus_client")
+
+from backend.services.llm_client.single_flight import SingleFlight
+
+
+def run_concurrently(flight: SingleFlight, key, fn, callers: int) -> list:
+    results = [None] * callers
+    barrier = threading.Barrier(callers)
+
+    def caller(i: int):
+        barrier.wait()
+        try:
+            results[i] = flight.do(key, fn)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target = caller, args = (i,)) for i in range(callers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout = 5)
+    return results
+
+
+def test_identical_concurrent_calls_run_once():
+    flight = SingleFlight("test")
+    calls = []
+    release = threading.Event()
+
+    def fn():
+        calls.append(1)
+        release.wait(timeout = 5)
+        return "shared"
+
+    threading.Timer(0.2, release.set).start()
+    results = run_concurrently(flight, "key", fn, callers = 8)
+
+    assert results == ["shared"] * 8
+    assert len(calls) == 1
+
+
+def test_followers_share_the_leaders_error():
+    flight = SingleFlight("test")
+    release = threading.Event()
+
+    def fn():
+        release.wait(timeout = 5)
+        raise ValueError("boom")
+
+    threading.Timer(0.2, release.set).start()
+    results = run_concurrently(flight, "key", fn, callers = 4)
+
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_reentrant_call_for_the_same_key_raises_instead_of_hanging():
+    flight = SingleFlight("test")
+
+    with pytest.raises(RuntimeError):
+        flight.do("key", lambda: flight.do("key", lambda: "inner"))
+
+    assert flight.do("key", lambda: "after") == "after"
+
+
+def test_followers_retry_when_the_leader_is_rejected_by_admission_control():
+    from backend.services.llm_client.scheduler import AdmissionRejected
+
+    flight = SingleFlight("test")
+    leader_started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def rejected():
+        calls.append("leader")
+        leader_started.set()
+        release.wait(timeout = 5)
+        raise AdmissionRejected(429, "Too many concurrent LLM requests for this user")
+
+    leader_result = {}
+
+    def leader():
+        try:
+            flight.do("key", rejected)
+        except AdmissionRejected as e:
+            leader_result["error"] = e
+
+    leader_thread = threading.Thread(target = leader)
+    leader_thread.start()
+    leader_started.wait(timeout = 5)
+
+    follower_result = {}
+
+    def follow():
+        def succeed():
+            calls.append("follower")
+            return "answer"
+        follower_result["value"] = flight.do("key", succeed)
+
+    follower_thread = threading.Thread(target = follow)
+    follower_thread.start()
+    time.sleep(0.1)
+    release.set()
+    leader_thread.join(timeout = 5)
+    follower_thread.join(timeout = 5)
+
+    assert leader_result["error"].status_code == 429
+    assert follower_result["value"] == "answer"
+    assert calls == ["leader", "follower"]
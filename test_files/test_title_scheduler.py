@@ -0,0 +1,106 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.services.title_scheduler import TitleScheduler
+
+
+def test_repeated_triggers_coalesce_into_one_batch():
+    batches = []
+    scheduler = TitleScheduler(batches.append, interval_seconds = 3600, max_batch = 100)
+
+    assert scheduler.request(1, 10) is False
+    assert scheduler.request(1, 10) is True
+    assert scheduler.request(2, 10) is False
+    scheduler.run_once()
+    scheduler.stop(timeout = 1)
+
+    assert batches == [{1: 10, 2: 10}]
+    assert scheduler.pending() == 0
+
+
+def test_background_thread_flushes_in_bounded_batches():
+    batches = []
+    lock = threading.Lock()
+
+    def flush(batch):
+        with lock:
+            batches.append(batch)
+
+    scheduler = TitleScheduler(flush, interval_seconds = 0.01, max_batch = 2)
+    for chat_id in range(5):
+        scheduler.request(chat_id, 1)
+
+    deadline = time.monotonic() + 2
+    while scheduler.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    scheduler.stop(timeout = 1)
+
+    assert all(len(b) <= 2 for b in batches)
+    assert sorted(chat_id for b in batches for chat_id in b) == list(range(5))
+
+
+def test_failing_flush_does_not_stop_the_scheduler():
+    calls = []
+
+    def flush(batch):
+        calls.append(batch)
+        if len(calls) == 1:
+            raise RuntimeError("provider unavailable")
+
+    scheduler = TitleScheduler(flush, interval_seconds = 3600, max_batch = 10)
+    scheduler.request(1, 1)
+    scheduler.run_once()
+    scheduler.request(1, 1)
+    scheduler.run_once()
+    scheduler.stop(timeout = 1)
+
+    assert calls == [{1: 1}, {1: 1}]
+
+
+def test_batches_never_mix_users():
+    batches = []
+    scheduler = TitleScheduler(batches.append, interval_seconds = 3600, max_batch = 2)
+    for chat_id, user_id in [(1, 10), (2, 20), (3, 10), (4, 20), (5, 10)]:
+        scheduler.request(chat_id, user_id)
+    scheduler.run_once()
+    scheduler.stop(timeout = 1)
+
+    assert all(len(set(b.values())) == 1 and len(b) <= 2 for b in batches)
+    assert sorted(chat_id for b in batches for chat_id in b) == [1, 2, 3, 4, 5]
+
+
+def test_failed_batch_is_requeued_a_bounded_number_of_times():
+    calls = []
+
+    def flush(batch):
+        calls.append(batch)
+        raise RuntimeError("provider unavailable")
+
+    scheduler = TitleScheduler(flush, interval_seconds = 3600, max_attempts = 3)
+    scheduler.request(1, 1)
+    for _ in range(5):
+        scheduler.run_once()
+    scheduler.stop(timeout = 1)
+
+    assert calls == [{1: 1}] * 3
+    assert scheduler.pending() == 0
+
+
+def test_published_titles_reach_subscribers_until_unsubscribed():
+    scheduler = TitleScheduler(lambda batch: None, interval_seconds = 3600)
+    seen = []
+
+    def listener(chat_id, title):
+        seen.append((chat_id, title))
+
+    scheduler.subscribe(1, listener)
+    scheduler.publish(1, "Solar panels")
+    scheduler.publish(2, "Other chat")
+    scheduler.unsubscribe(1, listener)
+    scheduler.publish(1, "Too late")
+
+    assert seen == [(1, "Solar panels")]
@@ -0,0 +1,106 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("pgvector")
+pytest.importorskip("numpy")
+
+from sqlalchemy import text, update
+
+from sqlite_db import install_sqlite
+from backend.database.models import DocumentChunks, Documents, User
+from backend.services.rag import vector_index
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    sessions = install_sqlite(monkeypatch)
+    monkeypatch.setattr(vector_index, "VECTOR_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(vector_index, "_indexes", type(vector_index._indexes)())
+    session = sessions()
+    session.add(User(user_id = 1, username = "u", email = "u@example.com", password = "x"))
+    for document_id in (1, 2, 3):
+        session.add(Documents(
+            document_id = document_id, user_id = 1, title = "doc", source_name = "doc.txt", mime_type = "text/plain",
+            storage_path = f"/tmp/doc{document_id}.txt", file_size = 7, sha256 = str(document_id), status = "ready",
+        ))
+    session.commit()
+    yield session
+    session.close()
+
+
+def add_chunks(db, document_id: int, embeddings: list[list[float]]):
+    for i, embedding in enumerate(embeddings):
+        db.add(DocumentChunks(document_id = document_id, chunk_index = i, content = f"chunk {i}", embedding = embedding))
+    db.commit()
+
+
+def nearest(db, document_id: int, query: list[float]) -> int:
+    return vector_index.top_k(db, document_id, query, k = 1)[0].chunk_index
+
+
+def test_build_ranks_by_cosine_and_writes_the_cache(db):
+    add_chunks(db, 1, [[1, 0, 0], [0, 1, 0], [0, 0, 5]])
+
+    assert nearest(db, 1, [0, 0.1, 1]) == 2
+    assert [r.chunk_index for r in vector_index.top_k(db, 1, [1, 0.5, 0], k = 2)] == [0, 1]
+    assert len(vector_index.cache_files(1)) == 2
+
+
+def test_least_recently_used_index_is_evicted(db, monkeypatch):
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_MAX_DOCS", 2)
+    for document_id in (1, 2, 3):
+        add_chunks(db, document_id, [[1, 0, 0]])
+
+    vector_index.get_index(db, 1)
+    vector_index.get_index(db, 2)
+    vector_index.get_index(db, 1)
+    vector_index.get_index(db, 3)
+
+    assert list(vector_index._indexes) == [1, 3]
+
+
+def test_documents_over_the_chunk_limit_are_not_indexed(db, monkeypatch):
+    monkeypatch.setattr(vector_index, "VECTOR_INDEX_MAX_CHUNKS", 1)
+    add_chunks(db, 1, [[1, 0, 0], [0, 1, 0]])
+
+    assert vector_index.get_index(db, 1) is None
+    assert vector_index.top_k(db, 1, [1, 0, 0]) is None
+
+
+def test_bulk_update_in_place_is_seen(db):
+    add_chunks(db, 1, [[1, 0, 0], [0, 1, 0]])
+    assert nearest(db, 1, [1, 0, 0]) == 0
+
+    # a bulk update does not pass through the flush listeners; only the fingerprint sees it
+    db.execute(update(DocumentChunks).where(DocumentChunks.chunk_index == 0).values(embedding = [-1, 0, 0]))
+    db.commit()
+
+    assert nearest(db, 1, [1, 0, 0]) == 1
+    assert len(vector_index.cache_files(1)) == 2
+
+
+def test_bulk_delete_is_seen(db):
+    add_chunks(db, 1, [[1, 0, 0], [0, 1, 0], [0, 0, 1]])
+    assert nearest(db, 1, [1, 0, 0]) == 0
+
+    db.query(DocumentChunks).filter(DocumentChunks.chunk_index == 0).delete()
+    db.commit()
+
+    assert nearest(db, 1, [1, 0.2, 0]) == 1
+
+
+def test_update_from_another_process_is_seen(db):
+    add_chunks(db, 1, [[1, 0, 0], [0, 1, 0]])
+    before = vector_index.get_index(db, 1)
+
+    # raw SQL on its own connection, as another worker would; Postgres bumps version by trigger
+    with db.get_bind().begin() as conn:
+        conn.execute(text("UPDATE document_chunks SET embedding = '[0,0,1]', version = version + 1 WHERE chunk_index = 0"))
+
+    after = vector_index.get_index(db, 1)
+    assert after is not before
+    assert after.fingerprint != before.fingerprint